@@ -0,0 +1,290 @@
+# Analitik kohort
+# Rollup per (hari UTC, instrumen): jumlah submission, jumlah skor per kategori,
+# distribusi band per kategori dan jumlah kasus yang ditandai aturan keselamatan.
+# Rollup diperbarui inkremental saat hasil dicatat, disimpan sebagai snapshot
+# dengan watermark, dan hanya hasil setelah watermark yang dibaca ulang (dalam
+# potongan NumPy) saat startup. Watermark berupa waktu selama hasil ditambahkan
+# langsung lewat add(); setelah catch-up dan di mode multi-proses berupa nomor
+# urut result store, sehingga hasil yang di-flush terlambat tetap terhitung.
+# Query dashboard berjalan di O(hari).
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Any, Mapping, Optional, Tuple
+
+import numpy as np
+
+from scoring import ScorePlan
+from safety import SafetyEngine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROLLUP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rollups.json")
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_SAVE_INTERVAL = 300
+SECONDS_PER_DAY = 86400
+
+
+class DayRollup:
+    """Agregat satu (hari, instrumen)."""
+
+    __slots__ = ('count', 'score_sum', 'band_counts', 'flagged')
+
+    def __init__(self, n_categories: int, n_bands: int):
+        self.count = 0
+        self.score_sum = np.zeros(n_categories, dtype=np.float64)
+        # Kolom terakhir menampung skor tanpa band (indeks -1)
+        self.band_counts = np.zeros((n_categories, n_bands + 1), dtype=np.int64)
+        self.flagged = 0
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'count': self.count, 'score_sum': self.score_sum.tolist(),
+                'band_counts': self.band_counts.tolist(), 'flagged': self.flagged}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "DayRollup":
+        band_counts = np.asarray(data['band_counts'], dtype=np.int64)
+        rollup = cls(band_counts.shape[0], band_counts.shape[1] - 1)
+        rollup.count = int(data['count'])
+        rollup.score_sum[:] = data['score_sum']
+        rollup.band_counts[:] = band_counts
+        rollup.flagged = int(data['flagged'])
+        return rollup
+
+
+def day_of(ts: float) -> int:
+    return int(ts // SECONDS_PER_DAY)
+
+
+def period_start(day: int, period: str) -> date:
+    start = date(1970, 1, 1) + timedelta(days=day)
+    if period == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+class CohortAnalytics:
+    """Rollup harian per instrumen yang dipelihara saat write."""
+
+    def __init__(self, plans: Mapping[str, ScorePlan], safety_engine: Optional[SafetyEngine] = None,
+                 result_store=None, path: Optional[str] = DEFAULT_ROLLUP_PATH):
+        self.plans = plans
+        self.safety_engine = safety_engine
+        self.result_store = result_store
+        self.path = path
+        self.watermark = 0.0   # semua hasil dengan ts < watermark sudah masuk rollup
+        # Semua hasil dengan nomor urut store < sequence sudah masuk rollup; None jika
+        # add() sudah menambahkan hasil yang nomor urutnya belum diketahui
+        self.sequence: Optional[int] = None
+        self._rollups: Dict[Tuple[int, str], DayRollup] = {}
+        self._lock = threading.Lock()
+        self._catch_up_lock = threading.Lock()
+        self._saver: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._dirty = False
+        # Mode multi-proses: rollup dibangun dari result store bersama, bukan dari add()
+        self.shared = False
+
+    @classmethod
+    def from_env(cls, plans: Mapping[str, ScorePlan], safety_engine: Optional[SafetyEngine] = None,
+                 result_store=None) -> "CohortAnalytics":
+        path = os.environ.get("TEMAN_ROLLUP_PATH", DEFAULT_ROLLUP_PATH)
+        return cls(plans, safety_engine, result_store, path=path if path != "none" else None)
+
+    def _rollup_locked(self, day: int, instrument_id: str, n_categories: int) -> Optional[DayRollup]:
+        plan = self.plans.get(instrument_id)
+        if plan is None:
+            return None
+        key = (day, instrument_id)
+        rollup = self._rollups.get(key)
+        n_bands = max((len(bands) for bands in plan.bands), default=0)
+        if rollup is None or rollup.band_counts.shape != (n_categories, n_bands + 1):
+            if rollup is not None:
+                # Bentuk instrumen berubah (hot reload); rollup hari ini dimulai ulang
+                logger.warning("Rollup shape changed for %s on day %d; resetting", instrument_id, day)
+            rollup = self._rollups[key] = DayRollup(n_categories, n_bands)
+        return rollup
+
+    def share(self):
+        """Aktifkan mode multi-proses: rollup hanya mengikuti nomor urut result store."""
+        self.shared = True
+
+    def add(self, instrument_id: str, ts: float, scores: np.ndarray, bands: np.ndarray, flagged: bool):
+        """Tambahkan satu hasil ke rollup harinya (O(kategori))"""
+        if self.shared:
+            return
+        with self._lock:
+            rollup = self._rollup_locked(day_of(ts), instrument_id, len(scores))
+            if rollup is None:
+                return
+            rollup.count += 1
+            rollup.score_sum += scores
+            rollup.band_counts[np.arange(len(bands)), bands] += 1
+            rollup.flagged += int(flagged)
+            # Batas atas eksklusif, sama dengan kontrak [since, until) result store
+            self.watermark = max(self.watermark, float(np.nextafter(ts, np.inf)))
+            self.sequence = None
+            self._dirty = True
+
+    def add_chunk(self, chunk) -> int:
+        """Reduksi satu ResultChunk ke rollup harian dengan operasi NumPy"""
+        n = len(chunk.timestamps)
+        if n == 0 or chunk.instrument_id not in self.plans:
+            return 0
+        if self.safety_engine is not None and chunk.responses.shape[1] == self.plans[chunk.instrument_id].n_items:
+            flagged = self.safety_engine.evaluate_batch(chunk.instrument_id, np.maximum(chunk.responses, 0).astype(np.int64),
+                                                        chunk.scores.astype(np.int64))['flagged']
+        else:
+            flagged = np.zeros(n, dtype=bool)
+
+        days = (chunk.timestamps // SECONDS_PER_DAY).astype(np.int64)
+        unique_days, inverse = np.unique(days, return_inverse=True)
+        n_categories = chunk.scores.shape[1]
+        counts = np.bincount(inverse, minlength=len(unique_days))
+        score_sums = np.zeros((len(unique_days), n_categories), dtype=np.float64)
+        np.add.at(score_sums, inverse, chunk.scores)
+        flagged_counts = np.bincount(inverse, weights=flagged, minlength=len(unique_days))
+
+        with self._lock:
+            rollups = [self._rollup_locked(day, chunk.instrument_id, n_categories) for day in unique_days.tolist()]
+            width = rollups[0].band_counts.shape[1]
+            band_hist = np.zeros((len(unique_days), n_categories, width), dtype=np.int64)
+            # Indeks band -1 (tanpa band) jatuh ke kolom terakhir
+            np.add.at(band_hist, (inverse[:, None], np.arange(n_categories)[None, :],
+                                  chunk.bands.astype(np.int64) % width), 1)
+            for i, rollup in enumerate(rollups):
+                rollup.count += int(counts[i])
+                rollup.score_sum += score_sums[i]
+                rollup.band_counts += band_hist[i]
+                rollup.flagged += int(flagged_counts[i])
+            self._dirty = True
+        return n
+
+    def catch_up(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        """Satu pass streaming atas hasil tersimpan yang belum masuk rollup"""
+        if self.result_store is None:
+            return 0
+        # Pass konkuren (beberapa request dashboard) akan menghitung hasil yang sama dua kali
+        with self._catch_up_lock:
+            started = time.time()
+            until_seq = self.result_store.sequence()
+            with self._lock:
+                since_seq = self.sequence
+                # Tanpa nomor urut (snapshot lama / mode satu proses) mulai dari watermark waktu
+                since = (self.watermark or None) if since_seq is None else None
+            if since_seq is not None and until_seq <= since_seq:
+                return 0
+            total = 0
+            for instrument_id in list(self.plans):
+                for chunk in self.result_store.iter_chunks(instrument_id, since=since, chunk_size=chunk_size,
+                                                           since_seq=since_seq, until_seq=until_seq):
+                    total += self.add_chunk(chunk)
+            with self._lock:
+                self._dirty = self._dirty or self.sequence != until_seq
+                self.sequence = until_seq
+                self.watermark = max(self.watermark, started)
+        if total:
+            logger.info("Analytics rollups caught up with %d stored results", total)
+        return total
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read rollups %s: %s", self.path, e)
+            return False
+        with self._lock:
+            self.watermark = float(data.get('watermark', 0.0))
+            sequence = data.get('sequence')
+            self.sequence = int(sequence) if sequence is not None else None
+            self._rollups = {
+                (int(entry['day']), entry['instrument']): DayRollup.from_json(entry)
+                for entry in data.get('rollups', [])
+            }
+        return True
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                'watermark': self.watermark,
+                'sequence': self.sequence,
+                'rollups': [dict(rollup.to_json(), day=day, instrument=instrument_id)
+                            for (day, instrument_id), rollup in self._rollups.items()]
+            }
+            self._dirty = False
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def start_autosave(self, interval: float = DEFAULT_SAVE_INTERVAL):
+        if self._saver is not None or not self.path:
+            return
+        def run():
+            while not self._stop.wait(interval):
+                if self._dirty:
+                    try:
+                        self.save()
+                    except Exception as e:
+                        logger.warning("Saving rollups failed: %s", e)
+        self._saver = threading.Thread(target=run, name="rollup-saver", daemon=True)
+        self._saver.start()
+
+    def stop_autosave(self):
+        self._stop.set()
+        if self._dirty:
+            self.save()
+
+    def summary(self, instrument_id: str, start: Optional[date] = None, end: Optional[date] = None,
+                period: str = 'week', lang: str = "id") -> List[Dict[str, Any]]:
+        """Distribusi band, rerata skor per kategori dan tingkat flag per periode"""
+        plan = self.plans.get(instrument_id)
+        if plan is None:
+            return []
+        if self.shared:
+            # Hasil dari proses worker lain hanya terlihat lewat result store
+            self.catch_up()
+        epoch = date(1970, 1, 1)
+        first = (start - epoch).days if start else None
+        last = (end - epoch).days if end else None
+        periods: Dict[date, List[DayRollup]] = {}
+        with self._lock:
+            for (day, rollup_instrument), rollup in self._rollups.items():
+                if rollup_instrument != instrument_id or (first is not None and day < first) \
+                        or (last is not None and day > last):
+                    continue
+                periods.setdefault(period_start(day, period), []).append(rollup)
+
+            rows = []
+            for key in sorted(periods):
+                rollups = periods[key]
+                count = sum(rollup.count for rollup in rollups)
+                if not count:
+                    continue
+                score_sum = sum(rollup.score_sum for rollup in rollups)
+                band_counts = sum(rollup.band_counts for rollup in rollups)
+                row: Dict[str, Any] = {
+                    'periode': key.isoformat(),
+                    'n': count,
+                    'flag_rate': sum(rollup.flagged for rollup in rollups) / count
+                }
+                for index, category in enumerate(plan.categories):
+                    row[f'{category}_mean'] = float(score_sum[index] / count)
+                    for band_index, band in enumerate(plan.bands[index]):
+                        label = band.get('label', {})
+                        if isinstance(label, dict):
+                            label = label.get(lang) or label.get('id')
+                        row[f'{category}: {label}'] = float(band_counts[index][band_index] / count)
+                rows.append(row)
+        return rows
@@ -0,0 +1,313 @@
+# API JSON headless untuk aplikasi mitra
+# Endpoint async di server yang sama dengan UI Gradio: daftar instrumen, skor
+# satu submission dan skor batch. Semua submission lewat MicroBatcher yang
+# mengumpulkan panggilan konkuren per instrumen selama beberapa milidetik lalu
+# menskornya sekaligus (matriks NumPy + evaluate_batch), bukan satu per satu.
+# API hanya dipasang jika diaktifkan (TEMAN_API=1) dan setiap request wajib membawa
+# token bearer TEMAN_API_TOKEN, karena submission ditulis ke penyimpanan hasil.
+
+import os
+import asyncio
+import secrets
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+import batch_scoring
+from metrics import timed
+from serving import IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH = 256
+DEFAULT_MAX_DELAY = 0.002   # detik
+# Batas submission per request /score/batch dan submission yang belum selesai, dalam kelipatan max_batch
+REQUEST_BATCHES = 4
+PENDING_BATCHES = 16
+API_PREFIX = "/v1"
+
+
+class SubmissionError(ValueError):
+    """Submission tidak valid (instrumen tidak dikenal, item hilang, nilai tidak sah)."""
+
+    def __init__(self, message: str, status: int = 422):
+        super().__init__(message)
+        self.status = status
+
+
+class BatcherSaturated(RuntimeError):
+    """Terlalu banyak submission yang belum selesai; request baru ditolak (backpressure)"""
+
+
+class MicroBatcher:
+    """Kumpulkan submission konkuren per instrumen, skor per batch di event loop dan catat di thread."""
+
+    def __init__(self, app, max_batch: int = DEFAULT_MAX_BATCH, max_delay: float = DEFAULT_MAX_DELAY,
+                 max_request: Optional[int] = None, max_pending: Optional[int] = None):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_request = max_request if max_request is not None else max_batch * REQUEST_BATCHES
+        self.max_pending = max_pending if max_pending is not None else max_batch * PENDING_BATCHES
+        # Submission yang sudah diterima tetapi belum dijawab (antre, diskor atau dicatat)
+        self._in_flight = 0
+        self.rejected = 0
+        self._pending: Dict[str, List[Tuple[np.ndarray, Optional[str], asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._allowed: Dict[str, Tuple[Any, np.ndarray]] = {}
+        self.batches = 0
+        self.submissions = 0
+
+    @classmethod
+    def from_env(cls, app) -> "MicroBatcher":
+        max_request = os.environ.get("TEMAN_API_MAX_REQUEST")
+        max_pending = os.environ.get("TEMAN_API_MAX_PENDING")
+        return cls(app,
+                   max_batch=int(os.environ.get("TEMAN_API_MAX_BATCH", DEFAULT_MAX_BATCH)),
+                   max_delay=float(os.environ.get("TEMAN_API_MAX_DELAY_MS", DEFAULT_MAX_DELAY * 1000)) / 1000,
+                   max_request=int(max_request) if max_request else None,
+                   max_pending=int(max_pending) if max_pending else None)
+
+    def _allowed_table(self, instrument_id: str, plan) -> np.ndarray:
+        # Tabel opsi sah di-cache per objek plan, jadi hot reload otomatis membuat tabel baru
+        cached = self._allowed.get(instrument_id)
+        if cached is None or cached[0] is not plan:
+            cached = self._allowed[instrument_id] = (plan, batch_scoring.allowed_values(plan, self.app.instruments[instrument_id]))
+        return cached[1]
+
+    def vectorize(self, instrument_id: str, responses: Any) -> np.ndarray:
+        """Validasi dict jawaban dan ubah menjadi vektor slot."""
+        plan = self.app.score_plans.get(instrument_id)
+        if plan is None:
+            raise SubmissionError(f"Unknown instrument: {instrument_id}", status=404)
+        if not isinstance(responses, dict):
+            raise SubmissionError("'responses' must be an object of item id -> value")
+        # Item yang tidak diskor (mis. phq9_impairment) boleh dikosongkan; slotnya -1 (tidak dijawab)
+        missing = sorted({plan.item_ids[slot] for slots in plan.category_slots for slot in slots} - set(responses))
+        if missing:
+            raise SubmissionError(f"Missing responses: {', '.join(missing)}")
+        vector = np.full(plan.n_items, -1, dtype=np.int64)
+        allowed = self._allowed_table(instrument_id, plan)
+        for slot, item_id in enumerate(plan.item_ids):
+            value = responses.get(item_id)
+            if value is None and item_id not in responses:
+                continue
+            if isinstance(value, bool) or not isinstance(value, int) \
+                    or not 0 <= value < allowed.shape[1] or not allowed[slot, value]:
+                raise SubmissionError(f"Invalid value for {item_id}: {value!r}")
+            vector[slot] = value
+        return vector
+
+    def admit(self, n: int):
+        """Terima `n` submission sekaligus atau tolak semuanya jika antrean penuh (dipanggil di event loop)."""
+        if self._in_flight + n > self.max_pending:
+            self.rejected += n
+            raise BatcherSaturated(f"API queue full ({self._in_flight}/{self.max_pending})")
+        self._in_flight += n
+
+    def submit(self, instrument_id: str, vector: np.ndarray, subject: Optional[str] = None) -> asyncio.Future:
+        """Masukkan satu submission yang sudah di-admit() ke antrean batch instrumennya."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(instrument_id, [])
+        pending.append((vector, subject, future))
+        if len(pending) >= self.max_batch:
+            self._flush(instrument_id)
+        elif instrument_id not in self._timers:
+            self._timers[instrument_id] = loop.call_later(self.max_delay, self._flush, instrument_id)
+        return future
+
+    def _flush(self, instrument_id: str):
+        timer = self._timers.pop(instrument_id, None)
+        if timer is not None:
+            timer.cancel()
+        pending = self._pending.pop(instrument_id, [])
+        if not pending:
+            return
+        try:
+            responses = np.stack([vector for vector, _, _ in pending])
+            scored, results = self.score(instrument_id, responses)
+        except Exception as e:
+            logger.exception("Scoring batch for %s failed", instrument_id)
+            self._fail(pending, e)
+            return
+        # Pencatatan bisa memuat riwayat subjek dari SQLite, jadi dijalankan di thread
+        # executor; respons baru dikirim setelah hasilnya tercatat
+        recorded = asyncio.get_running_loop().run_in_executor(
+            None, self.record, instrument_id, responses, scored, [subject for _, subject, _ in pending])
+        recorded.add_done_callback(lambda done: self._resolve(instrument_id, pending, results, done))
+
+    def _resolve(self, instrument_id: str, pending: List, results: List[Dict[str, Any]], recorded: asyncio.Future):
+        if recorded.cancelled() or recorded.exception() is not None:
+            error = recorded.exception() if not recorded.cancelled() else asyncio.CancelledError()
+            logger.error("Recording batch for %s failed", instrument_id, exc_info=error)
+            self._fail(pending, error)
+            return
+        self._in_flight -= len(pending)
+        self.batches += 1
+        self.submissions += len(pending)
+        for (_, _, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _fail(self, pending: List, error: BaseException):
+        self._in_flight -= len(pending)
+        for _, _, future in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    def record(self, instrument_id: str, responses: np.ndarray, scored: Dict[str, Any], subjects: List[Optional[str]]):
+        """Catat hasil satu batch ke tracker, analitik dan penyimpanan hasil."""
+        scores, bands, safety = scored['scores'], scored['bands'], scored['safety']
+        for i, subject in enumerate(subjects):
+            self.app.record_scored(instrument_id, responses[i], scores[i], bands[i],
+                                   int(safety['priority'][i]), bool(safety['flagged'][i]), subject)
+
+    def score(self, instrument_id: str, responses: np.ndarray) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Skor satu batch secara vektor; mengembalikan hasil mentah dan dict respons per baris."""
+        app = self.app
+        plan = app.score_plans[instrument_id]
+        # -1 (tidak dijawab) disimpan apa adanya, tetapi diskor sebagai 0
+        scored = app.score_batch(instrument_id, np.maximum(responses, 0))
+        scores, bands, safety = scored['scores'], scored['bands'], scored['safety']
+        priorities = app.safety_engine.priorities
+
+        results = []
+        score_rows = scores.tolist()
+        band_rows = bands.tolist()
+        for i in range(len(responses)):
+            categories = {}
+            for index, category in enumerate(plan.categories):
+                band = band_rows[i][index]
+                categories[category] = {
+                    'score': score_rows[i][index],
+                    'max_score': plan.max_scores[index],
+                    'band': band,
+                    'label': plan.bands[index][band].get('label') if band >= 0 else None
+                }
+            priority = int(safety['priority'][i])
+            results.append({
+                'instrument': instrument_id,
+                'scores': categories,
+                'safety': {
+                    'priority': priorities[priority] if priority >= 0 else None,
+                    'risk_score': float(safety['risk_score'][i]),
+                    'alert': bool(safety['alert'][i]),
+                    'flagged': bool(safety['flagged'][i])
+                }
+            })
+        return scored, results
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': sum(len(pending) for pending in self._pending.values()),
+            'in_flight': self._in_flight,
+            'max_pending': self.max_pending,
+            'batches': self.batches,
+            'submissions': self.submissions,
+            'rejected': self.rejected
+        }
+
+
+def instrument_summary(instrument: Dict[str, Any], plan) -> Dict[str, Any]:
+    return {
+        'id': plan.instrument_id,
+        'title': instrument.get('title', {}),
+        'scoring_type': plan.scoring_type,
+        'categories': list(plan.categories),
+        'items': [
+            {'id': item['id'], 'text': item.get('text', {}),
+             'options': [option['value'] for option in item.get('options', [])]}
+            for item in instrument.get('items', [])
+        ]
+    }
+
+
+def mount(fastapi_app, app, token: str, batcher: Optional[MicroBatcher] = None,
+          prefix: str = API_PREFIX) -> MicroBatcher:
+    """Daftarkan endpoint JSON ke aplikasi FastAPI milik Gradio; semua endpoint wajib token bearer."""
+    from fastapi import APIRouter, Body, Depends, Header, HTTPException
+    from fastapi.responses import JSONResponse
+
+    if not token:
+        raise ValueError("The JSON API requires a non-empty token")
+    expected = f"Bearer {token}".encode()
+
+    def authorize(authorization: str = Header(default="")):
+        if not secrets.compare_digest(authorization.encode(), expected):
+            raise HTTPException(status_code=401, detail="Invalid or missing API token",
+                                headers={'WWW-Authenticate': 'Bearer'})
+
+    batcher = batcher or MicroBatcher.from_env(app)
+    router = APIRouter(prefix=prefix, dependencies=[Depends(authorize)])
+
+    def error(e: SubmissionError) -> JSONResponse:
+        return JSONResponse({'error': str(e)}, status_code=e.status)
+
+    def busy(e: BatcherSaturated) -> JSONResponse:
+        return JSONResponse({'error': str(e)}, status_code=503, headers={'Retry-After': '1'})
+
+    @router.get("/instruments")
+    @timed("api_instruments")
+    @IN_FLIGHT.track
+    async def list_instruments():
+        instruments = []
+        for instrument_id in list(app.instruments):
+            plan = app.score_plans.get(instrument_id)
+            if plan is not None:
+                instruments.append(instrument_summary(app.instruments[instrument_id], plan))
+        return {'instruments': instruments}
+
+    @router.post("/score")
+    @timed("api_score")
+    @IN_FLIGHT.track
+    async def score(payload: Dict[str, Any] = Body(...)):
+        try:
+            instrument_id = payload.get('instrument')
+            vector = batcher.vectorize(instrument_id, payload.get('responses'))
+            batcher.admit(1)
+        except SubmissionError as e:
+            return error(e)
+        except BatcherSaturated as e:
+            return busy(e)
+        return await batcher.submit(instrument_id, vector, _subject(payload.get('subject')))
+
+    @router.post("/score/batch")
+    @timed("api_score_batch")
+    @IN_FLIGHT.track
+    async def score_batch(payload: Dict[str, Any] = Body(...)):
+        # Setiap submission boleh menyebut instrumennya sendiri; default dari 'instrument'
+        submissions = payload.get('submissions')
+        if not isinstance(submissions, list):
+            return error(SubmissionError("'submissions' must be a list"))
+        if len(submissions) > batcher.max_request:
+            return error(SubmissionError(f"Too many submissions ({len(submissions)} > {batcher.max_request})", status=413))
+        futures = []
+        try:
+            for index, submission in enumerate(submissions):
+                if not isinstance(submission, dict):
+                    raise SubmissionError(f"submissions[{index}] must be an object")
+                instrument_id = submission.get('instrument', payload.get('instrument'))
+                try:
+                    vector = batcher.vectorize(instrument_id, submission.get('responses'))
+                except SubmissionError as e:
+                    raise SubmissionError(f"submissions[{index}]: {e}", e.status)
+                futures.append((instrument_id, vector, _subject(submission.get('subject'))))
+            batcher.admit(len(futures))
+        except SubmissionError as e:
+            return error(e)
+        except BatcherSaturated as e:
+            return busy(e)
+        # Semua submission divalidasi dulu, baru masuk antrean batch bersama panggilan lain
+        results = await asyncio.gather(*[batcher.submit(*entry) for entry in futures])
+        return {'results': results}
+
+    fastapi_app.include_router(router)
+    return batcher
+
+
+def _subject(value: Any) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    return value.strip() or None
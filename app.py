@@ -1,109 +1,361 @@
 # KODE FINAL - SCREENING KESEHATAN MENTAL
 # Sudah diperbaiki untuk deployment & compatibility
 
-import gradio as gr
-import yaml
-import json
+import time
+_IMPORT_START = time.perf_counter()
+
 import os
-from typing import Dict, List, Any
-from datetime import datetime
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-import tempfile
+import json
+import sys
+import importlib.util
+import logging
+import threading
+import argparse
+from typing import Dict, List, Any, Mapping, Tuple
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+from config_registry import ConfigRegistry
+from scoring import ScorePlan
+from forms import FormEngine
+from fragments import (
+    FragmentCache, DEFAULT_MAXSIZE as DEFAULT_FRAGMENT_CACHE, score_key, quick_screening_html, full_assessment_html, analysis_card_html, safety_alert_html,
+    BREATHING_PANELS, GROUNDING_PANEL, MSG_ANSWER_ALL, MSG_FORM_EMPTY, MSG_COMPLETE_ALL, MSG_INTERPRETATION_ERROR,
+    MSG_PDF_BUSY, MSG_PDF_PENDING, MSG_PDF_FAILED, MSG_ENTER_SCORES, MSG_NO_HISTORY, MSG_NO_ANALYTICS, MSG_SELECT_INSTRUMENTS,
+    MSG_SESSION_EXPIRED,
+    trend_summary_html
+)
+import batch_scoring
+import bulk_export
+import columnar_export
+import psychometrics
+import api
+import client_scoring
+import serving
+import reports
+from reports import ReportEngine, ReportPool, ReportPoolSaturated
+from pdf_template import render_battery
+from report_store import ReportStore, report_key
+from result_store import ResultStore, ResultRow
+from sessions import SessionStore
+from longitudinal import LongitudinalTracker
+from analytics import CohortAnalytics
+from safety import SafetyEngine, SafetyResult
+import metrics
+from metrics import timed
+from startup import STARTUP
+
+logger = logging.getLogger(__name__)
+
+
+def _lazy_import(name: str):
+    # Modul baru benar-benar dieksekusi saat atributnya pertama kali diakses
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# Gradio (beberapa detik import) hanya dimuat saat UI dibangun; subcommand CLI tidak memerlukannya
+gr = _lazy_import("gradio")
+STARTUP.record("import modules", time.perf_counter() - _IMPORT_START)
+
+APP_CSS = """
+.gradio-container { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; }
+.header-gradient { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; border-radius: 12px; margin-bottom: 20px; text-align: center; color: white; box-shadow: 0 10px 20px rgba(0,0,0,0.1); }
+.emergency-banner { background: linear-gradient(45deg, #e74c3c, #c0392b); color: white; padding: 20px; border-radius: 12px; text-align: center; margin-top: 30px; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }
+"""
+
+FULL_ASSESSMENT_CHOICES = [
+    ("PHQ-9 (Depresi)", "phq9"),
+    ("GAD-7 (Kecemasan)", "gad7"),
+    ("DASS-21 (Distress)", "dass21"),
+    ("CBI (Burnout)", "cbi")
+]
+# Kombinasi yang paling sering diberikan klinisi dalam satu sesi
+FULL_ASSESSMENT_IDS = [instrument_id for _, instrument_id in FULL_ASSESSMENT_CHOICES]
+DEFAULT_BATTERY = ["phq9", "gad7", "dass21"]
+BATTERY_REPORT = "battery"
 
 class MentalHealthScreeningApp:
-    def __init__(self):
+    def __init__(self, registry: ConfigRegistry = None):
         self.current_lang = "id"
-        self.instruments = {}
-        self.scoring_configs = {}
-        self.i18n = {}
+        self.registry = registry or ConfigRegistry()
+        self.registry.add_listener(self._on_config_change)
+        self.report_pool = ReportPool.from_env()
+        self.report_store = ReportStore.from_env()
+        self.result_store = ResultStore.from_env()
+        self.sessions = SessionStore.from_env()
         self.load_configs()
+        self._register_collectors()
         
+    @timed("load_configs")
     def load_configs(self):
-        # Create directories if not exist
-        for dir_path in ["config/instruments", "config/scoring", "config/i18n"]:
-            os.makedirs(dir_path, exist_ok=True)
-        
-        # Load instruments
-        if os.path.exists("config/instruments"):
-            for filename in os.listdir("config/instruments"):
-                if filename.endswith('.yaml'):
-                    try:
-                        with open(f"config/instruments/{filename}", 'r', encoding='utf-8') as f:
-                            config = yaml.safe_load(f)
-                            if config and 'id' in config:
-                                self.instruments[config['id']] = config
-                    except Exception as e:
-                        print(f"Warning: Could not load {filename}: {e}")
-        
-        # Load scoring configs
-        if os.path.exists("config/scoring"):
-            for filename in os.listdir("config/scoring"):
-                if filename.endswith('.yaml'):
-                    try:
-                        with open(f"config/scoring/{filename}", 'r', encoding='utf-8') as f:
-                            config = yaml.safe_load(f)
-                            if config:
-                                self.scoring_configs.update(config)
-                    except Exception as e:
-                        print(f"Warning: Could not load {filename}: {e}")
-        
-        # Load translations
-        if os.path.exists("config/i18n"):
-            for filename in os.listdir("config/i18n"):
-                if filename.endswith('.json'):
-                    try:
-                        lang = filename.split('.')[0]
-                        with open(f"config/i18n/{filename}", 'r', encoding='utf-8') as f:
-                            self.i18n[lang] = json.load(f)
-                    except Exception as e:
-                        print(f"Warning: Could not load {filename}: {e}")
+        # Instrumen & score plan dimuat lazy oleh registry (snapshot / YAML saat pertama dipakai)
+        self.instruments: Mapping[str, Dict[str, Any]] = self.registry.instruments
+        self.score_plans: Mapping[str, ScorePlan] = self.registry.plans
+        
+        # Compile safety rules terhadap score plan
+        self.safety_engine = SafetyEngine(self.scoring_configs.get('safety', {}), self.score_plans)
+        self.report_engine = ReportEngine(self.i18n)
+        self.form_engine = FormEngine(self.instruments)
+        self.tracker = LongitudinalTracker.from_env(self.score_plans, self.result_store)
+        self.analytics = CohortAnalytics.from_env(self.score_plans, self.safety_engine, self.result_store)
+        self.fragments = FragmentCache(int(os.environ.get("TEMAN_FRAGMENT_CACHE", DEFAULT_FRAGMENT_CACHE)))
+    
+    def configure_worker(self, index: int, workers: int):
+        """Siapkan state per proses setelah fork (mode serve --workers N)"""
+        if workers <= 1:
+            return
+        # Direktori laporan terpisah agar indeks & sweeper tiap worker tidak saling berebut file
+        self.report_store = ReportStore(os.path.join(self.report_store.directory, f"worker-{index}"),
+                                        max_bytes=self.report_store.max_bytes // workers,
+                                        max_age=self.report_store.max_age)
+        # Tren dan rollup harus melihat hasil dari semua worker, jadi dibaca dari result store
+        self.tracker.max_subjects = 0
+        self.tracker.invalidate()
+        if self.result_store is not None:
+            self.analytics.share()
+        if index != 0:
+            self.analytics.path = None
+        if metrics.REGISTRY.profiler is not None:
+            metrics.REGISTRY.profiler.out_dir = os.path.join(metrics.REGISTRY.profiler.out_dir, f"worker-{index}")
+    
+    def _register_collectors(self):
+        # stats() komponen ikut diekspos di /metrics sebagai gauge
+        metrics.REGISTRY.add_collector("fragment_cache", lambda: self.fragments.stats())
+        metrics.REGISTRY.add_collector("report_pool", lambda: self.report_pool.stats())
+        metrics.REGISTRY.add_collector("report_store", lambda: self.report_store.stats())
+        metrics.REGISTRY.add_collector("form_sessions", lambda: self.sessions.stats())
+        if self.result_store is not None:
+            metrics.REGISTRY.add_collector("result_store", lambda: self.result_store.stats())
+    
+    @property
+    def scoring_configs(self) -> Dict[str, Any]:
+        return self.registry.scoring
+    
+    @property
+    def i18n(self) -> Dict[str, Dict]:
+        return self.registry.i18n
+    
+    def warm_up(self):
+        """Muat & validasi semua konfigurasi, pre-render template laporan dan pulihkan rollup"""
+        self.warm_caches()
+        self.restore_analytics()
+    
+    def warm_caches(self):
+        # Murni optimasi: tanpa ini semuanya dimuat lazy saat request pertama
+        with STARTUP.phase("load configs"):
+            failed = self.registry.load_all()
+        for instrument_id in failed:
+            logger.warning("Instrument %s is disabled until its config is fixed", instrument_id)
+        with STARTUP.phase("warm report templates"):
+            self.report_engine.warm(self.instruments, self.score_plans, langs=tuple(self.i18n) or ("id",))
+        with STARTUP.phase("warm fragments"):
+            self.fragments.warm(self.score_plans, self.render_result)
+    
+    def restore_analytics(self):
+        # Rollup analitik: snapshot terakhir + hasil tersimpan setelah watermark-nya,
+        # harus selesai sebelum hasil baru dicatat
+        with STARTUP.phase("restore analytics"):
+            self.analytics.load()
+            self.analytics.catch_up()
     
+    def _on_config_change(self, changes: Dict[str, Any]):
+        if changes.get('scoring'):
+            self.safety_engine = SafetyEngine(self.scoring_configs.get('safety', {}), self.score_plans)
+            self.analytics.safety_engine = self.safety_engine
+            self.fragments.invalidate()
+        if changes.get('i18n'):
+            self.report_engine = ReportEngine(self.i18n)
+        for instrument_id in changes.get('instruments', ()):
+            self.safety_engine.invalidate(instrument_id)
+            self.report_engine.invalidate(instrument_id)
+            self.form_engine.invalidate(instrument_id)
+            self.fragments.invalidate(instrument_id)
+            self.tracker.invalidate(instrument_id)
+    
+    @timed("calculate_score")
     def calculate_score(self, instrument_id: str, responses: Dict[str, int]) -> Dict[str, Any]:
-        instrument = self.instruments.get(instrument_id, {})
-        scoring = instrument.get('scoring', {})
-        
-        if scoring.get('type') == 'sum':
-            total = sum(responses.get(item, 0) for item in scoring.get('items', []))
-            return {'total': total, 'max_score': scoring.get('max_score', 0)}
-        
-        elif scoring.get('type') == 'sum_by_category':
-            results = {}
-            for category, config in scoring.get('categories', {}).items():
-                category_score = sum(responses.get(item, 0) for item in config.get('items', []))
-                if 'multiplier' in config:
-                    category_score *= config['multiplier']
-                results[category] = {
-                    'score': category_score,
-                    'max_score': config.get('max_score', 0)
-                }
-            return results
-        
-        return {}
+        plan = self.score_plans.get(instrument_id)
+        if plan is None:
+            return {}
+        return plan.result(plan.score_vector(plan.vectorize(responses)))
     
+    @timed("get_interpretation")
     def get_interpretation(self, instrument_id: str, score: Any) -> Dict[str, Any]:
-        instrument = self.instruments.get(instrument_id, {})
-        interpretation = instrument.get('interpretation', [])
-        
-        if isinstance(score, dict) and 'total' in score:
-            total_score = score['total']
-            for band in interpretation:
-                if isinstance(band, dict) and 'range' in band:
-                    if band['range'][0] <= total_score <= band['range'][1]:
-                        return band
-        
-        elif isinstance(score, dict):
-            results = {}
-            for category, cat_score in score.items():
-                if category in interpretation:
-                    for band in interpretation[category]:
-                        if isinstance(band, dict) and 'range' in band:
-                            if band['range'][0] <= cat_score['score'] <= band['range'][1]:
-                                results[category] = band
-                                break
-            return results
-        
-        return {}
+        plan = self.score_plans.get(instrument_id)
+        if plan is None or not isinstance(score, dict):
+            return {}
+        
+        if 'total' in score:
+            if plan.scoring_type != 'sum':
+                return {}
+            return plan.band(0, score['total']) or {}
+        
+        results = {}
+        for category, cat_score in score.items():
+            index = plan.category_index.get(category)
+            if index is not None:
+                band = plan.band(index, cat_score['score'])
+                if band is not None:
+                    results[category] = band
+        return results
+    
+    def evaluate_safety(self, instrument_id: str, responses: Dict[str, int]) -> SafetyResult:
+        plan = self.score_plans.get(instrument_id)
+        if plan is None:
+            return SafetyResult()
+        vector = plan.vectorize(responses)
+        return self.safety_engine.evaluate(instrument_id, vector, plan.score_vector(vector))
+    
+    def record_result(self, instrument_id: str, responses: Dict[str, int], safety: SafetyResult = None,
+                      subject: str = None):
+        """Simpan hasil (baris ringkas) ke result store tanpa menunggu I/O dan perbarui tren subjek"""
+        plan = self.score_plans.get(instrument_id)
+        if plan is None:
+            return
+        # Vektor tersimpan memakai -1 untuk item yang tidak dijawab; skor dihitung dengan 0
+        vector = plan.vectorize(responses, missing=-1)
+        scores = plan.score_vector(np.maximum(vector, 0))
+        bands = np.array([plan.band_index(i, score) for i, score in enumerate(scores.tolist())])
+        priority = -1
+        if safety is not None and safety.priority in self.safety_engine.priorities:
+            priority = self.safety_engine.priorities.index(safety.priority)
+        self.record_scored(instrument_id, vector, scores, bands, priority,
+                           safety is not None and safety.flagged, subject)
+    
+    def record_scored(self, instrument_id: str, vector: np.ndarray, scores: np.ndarray, bands: np.ndarray,
+                      priority: int = -1, flagged: bool = False, subject: str = None):
+        """Catat hasil yang sudah diskor (dipakai juga oleh API batch)"""
+        subject = (subject or "").strip() or None
+        now = time.time()
+        if subject:
+            self.tracker.update(subject, instrument_id, now, int(scores[0]), int(bands[0]))
+        self.analytics.add(instrument_id, now, scores, bands, flagged)
+        if self.result_store is None:
+            return
+        self.result_store.record(ResultRow(now, instrument_id, vector, scores, bands, priority, subject))
+    
+    def trend(self, subject: str, instrument_id: str, lang: str = "id"):
+        """Ringkasan HTML + data grafik tren dari agregat longitudinal yang di-cache"""
+        import pandas as pd
+
+        aggregate = self.tracker.get((subject or "").strip(), instrument_id)
+        if aggregate is None:
+            return None, None
+        threshold = self.instruments[instrument_id].get('scoring', {}).get('reliable_change')
+        n_bands = len(self.score_plans[instrument_id].bands[0])
+        labels = {band: self.tracker.band_label(instrument_id, band, lang) for band in range(-1, n_bands)}
+        html = trend_summary_html(self.instruments[instrument_id]['title'][lang], aggregate, labels,
+                                  aggregate.reliable_change(threshold), threshold, time.time())
+        frame = pd.DataFrame({
+            'tanggal': [datetime.fromtimestamp(ts) for ts, _, _ in aggregate.history],
+            'skor': [score for _, score, _ in aggregate.history],
+            'kategori': [labels[band] for _, _, band in aggregate.history]
+        })
+        return html, frame
+    
+    def render_safety_alert(self, safety: SafetyResult, lang: str = "id", instrument_id: str = "") -> str:
+        if not safety.alerts and safety.priority not in ('immediate', 'urgent', 'high'):
+            return ""
+        key = ('safety', instrument_id, safety.priority, tuple(safety.actions),
+               tuple(rule.get('item') for rule in safety.alerts), lang)
+        return self.fragments.get(key, lambda: safety_alert_html(
+            safety.alerts, self.safety_engine.action_details(safety.actions), lang
+        ))
+    
+    def render_result(self, instrument_id: str, score: Dict[str, Any], lang: str = "id") -> str:
+        """Fragmen HTML hasil Evaluasi Lengkap, di-cache per (instrumen, skor, bahasa)"""
+        key = ('full', instrument_id, score_key(score), lang)
+        return self.fragments.get(key, lambda: full_assessment_html(
+            self.instruments[instrument_id]['title']['id'], score, self.get_interpretation(instrument_id, score), lang
+        ))
+    
+    def client_bundle(self, instrument_id: str, view: str, lang: str = "id") -> Dict[str, Any]:
+        """Bundle skoring untuk browser; template per band dirender dengan fungsi fragmen yang sama dengan server"""
+        plan = self.score_plans[instrument_id]
+        title = self.instruments[instrument_id]['title']['id']
+        placeholder = client_scoring.SCORE_PLACEHOLDER
+        if view == 'quick':
+            def render_band(category, band):
+                score = {'total': placeholder, 'max_score': plan.max_scores[category]}
+                return quick_screening_html(title, score, plan.bands[category][band], lang)
+        else:
+            def render_band(category, band):
+                return analysis_card_html(instrument_id, placeholder, plan.bands[category][band], lang)
+        return client_scoring.instrument_bundle(plan, render_band)
+    
+    def score_batch(self, instrument_id: str, responses: np.ndarray) -> Dict[str, Any]:
+        """Skor matriks jawaban (n_baris, n_item) sekaligus, kolom mengikuti plan.item_ids"""
+        plan = self.score_plans[instrument_id]
+        scores = batch_scoring.score_matrix(plan, responses)
+        return {
+            'categories': plan.categories,
+            'scores': scores,
+            'bands': batch_scoring.band_indices(plan, scores),
+            'safety': self.safety_engine.evaluate_batch(instrument_id, responses, scores)
+        }
+    
+    def score_file(self, instrument_id: str, in_path: str, out_path: str, lang: str = "id",
+                   chunk_size: int = batch_scoring.DEFAULT_CHUNK_SIZE, flagged_only: bool = False) -> int:
+        if instrument_id not in self.score_plans:
+            raise ValueError(f"Unknown instrument: {instrument_id}")
+        return batch_scoring.score_file(
+            self.score_plans[instrument_id], self.instruments[instrument_id],
+            in_path, out_path, lang=lang, chunk_size=chunk_size,
+            safety=self.safety_engine, flagged_only=flagged_only
+        )
+    
+    def psychometrics(self, instrument_id: str, paths: List[str], chunk_size: int = batch_scoring.DEFAULT_CHUNK_SIZE,
+                      workers: int = 1) -> Dict[str, Any]:
+        if instrument_id not in self.score_plans:
+            raise ValueError(f"Unknown instrument: {instrument_id}")
+        accumulator = psychometrics.analyze_files(
+            self.score_plans[instrument_id], self.instruments[instrument_id],
+            paths, chunk_size=chunk_size, workers=workers
+        )
+        return accumulator.statistics()
+    
+    def export_reports(self, instrument_id: str, out_path: str, paths: List[str] = None, since: float = None,
+                       until: float = None, lang: str = "id", workers: int = 1,
+                       batch_size: int = bulk_export.DEFAULT_BATCH_SIZE, name_column: str = None,
+                       resume: bool = True, progress=None) -> Dict[str, Any]:
+        """Satu PDF per baris file respons (`paths`) atau per hasil tersimpan (since <= ts < until), ke satu ZIP"""
+        if instrument_id not in self.score_plans:
+            raise ValueError(f"Unknown instrument: {instrument_id}")
+        plan = self.score_plans[instrument_id]
+        instrument = self.instruments[instrument_id]
+        if paths:
+            source = bulk_export.file_source(paths, name_column)
+            def batches(start):
+                return bulk_export.file_batches(plan, instrument, paths, start, batch_size, name_column=name_column)
+        else:
+            if self.result_store is None:
+                raise ValueError("No result store configured (TEMAN_RESULT_STORE=none)")
+            # Hasil yang masih di antrean ikut diekspor
+            self.result_store.flush()
+            source = {'kind': 'results', 'since': since, 'until': until}
+            def batches(start):
+                return bulk_export.stored_batches(self.result_store, plan, since, until, start, batch_size)
+        export = bulk_export.ReportExport(out_path, instrument, plan,
+                                          self.report_engine.template(instrument, plan, lang), source, workers)
+        return export.run(batches, progress, resume)
+    
+    def export_columnar(self, out_dir: str, instrument_ids: List[str] = None, since: float = None,
+                        until: float = None) -> Dict[str, Any]:
+        """Hasil tersimpan (tanpa ID subjek) ke file .npy per instrumen + meta.json, lihat columnar_export"""
+        if self.result_store is None:
+            raise ValueError("No result store configured (TEMAN_RESULT_STORE=none)")
+        self.result_store.flush()
+        return columnar_export.export_results(self.result_store, self.score_plans, self.instruments, out_dir,
+                                              instrument_ids, since, until, self.safety_engine.priorities)
     
     def create_quick_screening(self):
         if 'phq2' not in self.instruments:
@@ -124,223 +376,343 @@ class MentalHealthScreeningApp:
                 label=item['text']['id']
             ))
         
+        subject_input = gr.Textbox(label="ID Subjek (opsional)", placeholder="Isi untuk memantau perkembangan skor dari waktu ke waktu")
         submit_btn = gr.Button("Kirim Jawaban", variant="primary")
         result_output = gr.HTML()
+        safety_output = gr.HTML()
         
-        def process_quick_screening(*values):
+        # Skor & interpretasi dihitung di browser; server hanya mencatat hasil dan
+        # mengevaluasi aturan keselamatan
+        @timed("process_quick_screening")
+        def process_quick_screening(subject, *values):
             if not all(v is not None for v in values):
-                return "<p style='color: #e74c3c;'>⚠️ Jawab semua pertanyaan terlebih dahulu!</p>"
+                return ""
             
             responses_dict = dict(zip(item_ids, values))
             score = self.calculate_score('phq2', responses_dict)
-            interpretation = self.get_interpretation('phq2', score)
-            
-            if not interpretation:
-                return "<p style='color: #e74c3c;'>⚠️ Error dalam interpretasi hasil!</p>"
-            
-            html = f"""
-                <div style='padding: 20px; background-color: #f8f9fa; border-radius: 8px; border-left: 4px solid #4CAF50;'>
-                    <h3 style='color: #2c3e50; margin-top: 0;'>Hasil PHQ-2</h3>
-                    <p style='font-size: 18px;'><strong>Skor Total:</strong> <span style='color: #e74c3c;'>{score['total']}/{score['max_score']}</span></p>
-                    <p style='font-size: 16px;'><strong>Interpretasi:</strong> <span style='color: #3498db;'>{interpretation['label']['id']}</span></p>
-                    <p style='font-size: 14px; color: #34495e;'>{interpretation['description']['id']}</p>
-            """
-            
-            if score['total'] >= 3:
-                html += """
-                    <div style='background-color: #ffebee; border: 1px solid #ef5350; border-radius: 8px; padding: 15px; margin-top: 15px;'>
-                        <h4 style='color: #c62828; margin-top: 0;'>⚠️ Screening Positif</h4>
-                        <p style='color: #2c3e50;'>Hasil menunjukkan adanya gejala depresi yang memerlukan evaluasi lebih lanjut.</p>
-                        <p style='color: #2c3e50;'><strong>Rekomendasi:</strong> Lanjutkan ke PHQ-9 untuk evaluasi lengkap.</p>
-                    </div>
-                """
+            if not self.get_interpretation('phq2', score):
+                return ""
             
-            html += "</div>"
-            return html
+            safety = self.evaluate_safety('phq2', responses_dict)
+            self.record_result('phq2', responses_dict, safety, subject)
+            return self.render_safety_alert(safety, instrument_id='phq2')
         
-        submit_btn.click(process_quick_screening, inputs=inputs, outputs=[result_output])
+        submit_btn.click(
+            None, inputs=[subject_input] + inputs, outputs=[result_output],
+            js=client_scoring.quick_screening_js(self.client_bundle('phq2', 'quick'), {
+                'answer_all': MSG_ANSWER_ALL, 'interpretation_error': MSG_INTERPRETATION_ERROR
+            })
+        ).then(process_quick_screening, inputs=[subject_input] + inputs, outputs=[safety_output])
     
-    def create_full_assessment(self):
+    def create_full_assessment(self, blocks):
         """Evaluasi lengkap - FIXED VERSION tanpa error Column"""
         gr.Markdown("## 📋 Evaluasi Lengkap")
         
         instrument_choice = gr.Dropdown(
-            choices=[
-                ("PHQ-9 (Depresi)", "phq9"),
-                ("GAD-7 (Kecemasan)", "gad7"),
-                ("DASS-21 (Distress)", "dass21"),
-                ("CBI (Burnout)", "cbi")
-            ],
+            choices=FULL_ASSESSMENT_CHOICES,
             label="Pilih instrumen evaluasi",
             value="phq9"
         )
         
+        subject_input = gr.Textbox(label="ID Subjek (opsional)", placeholder="Isi untuk memantau perkembangan skor dari waktu ke waktu")
         start_btn = gr.Button("Mulai Evaluasi", variant="primary")
         
-        # PRE-CREATE 20 radio buttons (cukup untuk sebagian besar instrumen)
+        # Jumlah radio mengikuti instrumen dengan item terbanyak
+        n_slots = self.form_engine.slot_count()
         radio_components = []
-        for i in range(20):
+        for i in range(n_slots):
             radio_components.append(gr.Radio(choices=[], label="", visible=False))
         
-        # STATE storage
-        item_ids_state = gr.State([])
-        current_instrument_state = gr.State("")
+        # Token sesi disimpan di localStorage browser; instrumen & jawaban disimpan di self.sessions
+        session_state = gr.BrowserState("", storage_key="teman-form-session")
+        form_token_state = gr.State("")
+        slot_of = {radio._id: slot for slot, radio in enumerate(radio_components)}
         
         submit_btn = gr.Button("📝 Kirim Evaluasi", variant="primary", visible=False)
         results_output = gr.HTML()
         pdf_download = gr.File(label="Download Hasil PDF", visible=False)
         
-        def generate_form(instrument_id):
-            if not instrument_id or instrument_id not in self.instruments:
-                # Return 20 invisible radios + empty states
-                updates = [gr.update(visible=False) for _ in range(20)]
-                updates.extend([[], ""])
-                return updates
-        
-            instrument = self.instruments[instrument_id]
-            items = instrument.get('items', [])
-            
-            # Update hanya radio yang diperlukan
-            updates = []
-            for i, item in enumerate(items[:20]):
-                updates.append(gr.update(
-                    visible=True,
-                    choices=[(opt['label']['id'], opt['value']) for opt in item.get('options', [])],
-                    label=item['text']['id'],
-                    value=None
-                ))
-            
-            # Sembunyikan sisanya
-            while len(updates) < 20:
-                updates.append(gr.update(visible=False))
-            
-            # Return 20 radios + item_ids + instrument_id
-            item_ids = [item['id'] for item in items]
-            updates.extend([item_ids, instrument_id])
+        @timed("generate_form")
+        def generate_form(instrument_id, rendered_token):
+            # Hanya slot yang berubah dibanding form yang sedang tampil yang dikirim ulang
+            updates, payload = self.form_engine.updates(instrument_id, rendered_token, n_slots, self.current_lang)
+            if payload is None or instrument_id not in FULL_ASSESSMENT_IDS:
+                updates.extend(["", "", gr.update(visible=False)])
+            else:
+                # Selalu token baru: token lama bisa masih dipakai tab lain dari browser yang sama
+                session_id = self.sessions.start(FULL_ASSESSMENT_IDS.index(instrument_id), len(payload.item_ids))
+                updates.extend([session_id, payload.token, gr.update(visible=True)])
             return updates
         
-        # OUTPUT LIST: 20 radios + 2 states
+        # OUTPUT LIST: radios + token sesi + token form + tombol kirim
         output_targets = []
         output_targets.extend(radio_components)
-        output_targets.append(item_ids_state)
-        output_targets.append(current_instrument_state)
+        output_targets.append(session_state)
+        output_targets.append(form_token_state)
+        output_targets.append(submit_btn)
         
         start_btn.click(
             generate_form,
-            inputs=[instrument_choice],
+            inputs=[instrument_choice, form_token_state],
             outputs=output_targets
         )
         
-        def process_full_assessment(item_ids, current_instrument, *values):
-            if not item_ids or not current_instrument:
-                return "<p style='color: #e74c3c;'>⚠️ Form belum diisi lengkap!</p>", gr.update(visible=False)
+        # Jawaban dicatat per klik (hanya token + indeks pilihan yang dikirim), di luar antrean
+        def record_answer(session_id, evt: gr.SelectData):
+            self.sessions.answer(session_id, slot_of[evt.target._id], evt.index)
+        
+        gr.on(
+            [radio.select for radio in radio_components],
+            record_answer,
+            inputs=[session_state],
+            queue=False,
+            show_progress="hidden",
+            trigger_mode="multiple",
+            api_visibility="undocumented"
+        )
+        
+        # Form yang belum selesai dipulihkan saat halaman dimuat ulang; form yang sudah
+        # lengkap tidak pernah ditampilkan lagi (bisa jadi milik responden sebelumnya)
+        def restore_form(session_id, rendered_token):
+            session = self.sessions.restore(session_id)
+            if session is not None and session.complete():
+                self.sessions.discard(session_id)
+                session = None
+            instrument_id = FULL_ASSESSMENT_IDS[session.instrument] if session is not None else None
+            updates, payload = self.form_engine.updates(instrument_id, rendered_token, n_slots, self.current_lang,
+                                                        answers=session.answers.tolist() if session is not None else ())
+            if payload is None:
+                return [gr.update() for _ in radio_components] + [gr.update(), rendered_token, gr.update(), ""]
+            return updates + [instrument_id, payload.token, gr.update(visible=True), session_id]
+        
+        blocks.load(
+            restore_form,
+            inputs=[session_state, form_token_state],
+            outputs=radio_components + [instrument_choice, form_token_state, submit_btn, session_state],
+            api_visibility="undocumented"
+        )
+        
+        @timed("process_full_assessment")
+        def process_full_assessment(session_id, subject):
+            session = self.sessions.get(session_id)
+            if session is None:
+                yield MSG_SESSION_EXPIRED, gr.update(visible=False), gr.update()
+                return
             
-            if len(values) < len(item_ids) or not all(v is not None for v in values[:len(item_ids)]):
-                return "<p style='color: #e74c3c;'>⚠️ Lengkapi semua pertanyaan terlebih dahulu!</p>", gr.update(visible=False)
+            if not session.complete():
+                yield MSG_COMPLETE_ALL, gr.update(visible=False), gr.update()
+                return
             
-            responses_dict = dict(zip(item_ids, values[:len(item_ids)]))
+            current_instrument = FULL_ASSESSMENT_IDS[session.instrument]
+            responses_dict = self.form_engine.responses(current_instrument, session.answers.tolist(), self.current_lang)
+            if responses_dict is None:
+                # Konfigurasi instrumen berubah sejak form dimulai
+                yield MSG_SESSION_EXPIRED, gr.update(visible=False), gr.update()
+                return
             score = self.calculate_score(current_instrument, responses_dict)
             interpretation = self.get_interpretation(current_instrument, score)
             
             if not interpretation:
-                return "<p style='color: #e74c3c;'>⚠️ Error dalam interpretasi hasil!</p>", gr.update(visible=False)
+                yield MSG_INTERPRETATION_ERROR, gr.update(visible=False), gr.update()
+                return
             
-            pdf_buffer = self.generate_pdf_report(current_instrument, score, interpretation, responses_dict)
+            # Sesi dihabiskan sebelum hasil dicatat: kirim ulang (atau submit paralel) tidak
+            # menghasilkan baris ganda, dan token dikosongkan di browser
+            if self.sessions.finish(session_id) is None:
+                yield MSG_SESSION_EXPIRED, gr.update(visible=False), gr.update()
+                return
             
-            html = f"""
-                <div style='background-color: #d4edda; border: 1px solid #c3e6cb; border-radius: 8px; padding: 20px; margin-top: 20px;'>
-                    <h3 style='color: #155724;'>✅ Evaluasi Berhasil</h3>
-                    <h4>{self.instruments[current_instrument]['title']['id']}</h4>
-                    <p style='font-size: 20px;'><strong>Skor Total:</strong> <span style='color: #d32f2f;'>{score['total']}/{score['max_score']}</span></p>
-                    <p style='font-size: 16px;'><strong>Interpretasi:</strong> <span style='color: #388e3c;'>{interpretation['label']['id']}</span></p>
-                    <p style='color: #155724;'>{interpretation['description']['id']}</p>
-                </div>
-            """
-            return html, gr.update(value=pdf_buffer, visible=True)
-        
-        # INPUTS: 2 states + 20 radios
-        input_targets = [item_ids_state, current_instrument_state]
-        input_targets.extend(radio_components)
-        
-        # OUTPUTS: HTML + File
-        output_targets = [results_output, pdf_download]
+            html = self.render_result(current_instrument, score)
+            safety = self.evaluate_safety(current_instrument, responses_dict)
+            self.record_result(current_instrument, responses_dict, safety, subject)
+            html += self.render_safety_alert(safety, instrument_id=current_instrument)
+            
+            # Submission identik memakai ulang PDF yang sudah ada
+            template = self.report_engine.template(self.instruments[current_instrument], self.score_plans[current_instrument])
+            report_date = datetime.now().strftime('%d %B %Y')
+            key = report_key(current_instrument, responses_dict, template.lang, report_date, template.fingerprint)
+            pdf_path = self.report_store.get(current_instrument, key)
+            if pdf_path:
+                yield html, gr.update(value=pdf_path, visible=True), ""
+                return
+            
+            # Render PDF di process pool; HTML hasil dikirim lebih dulu
+            try:
+                future = self.report_pool.submit(template, score, interpretation, responses_dict, report_date)
+            except ReportPoolSaturated:
+                yield html + MSG_PDF_BUSY, gr.update(visible=False), ""
+                return
+            
+            yield html + MSG_PDF_PENDING, gr.update(visible=False), ""
+            
+            try:
+                pdf_path = self.report_store.put(current_instrument, key, future.result())
+            except Exception:
+                logger.exception("PDF report for %s failed", current_instrument)
+                yield html + MSG_PDF_FAILED, gr.update(visible=False), ""
+                return
+            
+            yield html, gr.update(value=pdf_path, visible=True), ""
         
+        # Event ini menahan thread selama PDF dirender, jadi dibatasi lebih ketat
         submit_btn.click(
             process_full_assessment,
-            inputs=input_targets,
-            outputs=output_targets
+            inputs=[session_state, subject_input],
+            outputs=[results_output, pdf_download, session_state],
+            concurrency_limit=serving.pdf_concurrency(),
+            concurrency_id="pdf_report"
         )
+    
+    @timed("generate_pdf_report")
+    def generate_pdf_report(self, instrument_id: str, score: Dict, interpretation: Dict, responses: Dict,
+                            lang: str = None) -> str:
+        """Generate PDF report (sinkron, di thread pemanggil)"""
+        template = self.report_engine.template(self.instruments[instrument_id], self.score_plans[instrument_id],
+                                               lang or self.current_lang)
+        report_date = datetime.now().strftime('%d %B %Y')
+        key = report_key(instrument_id, responses, template.lang, report_date, template.fingerprint)
+        return self.report_store.get_or_create(
+            instrument_id, key, lambda: template.render(score, interpretation, responses, report_date)
+        )
+    
+    @timed("score_battery")
+    def score_battery(self, instrument_ids: List[str], responses: Dict[str, int]) -> List[Tuple[str, Dict, Dict, Dict]]:
+        """Skor beberapa instrumen dari satu dict jawaban gabungan (ID item unik antar instrumen)
+
+        Hasil per instrumen: (instrument_id, jawaban, skor, interpretasi).
+        """
+        results = []
+        for instrument_id in instrument_ids:
+            items = [item['id'] for item in self.instruments[instrument_id].get('items', [])]
+            own = {item_id: responses[item_id] for item_id in items if item_id in responses}
+            score = self.calculate_score(instrument_id, own)
+            results.append((instrument_id, own, score, self.get_interpretation(instrument_id, score)))
+        return results
+    
+    def battery_report_job(self, results: List[Tuple[str, Dict, Dict, Dict]], lang: str = "id"):
+        """Template, kunci cache dan tanggal untuk laporan gabungan"""
+        templates = [self.report_engine.template(self.instruments[instrument_id], self.score_plans[instrument_id], lang)
+                     for instrument_id, _, _, _ in results]
+        report_date = datetime.now().strftime('%d %B %Y')
+        responses = {item_id: value for _, own, _, _ in results for item_id, value in own.items()}
+        # Urutan instrumen menentukan urutan halaman, jadi ikut menjadi bagian versi
+        version = "+".join(f"{template.instrument_id}:{template.fingerprint}" for template in templates)
+        key = report_key(BATTERY_REPORT, responses, lang, report_date, version)
+        return templates, [(score, interpretation, own) for _, own, score, interpretation in results], key, report_date
+    
+    @timed("generate_battery_report")
+    def generate_battery_report(self, instrument_ids: List[str], responses: Dict[str, int], lang: str = None) -> str:
+        """Generate satu PDF gabungan (sinkron, di thread pemanggil)"""
+        templates, results, key, report_date = self.battery_report_job(
+            self.score_battery(instrument_ids, responses), lang or self.current_lang
+        )
+        return self.report_store.get_or_create(
+            BATTERY_REPORT, key, lambda: render_battery(templates, results, report_date)
+        )
+    
+    def create_battery_assessment(self):
+        gr.Markdown("## 🗂️ Evaluasi Gabungan")
+        gr.Markdown("*Isi beberapa instrumen dalam satu sesi; semua hasil dirangkum dalam satu laporan PDF.*")
         
-        # SHOW submit button after form generated
-        def show_submit_button(item_ids):
-            return gr.update(visible=True) if item_ids else gr.update(visible=False)
+        choices = [(label, instrument_id) for label, instrument_id in FULL_ASSESSMENT_CHOICES
+                   if instrument_id in self.instruments]
+        order = [instrument_id for _, instrument_id in choices]
+        battery_choice = gr.CheckboxGroup(choices=choices, label="Pilih instrumen",
+                                          value=[instrument_id for instrument_id in DEFAULT_BATTERY if instrument_id in order])
+        subject_input = gr.Textbox(label="ID Subjek (opsional)", placeholder="Isi untuk memantau perkembangan skor dari waktu ke waktu")
+        start_btn = gr.Button("Mulai Evaluasi Gabungan", variant="primary")
         
-        item_ids_state.change(
-            show_submit_button,
-            inputs=[item_ids_state],
-            outputs=[submit_btn]
+        # Cukup radio untuk semua instrumen pilihan sekaligus
+        n_slots = self.form_engine.slot_count(battery=order)
+        radio_components = [gr.Radio(choices=[], label="", visible=False) for _ in range(n_slots)]
+        
+        item_ids_state = gr.State([])
+        battery_state = gr.State([])
+        form_token_state = gr.State("")
+        
+        submit_btn = gr.Button("📝 Kirim Evaluasi Gabungan", variant="primary", visible=False)
+        results_output = gr.HTML()
+        pdf_download = gr.File(label="Download Laporan Gabungan PDF", visible=False)
+        
+        @timed("generate_battery_form")
+        def generate_battery_form(instrument_ids, rendered_token):
+            # Urutan form & laporan mengikuti urutan pilihan, bukan urutan klik
+            battery = tuple(instrument_id for instrument_id in order if instrument_id in (instrument_ids or ()))
+            updates, payload = self.form_engine.updates(battery, rendered_token, n_slots, self.current_lang)
+            if payload is None:
+                updates.extend([[], [], ""])
+            else:
+                updates.extend([list(payload.item_ids), list(battery), payload.token])
+            return updates
+        
+        start_btn.click(
+            generate_battery_form,
+            inputs=[battery_choice, form_token_state],
+            outputs=radio_components + [item_ids_state, battery_state, form_token_state]
         )
-    
-    def generate_pdf_report(self, instrument_id: str, score: Dict, interpretation: Dict, responses: Dict) -> str:
-        """Generate PDF report"""
-        instrument = self.instruments.get(instrument_id, {})
         
-        with tempfile.NamedTemporaryFile(mode='wb', suffix='.pdf', delete=False) as tmp_file:
-            with PdfPages(tmp_file) as pdf:
-                # Page 1
-                fig, ax = plt.subplots(figsize=(8.27, 11.69))
-                ax.axis('off')
-                
-                title_text = instrument.get('title', {}).get('id', 'Laporan')
-                ax.text(0.5, 0.95, f"Laporan Hasil {title_text}", 
-                       fontsize=24, fontweight='bold', ha='center', va='top', transform=ax.transAxes, color='#2c3e50')
-                ax.text(0.5, 0.90, f"Tanggal: {datetime.now().strftime('%d %B %Y')}", 
-                       fontsize=12, ha='center', va='top', transform=ax.transAxes, color='#7f8c8d')
-                ax.text(0.1, 0.80, "Ringkasan Hasil", fontsize=18, fontweight='bold', color='#2c3e50', transform=ax.transAxes)
-                ax.text(0.1, 0.75, f"Skor Total: {score.get('total', 0)}/{score.get('max_score', 0)}", 
-                       fontsize=16, color='#e74c3c', fontweight='bold', transform=ax.transAxes)
-                
-                if isinstance(interpretation, dict):
-                    ax.text(0.1, 0.70, f"Interpretasi: {interpretation.get('label', {}).get('id', 'N/A')}", 
-                           fontsize=16, color='#3498db', transform=ax.transAxes)
-                    ax.text(0.1, 0.65, f"Deskripsi: {interpretation.get('description', {}).get('id', 'N/A')}", 
-                           fontsize=14, color='#34495e', wrap=True, transform=ax.transAxes)
-                
-                ax.add_patch(plt.Rectangle((0.05, 0.55), 0.9, 0.25, fill=False, edgecolor='#3498db', linewidth=2, transform=ax.transAxes))
-                ax.text(0.5, 0.05, "⚠️ Platform ini untuk tujuan edukatif dan skrining awal saja", 
-                       fontsize=10, ha='center', va='bottom', transform=ax.transAxes, color='#7f8c8d', style='italic')
-                
-                pdf.savefig(fig, bbox_inches='tight')
-                plt.close(fig)
-                
-                # Page 2
-                fig, ax = plt.subplots(figsize=(8.27, 11.69))
-                ax.axis('off')
-                ax.text(0.5, 0.95, "Detail Jawaban", fontsize=20, fontweight='bold', ha='center', va='top', transform=ax.transAxes, color='#2c3e50')
-                
-                y_pos = 0.90
-                for item_id, response in responses.items():
-                    item_text = ""
-                    for item in instrument.get('items', []):
-                        if item['id'] == item_id:
-                            item_text = item['text']['id']
-                            break
-                    
-                    if y_pos < 0.1:
-                        pdf.savefig(fig, bbox_inches='tight')
-                        plt.close(fig)
-                        fig, ax = plt.subplots(figsize=(8.27, 11.69))
-                        ax.axis('off')
-                        y_pos = 0.95
-                    
-                    ax.text(0.1, y_pos, f"• {item_text}", fontsize=12, color='#34495e', transform=ax.transAxes)
-                    ax.text(0.7, y_pos, f"Jawaban: {response}", fontsize=12, color='#e74c3c', fontweight='bold', transform=ax.transAxes)
-                    y_pos -= 0.03
-                
-                pdf.savefig(fig, bbox_inches='tight')
-                plt.close(fig)
+        @timed("process_battery_assessment")
+        def process_battery_assessment(item_ids, instrument_ids, subject, *values):
+            if not instrument_ids:
+                yield MSG_SELECT_INSTRUMENTS, gr.update(visible=False)
+                return
+            if not item_ids:
+                yield MSG_FORM_EMPTY, gr.update(visible=False)
+                return
+            
+            if len(values) < len(item_ids) or not all(v is not None for v in values[:len(item_ids)]):
+                yield MSG_COMPLETE_ALL, gr.update(visible=False)
+                return
+            
+            # Semua instrumen diskor sekaligus sebelum apa pun dicatat
+            results = self.score_battery(instrument_ids, dict(zip(item_ids, values[:len(item_ids)])))
+            if not all(interpretation for _, _, _, interpretation in results):
+                yield MSG_INTERPRETATION_ERROR, gr.update(visible=False)
+                return
+            
+            html = ""
+            for instrument_id, responses_dict, score, _ in results:
+                html += self.render_result(instrument_id, score)
+                safety = self.evaluate_safety(instrument_id, responses_dict)
+                self.record_result(instrument_id, responses_dict, safety, subject)
+                html += self.render_safety_alert(safety, instrument_id=instrument_id)
             
-            return tmp_file.name
+            templates, report_results, key, report_date = self.battery_report_job(results)
+            pdf_path = self.report_store.get(BATTERY_REPORT, key)
+            if pdf_path:
+                yield html, gr.update(value=pdf_path, visible=True)
+                return
+            
+            # Satu dokumen untuk semua instrumen: satu job di pool, satu file di disk
+            try:
+                future = self.report_pool.submit_battery(templates, report_results, report_date)
+            except ReportPoolSaturated:
+                yield html + MSG_PDF_BUSY, gr.update(visible=False)
+                return
+            
+            yield html + MSG_PDF_PENDING, gr.update(visible=False)
+            
+            try:
+                pdf_path = self.report_store.put(BATTERY_REPORT, key, future.result())
+            except Exception:
+                logger.exception("Battery PDF report failed")
+                yield html + MSG_PDF_FAILED, gr.update(visible=False)
+                return
+            
+            yield html, gr.update(value=pdf_path, visible=True)
+        
+        submit_btn.click(
+            process_battery_assessment,
+            inputs=[item_ids_state, battery_state, subject_input] + radio_components,
+            outputs=[results_output, pdf_download],
+            concurrency_limit=serving.pdf_concurrency(),
+            concurrency_id="pdf_report"
+        )
+        
+        def show_battery_submit(item_ids):
+            return gr.update(visible=bool(item_ids))
+        
+        item_ids_state.change(show_battery_submit, inputs=[item_ids_state], outputs=[submit_btn])
     
     def create_results_interface(self):
         gr.Markdown("## 📊 Hasil dan Interpretasi Multi-Standar")
@@ -352,40 +724,32 @@ class MentalHealthScreeningApp:
         analyze_btn = gr.Button("Analisis", variant="primary")
         results_html = gr.HTML()
         
-        def analyze(phq9, gad7):
-            html = "<div style='margin-top: 20px;'>"
-            
-            if phq9 > 0:
-                phq9_interp = self.get_interpretation('phq9', {'total': phq9})
-                if phq9_interp:
-                    html += f"""
-                        <div style='background-color: #e3f2fd; border-left: 4px solid #2196f3; padding: 15px; margin: 10px 0; border-radius: 8px;'>
-                            <h3 style='color: #1976d2; margin-top: 0;'>PHQ-9 (Depresi)</h3>
-                            <p style='font-size: 20px;'><strong>Skor:</strong> <span style='color: #d32f2f;'>{phq9}/27</span></p>
-                            <p style='font-size: 16px;'><strong>Kategori:</strong> <span style='color: #388e3c;'>{phq9_interp['label']['id']}</span></p>
-                            <p style='color: #455a64;'>{phq9_interp['description']['id']}</p>
-                        </div>
-                    """
-            
-            if gad7 > 0:
-                gad7_interp = self.get_interpretation('gad7', {'total': gad7})
-                if gad7_interp:
-                    html += f"""
-                        <div style='background-color: #fff3e0; border-left: 4px solid #ff9800; padding: 15px; margin: 10px 0; border-radius: 8px;'>
-                            <h3 style='color: #f57c00; margin-top: 0;'>GAD-7 (Kecemasan)</h3>
-                            <p style='font-size: 20px;'><strong>Skor:</strong> <span style='color: #d32f2f;'>{gad7}/21</span></p>
-                            <p style='font-size: 16px;'><strong>Kategori:</strong> <span style='color: #388e3c;'>{gad7_interp['label']['id']}</span></p>
-                            <p style='color: #455a64;'>{gad7_interp['description']['id']}</p>
-                        </div>
-                    """
-            
-            if phq9 == 0 and gad7 == 0:
-                html += "<p style='color: #7f8c8d; font-style: italic;'>Masukkan skor untuk melihat interpretasi.</p>"
-            
-            html += "</div>"
-            return html
+        # Sepenuhnya di browser: hanya penjumlahan dan lookup band, tanpa data yang perlu disimpan
+        analysis_ids = ['phq9', 'gad7']
+        analyze_btn.click(
+            None, inputs=[phq9_score, gad7_score], outputs=[results_html],
+            js=client_scoring.analysis_js({instrument_id: self.client_bundle(instrument_id, 'analysis')
+                                           for instrument_id in analysis_ids if instrument_id in self.score_plans},
+                                          analysis_ids, {'enter_scores': MSG_ENTER_SCORES})
+        )
         
-        analyze_btn.click(analyze, inputs=[phq9_score, gad7_score], outputs=[results_html])
+        gr.Markdown("### 📈 Riwayat per Subjek")
+        with gr.Row():
+            trend_subject = gr.Textbox(label="ID Subjek", placeholder="ID yang diisi saat skrining")
+            trend_instrument = gr.Dropdown(choices=[("PHQ-9 (Depresi)", "phq9"), ("GAD-7 (Kecemasan)", "gad7"),
+                                                    ("PHQ-2 (Skrining Cepat)", "phq2")],
+                                           label="Instrumen", value="phq9")
+        trend_btn = gr.Button("Tampilkan Tren", variant="secondary")
+        trend_html = gr.HTML()
+        trend_plot = gr.LinePlot(x="tanggal", y="skor", title="Tren Skor", tooltip=["tanggal", "skor", "kategori"], visible=False)
+        
+        def show_trend(subject, instrument_id):
+            html, frame = self.trend(subject, instrument_id)
+            if html is None:
+                return MSG_NO_HISTORY, gr.update(visible=False)
+            return html, gr.update(value=frame, visible=True)
+        
+        trend_btn.click(show_trend, inputs=[trend_subject, trend_instrument], outputs=[trend_html, trend_plot])
     
     def create_panic_assistant(self):
         gr.Markdown("## 🆘 Asisten Serangan Panik")
@@ -401,45 +765,7 @@ class MentalHealthScreeningApp:
                 breathing_display = gr.HTML()
                 
                 def breathing_exercise(breathing_type):
-                    exercises = {
-                        "box": """
-                            <div style='text-align: center; padding: 30px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; color: white;'>
-                                <h2 style='color: white; margin-bottom: 20px;'>🫁 Pernapasan Kotak</h2>
-                                <div style='width: 200px; height: 200px; border: 4px solid white; margin: 20px auto; border-radius: 15px; display: flex; align-items: center; justify-content: center; font-size: 18px; font-weight: bold;'>
-                                    Tarik Napas<br>4 detik
-                                </div>
-                                <div style='text-align: left; max-width: 300px; margin: 20px auto;'>
-                                    <p>1. Tarik napas selama 4 detik</p><p>2. Tahan napas selama 4 detik</p>
-                                    <p>3. Keluarkan napas selama 4 detik</p><p>4. Tahan kosong selama 4 detik</p>
-                                </div>
-                            </div>
-                        """,
-                        "478": """
-                            <div style='text-align: center; padding: 30px; background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); border-radius: 12px; color: white;'>
-                                <h2 style='color: white; margin-bottom: 20px;'>🫁 4-7-8 Breathing</h2>
-                                <div style='width: 200px; height: 200px; border: 4px solid white; margin: 20px auto; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-size: 16px; font-weight: bold; text-align: center;'>
-                                    Tarik Napas<br>4 detik
-                                </div>
-                                <div style='text-align: left; max-width: 300px; margin: 20px auto;'>
-                                    <p>1. Tarik napas selama 4 detik</p><p>2. Tahan napas selama 7 detik</p>
-                                    <p>3. Keluarkan napas selama 8 detik</p>
-                                </div>
-                            </div>
-                        """,
-                        "deep": """
-                            <div style='text-align: center; padding: 30px; background: linear-gradient(135deg, #fa709a 0%, #fee140 100%); border-radius: 12px; color: white;'>
-                                <h2 style='color: white; margin-bottom: 20px;'>🫁 Pernapasan Dalam</h2>
-                                <div style='width: 200px; height: 200px; border: 4px solid white; margin: 20px auto; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-size: 16px; font-weight: bold; text-align: center;'>
-                                    Tarik Napas<br>Perlahan
-                                </div>
-                                <div style='text-align: left; max-width: 300px; margin: 20px auto;'>
-                                    <p>1. Tarik napas perlahan melalui hidung</p><p>2. Biarkan perut mengembang</p>
-                                    <p>3. Keluarkan napas perlahan melalui mulut</p>
-                                </div>
-                            </div>
-                        """
-                    }
-                    return exercises.get(breathing_type, "")
+                    return BREATHING_PANELS.get(breathing_type, "")
                 
                 start_breathing.click(breathing_exercise, inputs=[breathing_type], outputs=[breathing_display])
             
@@ -449,35 +775,7 @@ class MentalHealthScreeningApp:
                 grounding_display = gr.HTML()
                 
                 def grounding_exercise():
-                    return """
-                        <div style='padding: 20px; background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%); border-radius: 12px;'>
-                            <h2 style='color: #2c3e50; text-align: center; margin-bottom: 20px;'>🌟 Grounding 5-4-3-2-1</h2>
-                            <p style='text-align: center; color: #34495e; font-size: 18px; margin-bottom: 20px;'><strong>Gunakan indera Anda untuk kembali ke saat ini:</strong></p>
-                            <div style='display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px;'>
-                                <div style='background: rgba(52, 152, 219, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #3498db;'>
-                                    <h3 style='color: #2980b9; margin-top: 0;'>👁️ 5 HAL YANG ANDA LIHAT</h3>
-                                    <p style='color: #2c3e50;'>Lihat sekeliling dan identifikasi 5 benda</p>
-                                </div>
-                                <div style='background: rgba(46, 204, 113, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #2ecc71;'>
-                                    <h3 style='color: #27ae60; margin-top: 0;'>👂 4 HAL YANG ANDA DENGAR</h3>
-                                    <p style='color: #2c3e50;'>Dengarkan dan identifikasi 4 suara</p>
-                                </div>
-                                <div style='background: rgba(155, 89, 182, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #9b59b6;'>
-                                    <h3 style='color: #8e44ad; margin-top: 0;'>✋ 3 HAL YANG ANDA SENTUH</h3>
-                                    <p style='color: #2c3e50;'>Sentuh dan identifikasi 3 tekstur</p>
-                                </div>
-                                <div style='background: rgba(241, 196, 15, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #f1c40f;'>
-                                    <h3 style='color: #f39c12; margin-top: 0;'>👃 2 HAL YANG ANDA CIUM</h3>
-                                    <p style='color: #2c3e50;'>Cium dan identifikasi 2 bau</p>
-                                </div>
-                                <div style='background: rgba(230, 126, 34, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #e67e22;'>
-                                    <h3 style='color: #d35400; margin-top: 0;'>👅 1 HAL YANG ANDA RASA</h3>
-                                    <p style='color: #2c3e50;'>Rasakan dan identifikasi 1 rasa</p>
-                                </div>
-                            </div>
-                            <p style='text-align: center; color: #7f8c8d; font-style: italic; margin-top: 20px;'>Lakukan latihan ini perlahan dan fokus pada setiap indera</p>
-                        </div>
-                    """
+                    return GROUNDING_PANEL
                 
                 start_grounding.click(grounding_exercise, inputs=[], outputs=[grounding_display])
     
@@ -524,22 +822,110 @@ class MentalHealthScreeningApp:
                     </div>
                 """)
     
-    def create_screening_interface(self):
+    def create_admin_interface(self):
+        gr.Markdown("## 📈 Analitik Kohort")
+        gr.Markdown("*Distribusi band, rerata skor per kategori dan tingkat flag keselamatan dari rollup harian.*")
+        
+        with gr.Row():
+            admin_instrument = gr.Dropdown(choices=list(self.score_plans), label="Instrumen",
+                                           value=next(iter(self.score_plans), None))
+            admin_period = gr.Radio(choices=[("Mingguan", "week"), ("Harian", "day")], label="Periode", value="week")
+            admin_weeks = gr.Number(label="Rentang (minggu terakhir)", value=12, minimum=1, precision=0)
+        admin_btn = gr.Button("Tampilkan", variant="primary")
+        admin_summary = gr.HTML()
+        admin_table = gr.Dataframe(interactive=False)
+        
+        def show_analytics(instrument_id, period, weeks):
+            import pandas as pd
+
+            start = (datetime.now(timezone.utc) - timedelta(weeks=int(weeks or 12))).date()
+            rows = self.analytics.summary(instrument_id, start=start, period=period)
+            if not rows:
+                return MSG_NO_ANALYTICS, pd.DataFrame()
+            frame = pd.DataFrame(rows)
+            total = int(frame['n'].sum())
+            flagged = float((frame['flag_rate'] * frame['n']).sum() / total)
+            html = (f"<p style='font-size: 16px;'><strong>{total}</strong> submission, "
+                    f"tingkat flag keselamatan <strong>{flagged:.1%}</strong></p>")
+            return html, frame.round(3)
+        
+        admin_btn.click(show_analytics, inputs=[admin_instrument, admin_period, admin_weeks],
+                        outputs=[admin_summary, admin_table])
+        
+        gr.Markdown("### 📦 Ekspor Laporan PDF")
+        gr.Markdown("*Satu PDF per hasil tersimpan dalam satu file ZIP. Ekspor yang terputus dilanjutkan "
+                    "otomatis jika dijalankan lagi dengan pilihan yang sama.*")
+        with gr.Row():
+            export_instrument = gr.Dropdown(choices=list(self.score_plans), label="Instrumen",
+                                            value=next(iter(self.score_plans), None))
+            export_since = gr.Textbox(label="Dari tanggal (YYYY-MM-DD, opsional)")
+            export_until = gr.Textbox(label="Sampai tanggal (YYYY-MM-DD, opsional)")
+            export_lang = gr.Radio(choices=[("Indonesia", "id"), ("English", "en")], label="Bahasa", value="id")
+        export_btn = gr.Button("Ekspor ZIP", variant="secondary")
+        export_status = gr.HTML()
+        export_file = gr.File(label="Download ZIP", visible=False)
+        export_dir = os.environ.get("TEMAN_EXPORT_DIR", bulk_export.DEFAULT_EXPORT_DIR)
+        
+        def export_reports(instrument_id, since, until, lang):
+            def status(text, color='#34495e'):
+                return f"<p style='font-size: 15px; color: {color};'>{text}</p>"
+            try:
+                since_ts = bulk_export.parse_day(since)
+                until_ts = bulk_export.parse_day(until, end=True)
+            except ValueError:
+                yield status("⚠️ Format tanggal harus YYYY-MM-DD", '#e74c3c'), gr.update(visible=False)
+                return
+            out_path = os.path.join(export_dir, f"laporan-{instrument_id}-{(since or 'awal').strip()}-"
+                                                f"{(until or 'kini').strip()}-{lang}.zip")
+            
+            # Ekspor berjalan di thread terpisah; handler ini hanya melaporkan progres
+            latest: Dict[str, Any] = {}
+            outcome: Dict[str, Any] = {}
+            def run():
+                try:
+                    outcome['stats'] = self.export_reports(
+                        instrument_id, out_path, since=since_ts, until=until_ts, lang=lang,
+                        workers=int(os.environ.get("TEMAN_EXPORT_WORKERS", reports.DEFAULT_WORKERS)),
+                        progress=latest.update)
+                except Exception as e:
+                    logger.exception("Report export failed")
+                    outcome['error'] = e
+            worker = threading.Thread(target=run, name="report-export", daemon=True)
+            worker.start()
+            while worker.is_alive():
+                worker.join(0.5)
+                if latest:
+                    yield status(f"⏳ {bulk_export.format_progress(latest)}"), gr.update(visible=False)
+            if 'error' in outcome:
+                yield status(f"⚠️ Ekspor gagal: {outcome['error']}", '#e74c3c'), gr.update(visible=False)
+                return
+            stats = outcome['stats']
+            if not stats['entries']:
+                yield MSG_NO_ANALYTICS, gr.update(visible=False)
+                return
+            yield (status(f"✅ {bulk_export.format_progress(stats)} → <code>{out_path}</code>", '#388e3c'),
+                   gr.update(value=out_path, visible=True))
+        
+        # Satu ekspor pada satu waktu: pool render sudah memakai semua worker yang diizinkan
+        export_btn.click(export_reports, inputs=[export_instrument, export_since, export_until, export_lang],
+                         outputs=[export_status, export_file], concurrency_limit=1, concurrency_id="report_export")
+    
+    def create_screening_interface(self, blocks):
         with gr.Tabs():
             with gr.Tab("Skrining Cepat"):
                 self.create_quick_screening()
             
             with gr.Tab("Evaluasi Lengkap"):
-                self.create_full_assessment()
+                self.create_full_assessment(blocks)
+            
+            with gr.Tab("Evaluasi Gabungan"):
+                self.create_battery_assessment()
     
     def create_interface(self):
-        css = """
-        .gradio-container { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; }
-        .header-gradient { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; border-radius: 12px; margin-bottom: 20px; text-align: center; color: white; box-shadow: 0 10px 20px rgba(0,0,0,0.1); }
-        .emergency-banner { background: linear-gradient(45deg, #e74c3c, #c0392b); color: white; padding: 20px; border-radius: 12px; text-align: center; margin-top: 30px; box-shadow: 0 4px 6px rgba(0,0,0,0.1); }
-        """
-        
-        with gr.Blocks(theme=gr.themes.Soft(), css=css, title="Screening Kesehatan Mental") as app:
+        # Tema dan CSS diberikan saat launch() (Gradio 6), lihat launch_interface
+        # delete_cache: salinan file di cache Gradio juga dibersihkan berkala
+        cache_age = int(self.report_store.max_age)
+        with gr.Blocks(title="Screening Kesehatan Mental", delete_cache=(cache_age, cache_age)) as app:
             gr.HTML("""
                 <div class='header-gradient'>
                     <h1 style='font-size: 2.5em; margin: 0; text-shadow: 2px 2px 4px rgba(0,0,0,0.3);'>🧠 Screening Kesehatan Mental</h1>
@@ -550,7 +936,7 @@ class MentalHealthScreeningApp:
             
             with gr.Tabs():
                 with gr.Tab("🏠 Beranda"):
-                    self.create_screening_interface()
+                    self.create_screening_interface(app)
                 
                 with gr.Tab("📊 Hasil"):
                     self.create_results_interface()
@@ -560,6 +946,11 @@ class MentalHealthScreeningApp:
                 
                 with gr.Tab("📚 Edukasi"):
                     self.create_education_interface()
+                
+                # Tab admin hanya untuk deployment internal (TEMAN_ADMIN=1)
+                if os.environ.get("TEMAN_ADMIN") == "1":
+                    with gr.Tab("📈 Admin"):
+                        self.create_admin_interface()
             
             gr.HTML("""
                 <div class='emergency-banner'>
@@ -568,17 +959,195 @@ class MentalHealthScreeningApp:
                 </div>
             """)
         
+        app.queue(default_concurrency_limit=serving.scoring_concurrency())
+        # Semua handler dihitung untuk drain saat SIGTERM, juga jika metrik dimatikan
+        serving.IN_FLIGHT.track_blocks(app)
         return app
 
-if __name__ == "__main__":
-    app = MentalHealthScreeningApp()
-    interface = app.create_interface()
+def launch_interface(app: MentalHealthScreeningApp, port: int = None, warm: bool = True,
+                     profile_startup: str = None):
+    # TEMAN_WARMUP: background (default, setelah server listening) | sync | off
+    warmup = os.environ.get("TEMAN_WARMUP", "background") if warm else "off"
+    if profile_startup is not None:
+        # Semua fase dijalankan berurutan agar durasinya terukur
+        warmup = "sync"
+    if warm:
+        app.restore_analytics()
+    if warmup == "sync":
+        app.warm_caches()
+    app.report_store.start_sweeper()
+    
+    # Hot reload konfigurasi: TEMAN_CONFIG_WATCH=<detik>, 0 untuk mematikan
+    watch_interval = float(os.environ.get("TEMAN_CONFIG_WATCH", 2))
+    if watch_interval > 0:
+        app.registry.start_watcher(watch_interval)
+    app.analytics.start_autosave()
+    if metrics.REGISTRY.profiler is not None:
+        metrics.REGISTRY.profiler.start()
+
+    with STARTUP.phase("import gradio"):
+        gr.Blocks
+    with STARTUP.phase("build UI"):
+        interface = app.create_interface()
+    
+    port = port or int(os.environ.get("PORT", 7860))
+    draining = threading.Event()
+    
+    try:
+        with STARTUP.phase("launch server"):
+            interface.launch(
+                server_name="0.0.0.0",
+                server_port=port,
+                share=False,
+                show_error=True,
+                prevent_thread_lock=True,
+                theme=gr.themes.Soft(),
+                css=APP_CSS
+            )
+        # Endpoint Prometheus di server yang sama dengan UI
+        metrics.REGISTRY.mount(interface.app)
+        # API JSON untuk aplikasi mitra: hanya jika diaktifkan (TEMAN_API=1) dan token diset
+        if os.environ.get("TEMAN_API") == "1":
+            api_token = os.environ.get("TEMAN_API_TOKEN", "")
+            if api_token:
+                batcher = api.mount(interface.app, app, api_token)
+                metrics.REGISTRY.add_collector("api_batcher", batcher.stats)
+            else:
+                logger.warning("TEMAN_API=1 but TEMAN_API_TOKEN is not set; JSON API not mounted")
+        serving.mount_health(interface.app, draining)
+        
+        if warmup == "background":
+            threading.Thread(target=app.warm_caches, name="warm-up", daemon=True).start()
+        if profile_startup is not None:
+            STARTUP.write(profile_startup or None)
+            interface.close()
+            return
+        
+        # SIGTERM: tolak trafik baru lewat /healthz, tunggu handler selesai, baru tutup server
+        serving.wait_for_shutdown(draining)
+        draining.set()
+        serving.drain(serving.IN_FLIGHT,
+                      timeout=float(os.environ.get("TEMAN_DRAIN_TIMEOUT", serving.DEFAULT_DRAIN_TIMEOUT)))
+        interface.close()
+    finally:
+        # Tulis sisa hasil di antrean sebelum keluar
+        if app.result_store is not None:
+            app.result_store.close()
+        app.analytics.stop_autosave()
+        app.report_pool.shutdown(wait=False)
+
+def serve(app: MentalHealthScreeningApp, workers: int, port: int = None) -> int:
+    """Muat semua konfigurasi sekali di master, lalu fork worker di port dasar + indeks"""
+    port = port or int(os.environ.get("PORT", 7860))
+    app.warm_up()
+    if workers <= 1:
+        launch_interface(app, port=port, warm=False)
+        return 0
+    
+    def run_worker(index: int):
+        app.configure_worker(index, workers)
+        launch_interface(app, port=port + index, warm=False)
+    
+    logger.info("Serving %d workers on ports %d-%d", workers, port, port + workers - 1)
+    return serving.prefork(workers, run_worker)
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Screening Kesehatan Mental")
+    subparsers = parser.add_subparsers(dest="command")
+    
+    score_parser = subparsers.add_parser("score", help="Skor file respons massal (CSV/Parquet)")
+    score_parser.add_argument("--instrument", required=True, help="ID instrumen, mis. phq9, dass21")
+    score_parser.add_argument("--in", dest="in_path", required=True, help="File respons (.csv/.parquet)")
+    score_parser.add_argument("--out", dest="out_path", required=True, help="File hasil (.csv/.parquet)")
+    score_parser.add_argument("--lang", default="id", help="Bahasa label band (id/en)")
+    score_parser.add_argument("--chunk-size", type=int, default=batch_scoring.DEFAULT_CHUNK_SIZE)
+    score_parser.add_argument("--flagged-only", action="store_true",
+                              help="Hanya tulis baris yang ditandai aturan keselamatan")
+    
+    psy_parser = subparsers.add_parser("psychometrics", help="Reliabilitas dan statistik item dari file respons")
+    psy_parser.add_argument("--instrument", required=True, help="ID instrumen, mis. phq9, dass21")
+    psy_parser.add_argument("--in", dest="in_paths", required=True, action="append",
+                            help="File respons (.csv/.parquet); boleh diulang")
+    psy_parser.add_argument("--out", dest="out_path", help="Simpan statistik lengkap sebagai JSON")
+    psy_parser.add_argument("--chunk-size", type=int, default=batch_scoring.DEFAULT_CHUNK_SIZE)
+    psy_parser.add_argument("--workers", type=int, default=1, help="Jumlah proses (satu file per proses)")
+    
+    export_parser = subparsers.add_parser("export-reports", help="Satu laporan PDF per responden ke file ZIP")
+    export_parser.add_argument("--instrument", required=True, help="ID instrumen, mis. phq9, dass21")
+    export_parser.add_argument("--in", dest="in_paths", action="append",
+                               help="File respons (.csv/.parquet); boleh diulang. Tanpa --in: hasil tersimpan")
+    export_parser.add_argument("--since", help="Hasil tersimpan mulai tanggal (YYYY-MM-DD)")
+    export_parser.add_argument("--until", help="Hasil tersimpan sampai tanggal (YYYY-MM-DD, inklusif)")
+    export_parser.add_argument("--out", dest="out_path", required=True, help="File ZIP tujuan")
+    export_parser.add_argument("--lang", default="id", help="Bahasa laporan (id/en)")
+    export_parser.add_argument("--name-column", help="Kolom file respons untuk nama file PDF (mis. subject)")
+    export_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Jumlah proses render")
+    export_parser.add_argument("--batch-size", type=int, default=bulk_export.DEFAULT_BATCH_SIZE,
+                               help="Baris per job render")
+    export_parser.add_argument("--restart", action="store_true", help="Abaikan checkpoint dan mulai dari awal")
+    
+    columnar_parser = subparsers.add_parser("export-columnar",
+                                            help="Hasil tersimpan ke file .npy per instrumen (memory-mappable)")
+    columnar_parser.add_argument("--out", dest="out_dir", required=True, help="Direktori tujuan")
+    columnar_parser.add_argument("--instrument", dest="instruments", action="append",
+                                 help="ID instrumen; boleh diulang (default: semua)")
+    columnar_parser.add_argument("--since", help="Mulai tanggal (YYYY-MM-DD)")
+    columnar_parser.add_argument("--until", help="Sampai tanggal (YYYY-MM-DD, inklusif)")
     
-    port = int(os.environ.get("PORT", 7860))
+    serve_parser = subparsers.add_parser("serve", help="Mode produksi: beberapa proses worker")
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                              help="Jumlah worker (masing-masing di port dasar + indeks)")
+    serve_parser.add_argument("--port", type=int, default=None, help="Port dasar (default: $PORT atau 7860)")
     
-    interface.launch(
-        server_name="0.0.0.0",
-        server_port=port,
-        share=False,
-        show_error=True
-    )
+    parser.add_argument("--profile-startup", nargs="?", const="", metavar="JSON",
+                        help="Ukur waktu import, muat konfigurasi dan launch lalu keluar; opsional simpan JSON")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    with STARTUP.phase("init app"):
+        app = MentalHealthScreeningApp()
+    
+    if args.command == "score":
+        rows = app.score_file(args.instrument, args.in_path, args.out_path,
+                              lang=args.lang, chunk_size=args.chunk_size, flagged_only=args.flagged_only)
+        print(f"Scored {rows} rows -> {args.out_path}")
+        return 0
+    
+    if args.command == "psychometrics":
+        stats = app.psychometrics(args.instrument, args.in_paths, chunk_size=args.chunk_size, workers=args.workers)
+        print(psychometrics.format_table(stats))
+        if args.out_path:
+            with open(args.out_path, 'w', encoding='utf-8') as f:
+                json.dump(stats, f, indent=2)
+        return 0
+    
+    if args.command == "export-reports":
+        last = [0.0]
+        def report_progress(stats):
+            if time.monotonic() - last[0] >= 1.0:
+                last[0] = time.monotonic()
+                print(bulk_export.format_progress(stats), file=sys.stderr, flush=True)
+        stats = app.export_reports(args.instrument, args.out_path, paths=args.in_paths,
+                                   since=bulk_export.parse_day(args.since), until=bulk_export.parse_day(args.until, end=True),
+                                   lang=args.lang, workers=args.workers, batch_size=args.batch_size,
+                                   name_column=args.name_column, resume=not args.restart, progress=report_progress)
+        print(f"Exported {stats['entries']} reports ({stats['skipped']} rows skipped) -> {args.out_path}")
+        return 0
+    
+    if args.command == "export-columnar":
+        meta = app.export_columnar(args.out_dir, args.instruments, since=bulk_export.parse_day(args.since),
+                                   until=bulk_export.parse_day(args.until, end=True))
+        for instrument_id, info in meta['instruments'].items():
+            skipped = f" ({info['skipped']} skipped)" if info['skipped'] else ""
+            print(f"{instrument_id}: {info['rows']} rows{skipped}")
+        print(f"Exported -> {args.out_dir}")
+        return 0
+    
+    if args.command == "serve":
+        return serve(app, args.workers, port=args.port)
+    
+    launch_interface(app, profile_startup=args.profile_startup)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# Skoring batch untuk file respons massal (CSV / Parquet)
+# Memakai ScorePlan yang sama dengan skoring per-request, tetapi dalam bentuk
+# operasi matriks NumPy dan dibaca per chunk agar memori tetap terbatas.
+
+import os
+from typing import Dict, List, Iterator, Optional, Tuple
+
+import numpy as np
+
+from scoring import ScorePlan
+from safety import SafetyEngine
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def score_matrix(plan: ScorePlan, responses: np.ndarray) -> np.ndarray:
+    """Skor (n_baris, n_kategori) dari matriks jawaban (n_baris, n_item)."""
+    return responses.astype(np.int64, copy=False) @ plan.weights.T
+
+
+def _band_edges(bands) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if not bands:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, np.empty(0, dtype=np.intp)
+    lows = np.array([band['range'][0] for band in bands], dtype=np.float64)
+    highs = np.array([band['range'][1] for band in bands], dtype=np.float64)
+    order = np.argsort(lows, kind='stable')
+    return lows[order], highs[order], order
+
+
+def band_indices(plan: ScorePlan, scores: np.ndarray) -> np.ndarray:
+    """Indeks band interpretasi per skor (-1 jika di luar semua rentang)."""
+    result = np.full(scores.shape, -1, dtype=np.int16)
+    for category, bands in enumerate(plan.bands):
+        lows, highs, order = _band_edges(bands)
+        if not len(lows):
+            continue
+        column = scores[:, category]
+        position = np.searchsorted(lows, column, side='right') - 1
+        clipped = np.clip(position, 0, None)
+        hit = (position >= 0) & (column <= highs[clipped])
+        result[:, category] = np.where(hit, order[clipped], -1)
+    return result
+
+
+def valid_rows(plan: ScorePlan, responses: np.ndarray, allowed: np.ndarray,
+               missing_ok: Optional[np.ndarray] = None) -> np.ndarray:
+    """True jika setiap jawaban adalah nilai opsi yang sah untuk itemnya.
+
+    `missing_ok` (bool per slot) mengizinkan -1 (tidak dijawab) pada slot tersebut.
+    """
+    valid = np.ones(len(responses), dtype=bool)
+    # Per kolom: lookup 1-D jauh lebih murah daripada fancy indexing 2-D atas seluruh matriks
+    for slot in range(plan.n_items):
+        column = responses[:, slot]
+        in_range = (column >= 0) & (column < allowed.shape[1])
+        ok = in_range & allowed[slot].take(np.where(in_range, column, 0))
+        if missing_ok is not None and missing_ok[slot]:
+            ok |= column == -1
+        valid &= ok
+    return valid
+
+
+def allowed_values(plan: ScorePlan, instrument: Dict) -> np.ndarray:
+    """Tabel boolean (n_item, nilai_maks + 1) dari opsi yang sah per slot."""
+    options = {item['id']: [opt['value'] for opt in item.get('options', [])]
+               for item in instrument.get('items', [])}
+    max_value = max([max(values) for values in options.values() if values] or [0])
+    table = np.zeros((plan.n_items, int(max_value) + 1), dtype=bool)
+    for slot, item_id in enumerate(plan.item_ids):
+        values = options.get(item_id)
+        if values:
+            table[slot, values] = True
+        else:
+            table[slot, :] = True
+    return table
+
+
+def _column_names(plan: ScorePlan) -> List[Tuple[str, str]]:
+    if plan.scoring_type == 'sum':
+        return [('total', 'band')]
+    return [(f"{category}_score", f"{category}_band") for category in plan.categories]
+
+
+def score_frame(plan: ScorePlan, instrument: Dict, frame: "pd.DataFrame", lang: str = "id",
+                allowed: Optional[np.ndarray] = None, safety: Optional[SafetyEngine] = None) -> "pd.DataFrame":
+    """Skor satu chunk DataFrame; kolom non-item diteruskan apa adanya."""
+    import pandas as pd
+
+    scored_items = {plan.item_ids[slot] for slots in plan.category_slots for slot in slots}
+    missing = sorted(scored_items - set(frame.columns))
+    if missing:
+        raise ValueError(f"Missing response columns for {plan.instrument_id}: {', '.join(missing)}")
+
+    # Jawaban kosong/non-numerik = -1 sehingga gagal validasi pada item yang diskor;
+    # item yang tidak diskor boleh kosong. Skor dihitung dengan -1 sebagai 0.
+    responses = np.full((len(frame), plan.n_items), -1, dtype=np.int64)
+    for slot, item_id in enumerate(plan.item_ids):
+        if item_id in frame.columns:
+            responses[:, slot] = pd.to_numeric(frame[item_id], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+    answered = np.maximum(responses, 0)
+
+    if allowed is None:
+        allowed = allowed_values(plan, instrument)
+    scored_slots = {int(slot) for slots in plan.category_slots for slot in slots}
+    missing_ok = np.array([slot not in scored_slots for slot in range(plan.n_items)])
+    scores = score_matrix(plan, answered)
+    bands = band_indices(plan, scores)
+    valid = valid_rows(plan, responses, allowed, missing_ok)
+
+    out = frame[[column for column in frame.columns if column not in plan.slots]].copy()
+    for category, (score_column, band_column) in enumerate(_column_names(plan)):
+        labels = np.array([band['label'].get(lang, '') for band in plan.bands[category]] + [''], dtype=object)
+        out[score_column] = scores[:, category]
+        out[band_column] = labels[bands[:, category]]
+        out[f"{band_column}_index"] = bands[:, category]
+    out['valid'] = valid
+
+    if safety is not None:
+        triage = safety.evaluate_batch(plan.instrument_id, answered, scores)
+        priorities = np.array(safety.priorities + [''], dtype=object)
+        out['priority'] = priorities[triage['priority']]
+        out['risk_score'] = triage['risk_score']
+        out['safety_alert'] = triage['alert']
+        out['flagged'] = triage['flagged']
+    return out
+
+
+def _is_parquet(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in ('.parquet', '.pq')
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("Parquet input/output requires the 'pyarrow' package") from e
+    return pyarrow
+
+
+def iter_response_chunks(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         columns: Optional[List[str]] = None) -> Iterator["pd.DataFrame"]:
+    """Baca file respons per chunk (CSV atau Parquet); `columns` membatasi kolom yang dibaca."""
+    import pandas as pd
+
+    if _is_parquet(path):
+        pyarrow = _require_pyarrow()
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        if columns is not None:
+            columns = [column for column in columns if column in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        usecols = None if columns is None else set(columns).__contains__
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=usecols)
+
+
+def score_file(plan: ScorePlan, instrument: Dict, in_path: str, out_path: str,
+               lang: str = "id", chunk_size: int = DEFAULT_CHUNK_SIZE,
+               safety: Optional[SafetyEngine] = None, flagged_only: bool = False) -> int:
+    """Skor file respons secara streaming; mengembalikan jumlah baris yang ditulis.
+
+    Dengan `safety`, kolom triase (priority, risk_score, safety_alert, flagged)
+    ditambahkan; `flagged_only` hanya menulis baris yang ditandai.
+    """
+    allowed = allowed_values(plan, instrument)
+    rows = 0
+    first = True
+    writer = None
+    try:
+        for chunk in iter_response_chunks(in_path, chunk_size):
+            scored = score_frame(plan, instrument, chunk, lang, allowed, safety)
+            if flagged_only:
+                scored = scored[scored['flagged']]
+            if _is_parquet(out_path):
+                pyarrow = _require_pyarrow()
+                table = pyarrow.Table.from_pandas(scored, preserve_index=False)
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(out_path, table.schema)
+                else:
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+            else:
+                scored.to_csv(out_path, mode='w' if first else 'a', header=first, index=False)
+            first = False
+            rows += len(scored)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
@@ -0,0 +1,358 @@
+# Benchmark latensi & beban untuk handler aplikasi
+# Menjalankan skenario langsung (method app + fungsi event Gradio) dan lewat
+# gradio_client terhadap create_interface() yang diluncurkan di localhost,
+# dengan N sesi paralel yang mengirim jawaban PHQ-9/GAD-7/DASS-21/CBI acak.
+#
+#   python benchmarks/bench.py --sessions 8 --requests 50 --save-baseline benchmarks/baseline.json
+#   python benchmarks/bench.py --sessions 8 --requests 50 --baseline benchmarks/baseline.json
+#
+# Run pembanding gagal (exit code 1) jika p95 atau throughput suatu skenario
+# lebih buruk dari baseline melebihi --tolerance.
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Callable, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FULL_INSTRUMENTS = ("phq9", "gad7", "dass21", "cbi")
+
+
+def rss_bytes() -> int:
+    """RSS proses saat ini (Linux /proc), 0 jika tidak tersedia"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def dir_usage(paths: List[str]) -> Tuple[int, int]:
+    files = size = 0
+    for root in paths:
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                try:
+                    size += os.path.getsize(os.path.join(dirpath, name))
+                    files += 1
+                except OSError:
+                    pass
+    return files, size
+
+
+def random_responses(instrument: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    # Distribusi condong ke jawaban rendah, seperti populasi umum
+    responses = {}
+    for item in instrument.get('items', []):
+        values = [opt['value'] for opt in item.get('options', [])]
+        weights = [len(values) - i for i in range(len(values))]
+        responses[item['id']] = rng.choices(values, weights=weights)[0]
+    return responses
+
+
+def random_choices(instrument: Dict[str, Any], rng: random.Random) -> List[int]:
+    # Indeks pilihan per item (seperti yang dicatat event select radio), distribusi sama dengan random_responses
+    choices = []
+    for item in instrument.get('items', []):
+        n = len(item.get('options', []))
+        choices.append(rng.choices(range(n), weights=[n - i for i in range(n)])[0])
+    return choices
+
+
+def summarize(latencies: List[float], wall: float, errors: int) -> Dict[str, float]:
+    ms = np.asarray(latencies) * 1000.0
+    if not len(ms):
+        return {'count': 0, 'errors': errors}
+    return {
+        'count': int(len(ms)),
+        'errors': errors,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'max_ms': float(ms.max()),
+        'throughput_rps': float(len(ms) / wall) if wall > 0 else 0.0
+    }
+
+
+def run_concurrent(sessions: int, requests: int, make_session: Callable[[int], Callable[[], None]]) -> Dict[str, float]:
+    """Jalankan `requests` panggilan di tiap sesi secara paralel"""
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(index: int):
+        call = make_session(index)
+        local = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                call()
+            except Exception as e:
+                with lock:
+                    errors[0] += 1
+                    if errors[0] == 1:
+                        print(f"  first error: {e!r}", file=sys.stderr)
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(worker, range(sessions)))
+    return summarize(latencies, time.perf_counter() - start, errors[0])
+
+
+def event_functions(demo) -> Dict[str, Callable]:
+    fns = demo.fns.values() if isinstance(demo.fns, dict) else demo.fns
+    return {block_fn.fn.__name__: block_fn.fn for block_fn in fns if block_fn.fn is not None}
+
+
+def drain(result):
+    # Handler generator (process_full_assessment) dijalankan sampai selesai
+    if hasattr(result, '__next__'):
+        for result in result:
+            pass
+    return result
+
+
+def direct_scenarios(app, demo, seed: int) -> Dict[str, Callable[[int], Callable[[], None]]]:
+    events = event_functions(demo)
+    n_slots = app.form_engine.slot_count()
+
+    def session(body: Callable[[random.Random], None]):
+        # Tiap sesi punya RNG sendiri agar run dapat diulang
+        def make(index: int):
+            rng = random.Random(f"{seed}:{body.__name__}:{index}")
+            return lambda: body(rng)
+        return make
+
+    def calculate_score(rng):
+        instrument_id = rng.choice(FULL_INSTRUMENTS)
+        app.calculate_score(instrument_id, random_responses(app.instruments[instrument_id], rng))
+
+    def get_interpretation(rng):
+        instrument_id = rng.choice(FULL_INSTRUMENTS)
+        score = app.calculate_score(instrument_id, random_responses(app.instruments[instrument_id], rng))
+        app.get_interpretation(instrument_id, score)
+
+    def generate_pdf_report(rng):
+        instrument_id = rng.choice(FULL_INSTRUMENTS)
+        responses = random_responses(app.instruments[instrument_id], rng)
+        score = app.calculate_score(instrument_id, responses)
+        app.generate_pdf_report(instrument_id, score, app.get_interpretation(instrument_id, score), responses)
+
+    def generate_battery_report(rng):
+        responses = {}
+        for instrument_id in FULL_INSTRUMENTS[:3]:
+            responses.update(random_responses(app.instruments[instrument_id], rng))
+        app.generate_battery_report(list(FULL_INSTRUMENTS[:3]), responses)
+
+    def generate_form(rng):
+        events['generate_form'](rng.choice(FULL_INSTRUMENTS), "")
+
+    def quick_screening_event(rng):
+        responses = random_responses(app.instruments['phq2'], rng)
+        events['process_quick_screening']("", *responses.values())
+
+    def full_assessment_event(rng):
+        instrument_id = rng.choice(FULL_INSTRUMENTS)
+        session_id = events['generate_form'](instrument_id, "")[n_slots]
+        for slot, choice in enumerate(random_choices(app.instruments[instrument_id], rng)):
+            app.sessions.answer(session_id, slot, choice)
+        drain(events['process_full_assessment'](session_id, ""))
+
+    def battery_assessment_event(rng):
+        form = events['generate_battery_form'](list(FULL_INSTRUMENTS[:3]), "")
+        item_ids, battery = form[-3], form[-2]
+        responses = {}
+        for instrument_id in battery:
+            responses.update(random_responses(app.instruments[instrument_id], rng))
+        drain(events['process_battery_assessment'](item_ids, battery, "", *[responses[i] for i in item_ids]))
+
+    return {
+        'calculate_score': session(calculate_score),
+        'get_interpretation': session(get_interpretation),
+        'generate_pdf_report': session(generate_pdf_report),
+        'generate_battery_report': session(generate_battery_report),
+        'generate_form': session(generate_form),
+        'event_quick_screening': session(quick_screening_event),
+        'event_full_assessment': session(full_assessment_event),
+        'event_battery_assessment': session(battery_assessment_event),
+    }
+
+
+def client_scenarios(app, demo, seed: int) -> Tuple[Dict[str, Callable[[int], Callable[[], None]]], Callable[[], None]]:
+    """Skenario lewat gradio_client (HTTP + antrean Gradio) terhadap server lokal"""
+    from gradio_client import Client
+
+    demo.queue(default_concurrency_limit=None)
+    demo.launch(server_name="127.0.0.1", server_port=None, prevent_thread_lock=True, quiet=True,
+                show_error=True)
+    url = demo.local_url
+
+    def quick_session(index: int):
+        rng = random.Random(f"{seed}:client_quick:{index}")
+        client = Client(url, verbose=False)
+        def call():
+            responses = random_responses(app.instruments['phq2'], rng)
+            client.predict("", *responses.values(), api_name="/process_quick_screening")
+        return call
+
+    def full_session(index: int):
+        # Satu Client = satu sesi Gradio, state form disimpan server per sesi
+        rng = random.Random(f"{seed}:client_full:{index}")
+        client = Client(url, verbose=False)
+        def call():
+            instrument_id = rng.choice(FULL_INSTRUMENTS)
+            session_id = client.predict(instrument_id, api_name="/generate_form")[app.form_engine.slot_count()]
+            # Event select radio membawa SelectData yang tidak bisa dikirim gradio_client; jawaban dicatat langsung
+            for slot, choice in enumerate(random_choices(app.instruments[instrument_id], rng)):
+                app.sessions.answer(session_id, slot, choice)
+            client.predict(session_id, "", api_name="/process_full_assessment")
+        return call
+
+    return {'client_quick_screening': quick_session, 'client_full_assessment': full_session}, demo.close
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float,
+            min_delta_ms: float = 1.0) -> List[str]:
+    """Daftar regresi; selisih di bawah `min_delta_ms` dianggap noise pengukuran"""
+    regressions = []
+    for name, base in baseline.get('scenarios', {}).items():
+        current = results['scenarios'].get(name)
+        if current is None or not base.get('count'):
+            continue
+        if current.get('errors', 0) > base.get('errors', 0):
+            regressions.append(f"{name}: errors {current['errors']} > baseline {base['errors']}")
+        if (current.get('p95_ms', 0) > base['p95_ms'] * (1 + tolerance)
+                and current['p95_ms'] - base['p95_ms'] > min_delta_ms):
+            regressions.append(f"{name}: p95 {current['p95_ms']:.2f} ms > baseline {base['p95_ms']:.2f} ms")
+        if base['p50_ms'] >= min_delta_ms and current.get('throughput_rps', 0) < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['throughput_rps']:.1f}/s < baseline {base['throughput_rps']:.1f}/s")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark latensi handler Teman Mentalmu")
+    parser.add_argument("--sessions", type=int, default=8, help="Jumlah sesi paralel")
+    parser.add_argument("--requests", type=int, default=50, help="Request per sesi per skenario")
+    parser.add_argument("--mode", choices=("direct", "client", "all"), default="all")
+    parser.add_argument("--only", action="append", help="Jalankan skenario tertentu saja (bisa berulang)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Simpan hasil run ini sebagai JSON")
+    parser.add_argument("--save-baseline", help="Simpan hasil sebagai baseline JSON")
+    parser.add_argument("--baseline", help="Bandingkan dengan baseline JSON; exit 1 jika ada regresi")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Toleransi regresi relatif (default 0.25)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="Selisih latensi absolut minimum yang dianggap regresi (default 1 ms)")
+    args = parser.parse_args(argv)
+
+    # Laporan, cache Gradio, penyimpanan hasil, rollup dan ekspor di direktori sementara
+    # sendiri agar pertumbuhan file terukur dan data sintetis tidak masuk ke data/ asli
+    work_dir = tempfile.mkdtemp(prefix="teman-bench-")
+    os.environ.setdefault("TEMAN_REPORT_DIR", os.path.join(work_dir, "reports"))
+    os.environ.setdefault("GRADIO_TEMP_DIR", os.path.join(work_dir, "gradio"))
+    os.environ.setdefault("TEMAN_RESULT_STORE", f"sqlite:{os.path.join(work_dir, 'results.sqlite3')}")
+    os.environ.setdefault("TEMAN_ROLLUP_PATH", os.path.join(work_dir, "rollups.json"))
+    os.environ.setdefault("TEMAN_EXPORT_DIR", os.path.join(work_dir, "exports"))
+    os.environ.setdefault("GRADIO_ANALYTICS_ENABLED", "False")
+    watched_dirs = [work_dir] + [
+        path for path in (os.environ["TEMAN_REPORT_DIR"], os.environ["GRADIO_TEMP_DIR"])
+        if not os.path.abspath(path).startswith(work_dir + os.sep)
+    ]
+
+    import app as teman
+
+    rss_start = rss_bytes()
+    files_start, bytes_start = dir_usage(watched_dirs)
+    startup = time.perf_counter()
+    app = teman.MentalHealthScreeningApp()
+    app.warm_up()
+    demo = app.create_interface()
+    startup = time.perf_counter() - startup
+
+    scenarios: Dict[str, Callable] = {}
+    close = None
+    if args.mode in ("direct", "all"):
+        scenarios.update(direct_scenarios(app, demo, args.seed))
+    if args.mode in ("client", "all"):
+        client, close = client_scenarios(app, demo, args.seed)
+        scenarios.update(client)
+    if args.only:
+        scenarios = {name: make for name, make in scenarios.items() if name in args.only}
+
+    results: Dict[str, Any] = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'sessions': args.sessions,
+            'requests': args.requests,
+            'seed': args.seed,
+            'startup_s': startup
+        },
+        'scenarios': {}
+    }
+    try:
+        for name, make_session in scenarios.items():
+            rss_before = rss_bytes()
+            files_before, bytes_before = dir_usage(watched_dirs)
+            summary = run_concurrent(args.sessions, args.requests, make_session)
+            files_after, bytes_after = dir_usage(watched_dirs)
+            summary['rss_growth_mb'] = (rss_bytes() - rss_before) / 1024 / 1024
+            summary['temp_files_growth'] = files_after - files_before
+            summary['temp_bytes_growth'] = bytes_after - bytes_before
+            results['scenarios'][name] = summary
+            print(f"{name:<26} n={summary['count']:<6} err={summary['errors']:<3} "
+                  f"p50={summary.get('p50_ms', 0):8.2f}ms p95={summary.get('p95_ms', 0):8.2f}ms "
+                  f"p99={summary.get('p99_ms', 0):8.2f}ms {summary.get('throughput_rps', 0):9.1f}/s "
+                  f"rss+{summary['rss_growth_mb']:.1f}MB files+{summary['temp_files_growth']}")
+    finally:
+        if close is not None:
+            close()
+        app.report_pool.shutdown()
+
+    files_end, bytes_end = dir_usage(watched_dirs)
+    results['totals'] = {
+        'rss_start_mb': rss_start / 1024 / 1024,
+        'rss_end_mb': rss_bytes() / 1024 / 1024,
+        'temp_files_growth': files_end - files_start,
+        'temp_bytes_growth': bytes_end - bytes_start,
+        'report_store': app.report_store.stats(),
+        'report_pool': app.report_pool.stats(),
+        'fragments': app.fragments.stats()
+    }
+    print(f"RSS {results['totals']['rss_start_mb']:.1f} -> {results['totals']['rss_end_mb']:.1f} MB, "
+          f"temp files +{results['totals']['temp_files_growth']} ({results['totals']['temp_bytes_growth']} bytes)")
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"Saved {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
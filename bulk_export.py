@@ -0,0 +1,354 @@
+# Ekspor laporan PDF massal
+# Satu PDF per responden, dari file respons (CSV/Parquet) atau dari hasil yang
+# tersimpan di result store. Rendering disebar ke process pool per batch baris;
+# PDF yang selesai langsung ditulis berurutan ke satu file ZIP, jadi memori dan
+# disk sementara tetap terbatas berapa pun jumlah respondennya. Setelah setiap
+# batch, checkpoint (<zip>.progress.json) mencatat posisi baris sumber dan offset
+# ZIP yang sudah utuh; ekspor yang terputus (termasuk proses yang di-kill)
+# dilanjutkan dari sana tanpa merender ulang.
+
+import os
+import re
+import json
+import time
+import struct
+import zipfile
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Any, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import batch_scoring
+from pdf_template import ReportTemplate
+from scoring import ScorePlan, compile_instrument
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "exports")
+PROGRESS_SUFFIX = ".progress.json"
+
+# Header lokal ZIP (APPNOTE 4.3.7): dipakai untuk memulihkan entri setelah crash
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_SIGNATURE = b"PK\x03\x04"
+
+
+class ExportBatch(NamedTuple):
+    """Baris sumber yang sudah divalidasi; hanya baris sah yang dirender."""
+    end: int                # ordinal baris sumber setelah batch ini (posisi resume)
+    ordinals: List[int]     # ordinal baris sumber per baris yang dirender
+    names: List[str]        # ID subjek / nama baris (boleh kosong)
+    dates: List[str]        # tanggal yang dicetak di laporan
+    responses: np.ndarray   # (n, n_item) int64, -1 = tidak dijawab
+    skipped: int = 0        # baris tidak sah dalam rentang batch
+
+
+def parse_day(value: Optional[str], end: bool = False) -> Optional[float]:
+    """'YYYY-MM-DD' (waktu lokal) -> timestamp awal hari, atau awal hari berikutnya jika `end`"""
+    if not value:
+        return None
+    day = datetime.strptime(value.strip(), '%Y-%m-%d')
+    return (day + timedelta(days=1) if end else day).timestamp()
+
+
+def entry_name(instrument_id: str, ordinal: int, name: str = "") -> str:
+    """Nama file di ZIP; ordinal membuatnya unik dan stabil antar-resume"""
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', name or "").strip('_.')[:64]
+    return f"{instrument_id}-{ordinal + 1:06d}{'-' + slug if slug else ''}.pdf"
+
+
+# -- sumber baris -------------------------------------------------------
+
+def _split(first: int, end: int, ordinals: np.ndarray, names: List[str], dates: List[str], responses: np.ndarray,
+           batch_size: int) -> Iterator[ExportBatch]:
+    # Potong baris sah dari rentang sumber [first, end) menjadi batch; baris tidak sah
+    # dihitung di batch yang rentangnya memuat baris tersebut
+    previous = first
+    for start in range(0, max(len(ordinals), 1), batch_size):
+        stop = min(start + batch_size, len(ordinals))
+        batch_end = end if stop == len(ordinals) else int(ordinals[stop])
+        yield ExportBatch(batch_end, ordinals[start:stop].tolist(), names[start:stop], dates[start:stop],
+                          responses[start:stop], batch_end - previous - (stop - start))
+        previous = batch_end
+
+
+def file_batches(plan: ScorePlan, instrument: Dict, paths: Iterable[str], start: int = 0,
+                 batch_size: int = DEFAULT_BATCH_SIZE, chunk_size: int = batch_scoring.DEFAULT_CHUNK_SIZE,
+                 name_column: Optional[str] = None, date: Optional[str] = None) -> Iterator[ExportBatch]:
+    """Baris dari file respons mulai ordinal `start`; baris dengan jawaban tidak sah dilewati."""
+    import pandas as pd
+
+    allowed = batch_scoring.allowed_values(plan, instrument)
+    scored_slots = {int(slot) for slots in plan.category_slots for slot in slots}
+    scored_items = {plan.item_ids[slot] for slot in scored_slots}
+    # Item yang tidak diskor (mis. phq9_impairment) boleh kosong
+    missing_ok = np.array([slot not in scored_slots for slot in range(plan.n_items)])
+    date = date or datetime.now().strftime('%d %B %Y')
+    columns = list(plan.item_ids) + ([name_column] if name_column else [])
+
+    ordinal = 0
+    for path in paths:
+        for chunk in batch_scoring.iter_response_chunks(path, chunk_size, columns=columns):
+            first, ordinal = ordinal, ordinal + len(chunk)
+            if ordinal <= start:
+                continue
+            missing = sorted(scored_items - set(chunk.columns))
+            if missing:
+                raise ValueError(f"Missing response columns for {plan.instrument_id}: {', '.join(missing)}")
+            if start > first:
+                chunk = chunk.iloc[start - first:]
+                first = start
+
+            responses = np.full((len(chunk), plan.n_items), -1, dtype=np.int64)
+            for slot, item_id in enumerate(plan.item_ids):
+                if item_id in chunk.columns:
+                    responses[:, slot] = pd.to_numeric(chunk[item_id], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+            valid = batch_scoring.valid_rows(plan, responses, allowed, missing_ok)
+            keep = np.flatnonzero(valid)
+            if name_column and name_column in chunk.columns:
+                names = chunk[name_column].fillna("").astype(str).to_numpy()[keep].tolist()
+            else:
+                names = [""] * len(keep)
+            yield from _split(first, ordinal, first + keep, names, [date] * len(keep), responses[keep], batch_size)
+
+
+def file_source(paths: Iterable[str], name_column: Optional[str] = None) -> Dict[str, Any]:
+    """Deskripsi sumber file untuk checkpoint; ukuran dan mtime membuat file yang diubah memulai ekspor baru."""
+    files = []
+    for path in paths:
+        stat = os.stat(path)
+        files.append({'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+    return {'kind': 'file', 'files': files, 'name_column': name_column}
+
+
+def stored_batches(result_store, plan: ScorePlan, since: Optional[float] = None, until: Optional[float] = None,
+                   start: int = 0, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[ExportBatch]:
+    """Hasil tersimpan satu instrumen (since <= ts < until), urut seperti di store."""
+    ordinals, names, dates, vectors = [], [], [], []
+    skipped = 0
+    ordinal = -1
+    for row in result_store.iter_rows(plan.instrument_id, since, until):
+        ordinal += 1
+        if ordinal < start:
+            continue
+        # Baris dari versi instrumen dengan jumlah item berbeda tidak bisa dirender ulang
+        if len(row.responses) != plan.n_items:
+            skipped += 1
+            continue
+        ordinals.append(ordinal)
+        names.append(row.subject or "")
+        dates.append(datetime.fromtimestamp(row.timestamp).strftime('%d %B %Y'))
+        vectors.append(row.responses)
+        if len(ordinals) >= batch_size:
+            yield ExportBatch(ordinal + 1, ordinals, names, dates, np.stack(vectors).astype(np.int64), skipped)
+            ordinals, names, dates, vectors = [], [], [], []
+            skipped = 0
+    if ordinals or skipped:
+        responses = np.stack(vectors).astype(np.int64) if vectors else np.empty((0, plan.n_items), dtype=np.int64)
+        yield ExportBatch(ordinal + 1, ordinals, names, dates, responses, skipped)
+
+
+def format_progress(stats: Dict[str, Any]) -> str:
+    """Satu baris status untuk CLI dan tab admin"""
+    done = stats['rows'] - stats.get('resumed_from', 0)
+    rate = done / stats['elapsed'] if stats.get('elapsed') else 0.0
+    return (f"{stats['rows']:,} rows, {stats['entries']:,} reports, {stats['skipped']:,} skipped"
+            f"{f' ({rate:,.0f} rows/s)' if rate else ''}")
+
+
+# -- rendering --------------------------------------------------------
+
+def render_batch(plan: ScorePlan, template: ReportTemplate, ordinals: List[int], names: List[str],
+                 dates: List[str], responses: np.ndarray) -> List[Tuple[str, bytes]]:
+    """Skor satu batch secara vektor lalu render PDF per baris: [(nama entri, bytes)]"""
+    scores = batch_scoring.score_matrix(plan, np.where(responses < 0, 0, responses))
+    bands = batch_scoring.band_indices(plan, scores)
+    out = []
+    for i, ordinal in enumerate(ordinals):
+        score = plan.result(scores[i])
+        if plan.scoring_type == 'sum':
+            interpretation = plan.bands[0][bands[i, 0]] if bands[i, 0] >= 0 else {}
+        else:
+            interpretation = {category: plan.bands[c][bands[i, c]]
+                              for c, category in enumerate(plan.categories) if bands[i, c] >= 0}
+        answers = {item_id: int(value) for item_id, value in zip(plan.item_ids, responses[i].tolist()) if value >= 0}
+        out.append((entry_name(plan.instrument_id, ordinal, names[i]),
+                    template.render(score, interpretation, answers, dates[i])))
+    return out
+
+
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(instrument: Dict, template: ReportTemplate):
+    # ScorePlan memakai MappingProxyType (tidak bisa di-pickle), jadi dikompilasi ulang di worker;
+    # template dikirim sekali per worker, bukan per batch
+    _WORKER['plan'] = compile_instrument(instrument)
+    _WORKER['template'] = template
+
+
+def _render_worker(ordinals: List[int], names: List[str], dates: List[str], responses: np.ndarray) -> List[Tuple[str, bytes]]:
+    return render_batch(_WORKER['plan'], _WORKER['template'], ordinals, names, dates, responses)
+
+
+# -- ZIP + checkpoint ---------------------------------------------------
+
+def _dos_datetime(dos_date: int, dos_time: int) -> Tuple[int, ...]:
+    return ((dos_date >> 9) + 1980, (dos_date >> 5) & 0xF, dos_date & 0x1F,
+            dos_time >> 11, (dos_time >> 5) & 0x3F, (dos_time & 0x1F) * 2)
+
+
+def recover_entries(fp, end: int) -> List[zipfile.ZipInfo]:
+    """Bangun ulang ZipInfo dari header lokal di [0, end) untuk ZIP tanpa central directory"""
+    entries = []
+    offset = 0
+    while offset < end:
+        fp.seek(offset)
+        (signature, extract_version, _, flags, compress_type, dos_time, dos_date, crc,
+         compress_size, file_size, name_length, extra_length) = _LOCAL_HEADER.unpack(fp.read(_LOCAL_HEADER.size))
+        if signature != _LOCAL_SIGNATURE:
+            raise ValueError(f"No ZIP entry at offset {offset}")
+        name = fp.read(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+        info = zipfile.ZipInfo(name, _dos_datetime(dos_date, dos_time))
+        info.compress_type = compress_type
+        info.flag_bits = flags
+        info.extract_version = extract_version
+        info.CRC = crc
+        info.compress_size = compress_size
+        info.file_size = file_size
+        info.header_offset = offset
+        info.external_attr = 0o600 << 16
+        entries.append(info)
+        offset += _LOCAL_HEADER.size + name_length + extra_length + compress_size
+    if offset != end:
+        raise ValueError(f"Checkpoint offset {end} does not end on a ZIP entry")
+    return entries
+
+
+class ReportExport:
+    """Satu ekspor PDF massal ke ZIP yang dapat dilanjutkan dari checkpoint."""
+
+    def __init__(self, out_path: str, instrument: Dict, plan: ScorePlan, template: ReportTemplate,
+                 source: Dict[str, Any], workers: int = 1):
+        self.out_path = out_path
+        self.instrument = instrument
+        self.plan = plan
+        self.template = template
+        # Deskripsi sumber + versi template; checkpoint hanya dipakai jika sama persis
+        self.source = dict(source, instrument=plan.instrument_id, lang=template.lang,
+                           template=template.fingerprint)
+        self.workers = workers
+        self.rows = 0
+        self.entries = 0
+        self.skipped = 0
+        self.resumed_from = 0
+
+    @property
+    def progress_path(self) -> str:
+        return self.out_path + PROGRESS_SUFFIX
+
+    def checkpoint(self) -> Optional[Dict[str, Any]]:
+        """Checkpoint ekspor sebelumnya untuk sumber yang sama, jika ada"""
+        try:
+            with open(self.progress_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('source') != self.source or not os.path.exists(self.out_path):
+            return None
+        return state
+
+    def _save_checkpoint(self, offset: int):
+        state = {'source': self.source, 'rows': self.rows, 'entries': self.entries,
+                 'skipped': self.skipped, 'offset': offset}
+        tmp_path = self.progress_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.progress_path)
+
+    def _open(self, state: Optional[Dict[str, Any]]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.out_path)), exist_ok=True)
+        if state is None:
+            fp = open(self.out_path, 'w+b')
+            return fp, zipfile.ZipFile(fp, 'w', compression=zipfile.ZIP_DEFLATED)
+        # Entri setelah checkpoint (dan central directory lama) dibuang, lalu
+        # entri yang sudah aman didaftarkan ulang agar ikut di central directory baru
+        fp = open(self.out_path, 'r+b')
+        entries = recover_entries(fp, state['offset'])
+        fp.truncate(state['offset'])
+        fp.seek(state['offset'])
+        archive = zipfile.ZipFile(fp, 'w', compression=zipfile.ZIP_DEFLATED)
+        for info in entries:
+            archive.filelist.append(info)
+            archive.NameToInfo[info.filename] = info
+        return fp, archive
+
+    def stats(self) -> Dict[str, Any]:
+        return {'rows': self.rows, 'entries': self.entries, 'skipped': self.skipped,
+                'resumed_from': self.resumed_from, 'out_path': self.out_path}
+
+    def run(self, batches: Callable[[int], Iterator[ExportBatch]],
+            progress: Optional[Callable[[Dict[str, Any]], None]] = None, resume: bool = True) -> Dict[str, Any]:
+        """Render semua batch dari `batches(start)` ke ZIP; checkpoint setelah setiap batch."""
+        state = self.checkpoint() if resume else None
+        if state is not None:
+            self.rows, self.entries, self.skipped = state['rows'], state['entries'], state['skipped']
+            self.resumed_from = self.rows
+            logger.info("Resuming export %s at row %d (%d reports written)", self.out_path, self.rows, self.entries)
+        fp, archive = self._open(state)
+
+        executor = None
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=_init_worker, initargs=(self.instrument, self.template))
+        # Urutan tulis = urutan sumber; jendela batch yang sedang dirender dibatasi
+        window = max(1, self.workers) * 4
+        pending: "deque[Tuple[ExportBatch, Any]]" = deque()
+        started = time.monotonic()
+
+        def write_next():
+            batch, future = pending.popleft()
+            if future is not None:
+                for name, data in future.result():
+                    archive.writestr(name, data)
+            elif batch.ordinals:
+                for name, data in render_batch(self.plan, self.template, batch.ordinals, batch.names,
+                                               batch.dates, batch.responses):
+                    archive.writestr(name, data)
+            self.rows = batch.end
+            self.entries += len(batch.ordinals)
+            self.skipped += batch.skipped
+            fp.flush()
+            self._save_checkpoint(fp.tell())
+            if progress is not None:
+                progress(dict(self.stats(), elapsed=time.monotonic() - started))
+
+        try:
+            for batch in batches(self.rows):
+                while len(pending) >= window:
+                    write_next()
+                future = None
+                if executor is not None and batch.ordinals:
+                    future = executor.submit(_render_worker, batch.ordinals, batch.names, batch.dates, batch.responses)
+                pending.append((batch, future))
+            while pending:
+                write_next()
+        except BaseException:
+            # Checkpoint terakhir tetap berlaku; ZIP ditutup agar isinya bisa dibuka
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = None
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            archive.close()
+            fp.close()
+        # Selesai: checkpoint tidak diperlukan lagi
+        if os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+        return self.stats()
@@ -0,0 +1,77 @@
+# Skoring & interpretasi di browser
+# Tabel skoring hasil kompilasi (bobot per kategori, lookup skor -> band) dan
+# template HTML per band diekspor sebagai bundle JSON ringkas, lalu disisipkan
+# ke fungsi `js=` event Gradio. Skrining cepat dan tab Analisis dihitung di
+# browser tanpa round-trip; server hanya menerima jawaban final untuk
+# penyimpanan dan evaluasi aturan keselamatan.
+
+import json
+from typing import Callable, Dict, List, Any, Mapping
+
+from scoring import ScorePlan
+
+# Penanda posisi skor di template; diganti di browser
+SCORE_PLACEHOLDER = "@@SCORE@@"
+
+
+def instrument_bundle(plan: ScorePlan, render_band: Callable[[int, int], str]) -> Dict[str, Any]:
+    """Bundle satu instrumen; `render_band(kategori, band)` menghasilkan HTML dengan SCORE_PLACEHOLDER."""
+    return {
+        'items': list(plan.item_ids),
+        # Bobot sparse per kategori: [[slot, bobot], ...]
+        'weights': [[[int(slot), int(plan.weights[index, slot])] for slot in slots.tolist()]
+                    for index, slots in enumerate(plan.category_slots)],
+        'max': list(plan.max_scores),
+        'lookup': [lookup.tolist() for lookup in plan.band_lookup],
+        'templates': [[render_band(index, band) for band in range(len(plan.bands[index]))]
+                      for index in range(len(plan.categories))]
+    }
+
+
+def bundle_json(bundles: Mapping[str, Dict[str, Any]]) -> str:
+    return json.dumps(bundles, ensure_ascii=False, separators=(',', ':'))
+
+
+# Fungsi bersama: skor per kategori dari nilai jawaban (urutan = bundle.items)
+# dan indeks band (-1 bila skor bukan bilangan bulat atau di luar tabel)
+_HELPERS = """
+    const score = (b, values, c) => b.weights[c].reduce((sum, [slot, w]) => sum + w * values[slot], 0);
+    const band = (b, c, s) => (Number.isInteger(s) && s >= 0 && s < b.lookup[c].length) ? b.lookup[c][s] : -1;
+    const fill = (template, s) => template.split(PLACEHOLDER).join(s);
+"""
+
+
+def quick_screening_js(bundle: Dict[str, Any], messages: Dict[str, str]) -> str:
+    """Fungsi js untuk tombol Skrining Cepat: (subjek, ...jawaban) -> HTML hasil."""
+    return f"""(subject, ...values) => {{
+    const b = {bundle_json(bundle)};
+    const M = {json.dumps(messages, ensure_ascii=False)};
+    const PLACEHOLDER = {json.dumps(SCORE_PLACEHOLDER)};
+    {_HELPERS}
+    if (values.some(v => v === null || v === undefined)) return M.answer_all;
+    const total = score(b, values, 0);
+    const index = band(b, 0, total);
+    if (index < 0) return M.interpretation_error;
+    return fill(b.templates[0][index], total) + "</div>";
+}}"""
+
+
+def analysis_js(bundles: Dict[str, Dict[str, Any]], order: List[str], messages: Dict[str, str]) -> str:
+    """Fungsi js untuk tombol Analisis: satu kartu per skor instrumen yang diisi (> 0)."""
+    return f"""(...values) => {{
+    const B = {bundle_json(bundles)};
+    const order = {json.dumps(order)};
+    const M = {json.dumps(messages, ensure_ascii=False)};
+    const PLACEHOLDER = {json.dumps(SCORE_PLACEHOLDER)};
+    {_HELPERS}
+    // gr.Number mengirim float ke server (ditampilkan "4.0"); format yang sama dipakai di sini
+    const pyFloat = v => Number.isInteger(v) ? v.toFixed(1) : String(v);
+    let html = "<div style='margin-top: 20px;'>";
+    values.forEach((v, i) => {{
+        if (v === null || !(v > 0)) return;
+        const index = band(B[order[i]], 0, v);
+        if (index >= 0) html += fill(B[order[i]].templates[0][index], pyFloat(v));
+    }});
+    if (values.every(v => v === 0)) html += M.enter_scores;
+    return html + "</div>";
+}}"""
@@ -0,0 +1,279 @@
+# Ekspor kolom untuk analis
+# Hasil tersimpan ditulis per instrumen sebagai file .npy berlebar tetap: matriks
+# jawaban integer kecil (urutan kolom = `items` di YAML instrumen), skor dan band per
+# kategori, prioritas keselamatan, dan waktu, tanpa ID subjek. Sidecar meta.json
+# memuat urutan kolom, label band dan hash konfigurasi instrumen. Baris diurutkan
+# menurut waktu, sehingga pembaca bisa membuka file tanpa menyalin
+# (np.load(mmap_mode='r')) dan memotong rentang tanggal dengan searchsorted pada
+# kolom waktu tanpa membaca seluruh file.
+#
+#   <out>/meta.json
+#   <out>/<instrumen>/{ts,responses,scores,bands,priority}.npy
+
+import os
+import json
+import shutil
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Mapping, NamedTuple, Optional
+
+import numpy as np
+
+from config_registry import instrument_hash
+from scoring import ScorePlan
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "teman-columnar"
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+COLUMNS = ('ts', 'responses', 'scores', 'bands', 'priority')
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+def _int_dtype(low: int, high: int) -> np.dtype:
+    """Tipe integer terkecil yang memuat [low, high]"""
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def column_dtypes(plan: ScorePlan, instrument: Dict[str, Any]) -> Dict[str, np.dtype]:
+    """Lebar kolom per instrumen dari nilai opsi dan bobot skoring"""
+    values = [opt['value'] for item in instrument.get('items', []) for opt in item.get('options', [])]
+    max_value = max([abs(int(value)) for value in values] or [0], default=0)
+    # -1 = item tidak dijawab
+    bound = int(np.abs(plan.weights).sum(axis=1).max(initial=0)) * max(max_value, 1)
+    return {
+        'ts': np.dtype(np.float64),
+        'responses': _int_dtype(-1, max_value),
+        'scores': _int_dtype(-bound, bound),
+        'bands': _int_dtype(-1, max([len(bands) for bands in plan.bands] or [0])),
+        'priority': np.dtype(np.int8),
+    }
+
+
+class _NpyWriter:
+    """File .npy yang ditulis bertahap per chunk; jumlah baris di header diisi saat ditutup.
+
+    Header .npy dipadding oleh NumPy agar sumbu pertama bisa tumbuh tanpa mengubah
+    panjang header, jadi data bisa di-stream tanpa mengetahui jumlah baris di awal.
+    """
+
+    def __init__(self, path: str, dtype: np.dtype, width: Optional[int] = None):
+        self.path = path
+        self.dtype = dtype
+        self.tail = () if width is None else (width,)
+        self.rows = 0
+        self._file = open(path + '.tmp', 'wb')
+        self._write_header()
+        self._data_offset = self._file.tell()
+
+    def _write_header(self):
+        np.lib.format.write_array_header_1_0(self._file, {
+            'descr': np.lib.format.dtype_to_descr(self.dtype),
+            'fortran_order': False,
+            'shape': (self.rows,) + self.tail,
+        })
+
+    def append(self, array: np.ndarray):
+        if len(array) and np.issubdtype(self.dtype, np.integer):
+            info = np.iinfo(self.dtype)
+            if array.min() < info.min or array.max() > info.max:
+                raise ValueError(f"Values in {os.path.basename(self.path)} exceed {self.dtype}")
+        self._file.write(np.ascontiguousarray(array, dtype=self.dtype).tobytes())
+        self.rows += len(array)
+
+    def close(self):
+        self._file.seek(0)
+        self._write_header()
+        if self._file.tell() != self._data_offset:
+            raise RuntimeError(f"Header of {self.path} changed size")
+        self._file.close()
+        os.replace(self.path + '.tmp', self.path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self.path + '.tmp')
+        except FileNotFoundError:
+            pass
+
+
+def _sort_by_time(directory: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    # Hasil dari beberapa worker bisa sedikit tidak berurutan; permutasi ditulis per potongan
+    # dari memmap sehingga hanya indeks urutan (8 byte/baris) yang ada di memori
+    order = np.argsort(np.load(os.path.join(directory, 'ts.npy'), mmap_mode='r'), kind='stable')
+    for column in COLUMNS:
+        path = os.path.join(directory, f"{column}.npy")
+        source = np.load(path, mmap_mode='r')
+        target = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=source.dtype, shape=source.shape)
+        for start in range(0, len(order), chunk_size):
+            target[start:start + chunk_size] = source[order[start:start + chunk_size]]
+        target.flush()
+        del source, target
+        os.replace(path + '.tmp', path)
+
+
+def export_instrument(result_store, plan: ScorePlan, instrument: Dict[str, Any], directory: str,
+                      since: Optional[float] = None, until: Optional[float] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Tulis hasil satu instrumen (since <= ts < until) ke `directory`; mengembalikan metadata-nya"""
+    os.makedirs(directory, exist_ok=True)
+    dtypes = column_dtypes(plan, instrument)
+    n_categories = len(plan.categories)
+    writers = {
+        'ts': _NpyWriter(os.path.join(directory, 'ts.npy'), dtypes['ts']),
+        'responses': _NpyWriter(os.path.join(directory, 'responses.npy'), dtypes['responses'], plan.n_items),
+        'scores': _NpyWriter(os.path.join(directory, 'scores.npy'), dtypes['scores'], n_categories),
+        'bands': _NpyWriter(os.path.join(directory, 'bands.npy'), dtypes['bands'], n_categories),
+        'priority': _NpyWriter(os.path.join(directory, 'priority.npy'), dtypes['priority']),
+    }
+    skipped = 0
+    ordered = True
+    last = -np.inf
+    try:
+        for chunk in result_store.iter_chunks(plan.instrument_id, since=since, until=until, chunk_size=chunk_size):
+            # Baris dari versi instrumen dengan jumlah item/kategori lain tidak bisa masuk matriks ini
+            if chunk.responses.shape[1] != plan.n_items or chunk.scores.shape[1] != n_categories:
+                skipped += len(chunk.timestamps)
+                continue
+            ts = chunk.timestamps
+            ordered = ordered and ts[0] >= last and bool((ts[1:] >= ts[:-1]).all())
+            last = max(last, float(ts.max()))
+            writers['ts'].append(ts)
+            writers['responses'].append(chunk.responses)
+            writers['scores'].append(chunk.scores)
+            writers['bands'].append(chunk.bands)
+            writers['priority'].append(chunk.priority)
+        for writer in writers.values():
+            writer.close()
+    except BaseException:
+        for writer in writers.values():
+            writer.abort()
+        raise
+    if not ordered:
+        _sort_by_time(directory, chunk_size)
+
+    rows = writers['ts'].rows
+    ts = np.load(os.path.join(directory, 'ts.npy'), mmap_mode='r')
+    return {
+        'rows': rows,
+        'skipped': skipped,
+        'config_hash': instrument_hash(instrument),
+        'items': list(plan.item_ids),
+        'categories': list(plan.categories),
+        'bands': [[band.get('label') for band in bands] for bands in plan.bands],
+        'ts_range': [float(ts[0]), float(ts[-1])] if rows else None,
+        'columns': {
+            column: {
+                'file': f"{plan.instrument_id}/{column}.npy",
+                'dtype': np.lib.format.dtype_to_descr(writer.dtype),
+                'shape': [rows, *writer.tail],
+            }
+            for column, writer in writers.items()
+        },
+    }
+
+
+def export_results(result_store, plans: Mapping[str, ScorePlan], instruments: Mapping[str, Dict[str, Any]],
+                   out_dir: str, instrument_ids: Optional[Iterable[str]] = None, since: Optional[float] = None,
+                   until: Optional[float] = None, priorities: List[str] = (),
+                   chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Ekspor kolom semua (atau sebagian) instrumen ke `out_dir`; meta.json ditulis paling akhir"""
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, META_FILE)
+    # Tanpa meta.json direktori dianggap belum lengkap oleh pembaca
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    meta = {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'since': since,
+        'until': until,
+        'priorities': list(priorities),
+        'instruments': {},
+    }
+    for instrument_id in (instrument_ids or list(plans)):
+        if instrument_id not in plans:
+            raise ValueError(f"Unknown instrument: {instrument_id}")
+        directory = os.path.join(out_dir, instrument_id)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        meta['instruments'][instrument_id] = export_instrument(
+            result_store, plans[instrument_id], instruments[instrument_id], directory, since, until, chunk_size)
+        logger.info("Exported %d %s results", meta['instruments'][instrument_id]['rows'], instrument_id)
+
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, meta_path)
+    return meta
+
+
+# -- pembaca ------------------------------------------------------------
+
+class InstrumentColumns(NamedTuple):
+    """Kolom satu instrumen; array berupa memmap read-only (atau view darinya)."""
+    instrument_id: str
+    items: List[str]
+    categories: List[str]
+    ts: np.ndarray          # (n,) float64, terurut naik
+    responses: np.ndarray   # (n, n_item) integer kecil, -1 = tidak dijawab
+    scores: np.ndarray      # (n, n_kategori)
+    bands: np.ndarray       # (n, n_kategori) indeks band, -1 = tidak ada
+    priority: np.ndarray    # (n,) indeks prioritas keselamatan, -1 = tidak ada
+
+    def between(self, since: Optional[float] = None, until: Optional[float] = None) -> "InstrumentColumns":
+        """Baris dengan since <= ts < until, sebagai view tanpa salinan"""
+        start = 0 if since is None else int(np.searchsorted(self.ts, since, side='left'))
+        stop = len(self.ts) if until is None else int(np.searchsorted(self.ts, until, side='left'))
+        window = slice(start, max(start, stop))
+        return self._replace(ts=self.ts[window], responses=self.responses[window], scores=self.scores[window],
+                             bands=self.bands[window], priority=self.priority[window])
+
+    def item(self, item_id: str) -> np.ndarray:
+        return self.responses[:, self.items.index(item_id)]
+
+    def category(self, name: str) -> np.ndarray:
+        return self.scores[:, self.categories.index(name)]
+
+
+class ColumnarExport:
+    """Pembaca direktori ekspor kolom."""
+
+    def __init__(self, path: str):
+        self.path = path
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"{meta_path} not found (export missing or incomplete)")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('format') != FORMAT or self.meta.get('version', 0) > FORMAT_VERSION:
+            raise ValueError(f"Unsupported export format in {path}")
+
+    @property
+    def instruments(self) -> List[str]:
+        return list(self.meta['instruments'])
+
+    def open(self, instrument_id: str, since: Optional[float] = None,
+             until: Optional[float] = None) -> InstrumentColumns:
+        info = self.meta['instruments'][instrument_id]
+        arrays = {column: np.load(os.path.join(self.path, spec['file']), mmap_mode='r')
+                  for column, spec in info['columns'].items()}
+        columns = InstrumentColumns(instrument_id, info['items'], info['categories'], **arrays)
+        if since is None and until is None:
+            return columns
+        return columns.between(since, until)
+
+    def stale(self, instruments: Mapping[str, Dict[str, Any]]) -> List[str]:
+        """Instrumen yang konfigurasinya sudah berbeda dari saat ekspor (urutan item/band mungkin berubah)"""
+        return [instrument_id for instrument_id, info in self.meta['instruments'].items()
+                if instrument_id not in instruments or instrument_hash(instruments[instrument_id]) != info['config_hash']]
+
+
+def open_export(path: str) -> ColumnarExport:
+    return ColumnarExport(path)
@@ -0,0 +1,337 @@
+# Registry konfigurasi: instrumen, scoring dan i18n
+# - path relatif terhadap lokasi modul ini (bukan CWD), tanpa membuat direktori
+# - YAML di-parse dengan CSafeLoader (libyaml) jika tersedia
+# - hasil parse + validasi disimpan ke snapshot biner yang dikunci dengan
+#   mtime/ukuran file, sehingga cold start bisa melewati parsing YAML
+# - instrumen dimuat lazy saat pertama dipakai
+# - watcher berbasis polling mtime untuk hot reload tanpa restart server
+
+import os
+import json
+import hashlib
+import logging
+import marshal
+import threading
+from collections.abc import Mapping
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
+
+from scoring import ScorePlan, compile_instrument
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config")
+SNAPSHOT_VERSION = 1
+DEFAULT_WATCH_INTERVAL = 2.0
+
+
+class ConfigError(ValueError):
+    """Konfigurasi tidak valid"""
+
+
+def _yaml_load(path: str) -> Any:
+    import yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=loader)
+
+
+def validate_instrument(config: Any, source: str = "") -> Dict[str, Any]:
+    """Validasi struktur instrumen; melempar ConfigError jika tidak valid"""
+    where = f" in {source}" if source else ""
+    if not isinstance(config, dict) or 'id' not in config:
+        raise ConfigError(f"Instrument config must be a mapping with an 'id'{where}")
+    items = config.get('items')
+    if not isinstance(items, list) or not items:
+        raise ConfigError(f"Instrument {config['id']} has no items{where}")
+
+    item_ids = set()
+    for item in items:
+        if not isinstance(item, dict) or 'id' not in item or 'text' not in item:
+            raise ConfigError(f"Instrument {config['id']} has an item without id/text{where}")
+        if item['id'] in item_ids:
+            raise ConfigError(f"Duplicate item id {item['id']!r}{where}")
+        item_ids.add(item['id'])
+        options = item.get('options')
+        if not options or any('value' not in opt or 'label' not in opt for opt in options):
+            raise ConfigError(f"Item {item['id']} needs options with value and label{where}")
+
+    scoring = config.get('scoring') or {}
+    if scoring.get('type') == 'sum':
+        scored = list(scoring.get('items', []))
+    else:
+        scored = [item_id for category in (scoring.get('categories') or {}).values()
+                  for item_id in category.get('items', [])]
+    unknown = [item_id for item_id in scored if item_id not in item_ids]
+    if unknown:
+        raise ConfigError(f"Scoring references unknown items {unknown}{where}")
+
+    interpretation = config.get('interpretation')
+    band_lists = interpretation.values() if isinstance(interpretation, dict) else [interpretation or []]
+    for bands in band_lists:
+        for band in bands:
+            low, high = band.get('range', [None, None])
+            if low is None or high is None or low > high:
+                raise ConfigError(f"Invalid interpretation range {band.get('range')}{where}")
+
+    try:
+        compile_instrument(config)
+    except (KeyError, ValueError, TypeError) as e:
+        raise ConfigError(f"Cannot compile scoring for {config['id']}{where}: {e}") from e
+    return config
+
+
+def instrument_hash(config: Dict[str, Any]) -> str:
+    """SHA-256 stabil dari konfigurasi instrumen (urutan key tidak berpengaruh)"""
+    payload = json.dumps(config, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _default_snapshot_path(config_dir: str) -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    digest = hashlib.sha1(os.path.abspath(config_dir).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_home, "teman-mentalmu", f"config-{digest}.marshal")
+
+
+class _LazyMapping(Mapping):
+    def __init__(self, keys: Callable[[], List[str]], load: Callable[[str], Any]):
+        self._keys = keys
+        self._load = load
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys():
+            raise KeyError(key)
+        return self._load(key)
+
+    def __contains__(self, key: object) -> bool:
+        # Entri dimuat dulu: file yang rusak dikeluarkan dari indeks oleh loader,
+        # sehingga `in`, get() dan [] selalu sepakat
+        if key not in self._keys():
+            return False
+        try:
+            self._load(key)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([key for key in list(self._keys()) if key in self])
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class ConfigRegistry:
+    """Sumber tunggal konfigurasi dengan lazy loading, snapshot dan hot reload."""
+
+    def __init__(self, config_dir: Optional[str] = None, snapshot_path: Optional[str] = None,
+                 use_snapshot: bool = True):
+        self.config_dir = config_dir or os.environ.get("TEMAN_CONFIG_DIR", DEFAULT_CONFIG_DIR)
+        self.snapshot_path = snapshot_path or os.environ.get("TEMAN_CONFIG_SNAPSHOT") or _default_snapshot_path(self.config_dir)
+        self.use_snapshot = use_snapshot
+        self.version = 0
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[Dict[str, set]], None]] = []
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._signature = self._scan()
+        self._instrument_files = self._index_instruments()
+        self._instruments: Dict[str, Dict[str, Any]] = {}
+        self._plans: Dict[str, ScorePlan] = {}
+        self._scoring: Optional[Dict[str, Any]] = None
+        self._i18n: Optional[Dict[str, Dict]] = None
+        self._snapshot_loaded = use_snapshot and self._load_snapshot()
+
+        self.instruments = _LazyMapping(lambda: list(self._instrument_files), self._instrument)
+        self.plans = _LazyMapping(lambda: list(self._instrument_files), self._plan)
+
+    # -- file index ------------------------------------------------------
+    def _files(self, section: str, suffix: str) -> List[str]:
+        directory = os.path.join(self.config_dir, section)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.path.join(section, name) for name in os.listdir(directory) if name.endswith(suffix))
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        signature = {}
+        for section, suffix in (("instruments", ".yaml"), ("scoring", ".yaml"), ("i18n", ".json")):
+            for relpath in self._files(section, suffix):
+                try:
+                    stat = os.stat(os.path.join(self.config_dir, relpath))
+                except FileNotFoundError:
+                    continue
+                signature[relpath] = (stat.st_mtime_ns, stat.st_size)
+        return signature
+
+    def _index_instruments(self) -> Dict[str, str]:
+        # Nama file (tanpa .yaml) == id instrumen; dicek saat file di-parse
+        return {os.path.splitext(os.path.basename(relpath))[0]: relpath
+                for relpath in self._signature if relpath.startswith("instruments" + os.sep)}
+
+    # -- snapshot --------------------------------------------------------
+    def _snapshot_key(self) -> List:
+        return [SNAPSHOT_VERSION, sorted([path, list(sig)] for path, sig in self._signature.items())]
+
+    def _load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                data = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return False
+        if not isinstance(data, dict) or data.get('key') != self._snapshot_key():
+            return False
+        self._instruments = data['instruments']
+        self._scoring = data['scoring']
+        self._i18n = data['i18n']
+        return True
+
+    def _save_snapshot(self):
+        if not self.use_snapshot:
+            return
+        data = {
+            'key': self._snapshot_key(),
+            'instruments': self._instruments,
+            'scoring': self._scoring,
+            'i18n': self._i18n,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(data, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not write config snapshot %s: %s", self.snapshot_path, e)
+
+    def _maybe_save_snapshot(self):
+        complete = (self._scoring is not None and self._i18n is not None
+                    and len(self._instruments) == len(self._instrument_files))
+        if complete:
+            self._save_snapshot()
+
+    # -- loaders ---------------------------------------------------------
+    def _instrument(self, instrument_id: str) -> Dict[str, Any]:
+        config = self._instruments.get(instrument_id)
+        if config is not None:
+            return config
+        with self._lock:
+            if instrument_id not in self._instruments:
+                relpath = self._instrument_files[instrument_id]
+                try:
+                    config = validate_instrument(_yaml_load(os.path.join(self.config_dir, relpath)), relpath)
+                    if config['id'] != instrument_id:
+                        raise ConfigError(f"Instrument id {config['id']!r} does not match file name {relpath}")
+                except Exception as e:
+                    # Instrumen rusak disembunyikan dari registry sampai file-nya berubah lagi
+                    logger.warning("Skipping instrument %s: %s", relpath, e)
+                    self._instrument_files.pop(instrument_id, None)
+                    raise KeyError(instrument_id) from e
+                self._instruments[instrument_id] = config
+                self._maybe_save_snapshot()
+            return self._instruments[instrument_id]
+
+    def _plan(self, instrument_id: str) -> ScorePlan:
+        plan = self._plans.get(instrument_id)
+        if plan is None:
+            plan = compile_instrument(self._instrument(instrument_id))
+            self._plans[instrument_id] = plan
+        return plan
+
+    @property
+    def scoring(self) -> Dict[str, Any]:
+        if self._scoring is None:
+            with self._lock:
+                if self._scoring is None:
+                    merged = {}
+                    for relpath in self._files("scoring", ".yaml"):
+                        try:
+                            merged.update(_yaml_load(os.path.join(self.config_dir, relpath)) or {})
+                        except Exception as e:
+                            logger.warning("Could not load %s: %s", relpath, e)
+                    self._scoring = merged
+                    self._maybe_save_snapshot()
+        return self._scoring
+
+    @property
+    def i18n(self) -> Dict[str, Dict]:
+        if self._i18n is None:
+            with self._lock:
+                if self._i18n is None:
+                    translations = {}
+                    for relpath in self._files("i18n", ".json"):
+                        try:
+                            with open(os.path.join(self.config_dir, relpath), 'r', encoding='utf-8') as f:
+                                translations[os.path.splitext(os.path.basename(relpath))[0]] = json.load(f)
+                        except Exception as e:
+                            logger.warning("Could not load %s: %s", relpath, e)
+                    self._i18n = translations
+                    self._maybe_save_snapshot()
+        return self._i18n
+
+    def load_all(self) -> List[str]:
+        """Muat semua instrumen sekarang; instrumen yang tidak valid dilewati dan dilaporkan"""
+        failed = []
+        for instrument_id in list(self._instrument_files):
+            try:
+                self._instrument(instrument_id)
+            except KeyError:
+                failed.append(instrument_id)
+        self.scoring
+        self.i18n
+        return failed
+
+    # -- hot reload ------------------------------------------------------
+    def add_listener(self, callback: Callable[[Dict[str, set]], None]):
+        """callback({'instruments': {...id}, 'scoring': bool, 'i18n': bool}) dipanggil setelah reload"""
+        self._listeners.append(callback)
+
+    def reload_changed(self) -> Dict[str, Any]:
+        """Bandingkan mtime/ukuran file; buang cache untuk file yang berubah"""
+        signature = self._scan()
+        if signature == self._signature:
+            return {}
+        changed_paths = {path for path in set(signature) | set(self._signature)
+                         if signature.get(path) != self._signature.get(path)}
+        changes = {'instruments': set(), 'scoring': False, 'i18n': False}
+        with self._lock:
+            self._signature = signature
+            self._instrument_files = self._index_instruments()
+            for relpath in changed_paths:
+                section = relpath.split(os.sep, 1)[0]
+                if section == "instruments":
+                    instrument_id = os.path.splitext(os.path.basename(relpath))[0]
+                    self._instruments.pop(instrument_id, None)
+                    self._plans.pop(instrument_id, None)
+                    changes['instruments'].add(instrument_id)
+                elif section == "scoring":
+                    self._scoring = None
+                    changes['scoring'] = True
+                elif section == "i18n":
+                    self._i18n = None
+                    changes['i18n'] = True
+            self.version += 1
+
+        logger.info("Config changed: %s", sorted(changed_paths))
+        # Validasi ulang sekarang agar kesalahan terlihat di log, bukan di request berikutnya
+        self.load_all()
+        for callback in self._listeners:
+            try:
+                callback(changes)
+            except Exception as e:
+                logger.warning("Config reload listener failed: %s", e)
+        return changes
+
+    def start_watcher(self, interval: float = DEFAULT_WATCH_INTERVAL):
+        if self._watcher is not None:
+            return
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.reload_changed()
+                except Exception as e:
+                    logger.warning("Config reload failed: %s", e)
+        self._watcher = threading.Thread(target=run, name="config-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
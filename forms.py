@@ -0,0 +1,148 @@
+# Mesin form dinamis untuk Evaluasi Lengkap
+# Jumlah slot radio mengikuti instrumen terbesar yang dimuat, payload
+# (label + pilihan) per slot dihitung sekali per (instrumen, bahasa), dan
+# setiap pergantian instrumen hanya mengirim update untuk slot yang berubah.
+# Form gabungan (battery) merangkai payload beberapa instrumen menjadi satu form.
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Any, Mapping, Optional, Sequence, Tuple, Union
+
+
+@dataclass(frozen=True)
+class FormPayload:
+    """Payload form terhitung untuk satu (instrumen, bahasa)."""
+    token: str                                   # identitas form yang sedang ditampilkan di client
+    instrument_id: str
+    item_ids: Tuple[str, ...]
+    slots: Tuple[Tuple[str, Tuple[Tuple[str, Any], ...]], ...]  # (label, pilihan) per slot
+
+
+def _text(value: Any, lang: str) -> str:
+    if isinstance(value, dict):
+        return value.get(lang) or value.get('id') or ""
+    return str(value or "")
+
+
+class FormEngine:
+    """Cache payload form dan penghitung diff antar instrumen."""
+
+    def __init__(self, instruments: Mapping[str, Dict[str, Any]]):
+        self.instruments = instruments
+        self._payloads: Dict[Tuple[str, str], FormPayload] = {}
+        self._by_token: Dict[str, FormPayload] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def slot_count(self, battery: Sequence[str] = ()) -> int:
+        """Jumlah radio yang dibutuhkan instrumen terbesar, atau seluruh instrumen `battery` sekaligus"""
+        if battery:
+            return sum(len(self.instruments.get(instrument_id, {}).get('items', [])) for instrument_id in battery)
+        return max([len(instrument.get('items', [])) for instrument in self.instruments.values()] or [0])
+
+    def payload(self, instrument_id: Union[str, Tuple[str, ...]], lang: str = "id") -> Optional[FormPayload]:
+        """Payload satu instrumen, atau form gabungan jika `instrument_id` berupa tuple"""
+        key = (instrument_id, lang)
+        payload = self._payloads.get(key)
+        if payload is not None:
+            return payload
+        if isinstance(instrument_id, tuple):
+            return self._battery_payload(instrument_id, lang)
+        instrument = self.instruments.get(instrument_id)
+        if instrument is None:
+            return None
+
+        items = instrument.get('items', [])
+        slots = tuple(
+            (_text(item.get('text'), lang),
+             tuple((_text(opt.get('label'), lang), opt['value']) for opt in item.get('options', [])))
+            for item in items
+        )
+        with self._lock:
+            self._generation += 1
+            payload = FormPayload(
+                token=f"{instrument_id}:{lang}:{self._generation}",
+                instrument_id=instrument_id,
+                item_ids=tuple(item['id'] for item in items),
+                slots=slots
+            )
+            self._payloads[key] = payload
+            self._by_token[payload.token] = payload
+        return payload
+
+    def _battery_payload(self, instrument_ids: Tuple[str, ...], lang: str) -> Optional[FormPayload]:
+        parts = [self.payload(instrument_id, lang) for instrument_id in instrument_ids]
+        if not parts or any(part is None for part in parts):
+            return None
+        # Label diawali judul instrumen agar batas antar-instrumen terlihat di form
+        slots = tuple(
+            (f"{_text(self.instruments[part.instrument_id].get('title'), lang)} · {label}", choices)
+            for part in parts for label, choices in part.slots
+        )
+        with self._lock:
+            self._generation += 1
+            payload = FormPayload(
+                token=f"battery:{'+'.join(instrument_ids)}:{lang}:{self._generation}",
+                instrument_id='+'.join(instrument_ids),
+                item_ids=tuple(item_id for part in parts for item_id in part.item_ids),
+                slots=slots
+            )
+            self._payloads[(instrument_ids, lang)] = payload
+            self._by_token[payload.token] = payload
+        return payload
+
+    def invalidate(self, instrument_id: Optional[str] = None):
+        # Token lama dilupakan sehingga client yang masih menampilkannya mendapat update penuh;
+        # form gabungan yang memuat instrumen tersebut ikut dibuang
+        def stale(key) -> bool:
+            return (instrument_id is None or key[0] == instrument_id
+                    or (isinstance(key[0], tuple) and instrument_id in key[0]))
+        with self._lock:
+            for key in [key for key in self._payloads if stale(key)]:
+                self._by_token.pop(self._payloads.pop(key).token, None)
+
+    def responses(self, instrument_id: str, answers: Sequence[int], lang: str = "id") -> Optional[Dict[str, Any]]:
+        """Nilai jawaban per item dari indeks pilihan per slot; None jika tidak cocok dengan form saat ini"""
+        payload = self.payload(instrument_id, lang)
+        if payload is None or len(answers) != len(payload.slots):
+            return None
+        responses = {}
+        for item_id, (_, choices), choice in zip(payload.item_ids, payload.slots, answers):
+            if not 0 <= choice < len(choices):
+                return None
+            responses[item_id] = choices[choice][1]
+        return responses
+
+    def updates(self, instrument_id: Union[str, Tuple[str, ...]], rendered_token: str, n_slots: int,
+                lang: str = "id", answers: Sequence[int] = ()) -> Tuple[List[Dict], Optional[FormPayload]]:
+        """Update radio untuk beralih dari form `rendered_token` ke `instrument_id`.
+
+        Slot yang label dan pilihannya sama hanya dikosongkan nilainya; slot yang
+        sudah tersembunyi dan tetap tersembunyi dikirim sebagai update kosong.
+        `answers` (indeks pilihan per slot, -1 = kosong) mengisi ulang form yang dipulihkan.
+        """
+        import gradio as gr
+        target = self.payload(instrument_id, lang)
+        if target is not None and len(target.slots) > n_slots:
+            raise gr.Error(f"Instrumen {target.instrument_id} memiliki {len(target.slots)} item; "
+                           f"form hanya menyediakan {n_slots}. Muat ulang server untuk memakainya.")
+        current = self._by_token.get(rendered_token) if rendered_token else None
+        known = current is not None or not rendered_token
+        current_slots = current.slots if current is not None else ()
+        target_slots = target.slots if target is not None else ()
+
+        updates = []
+        for i in range(n_slots):
+            if i < len(target_slots):
+                label, choices = target_slots[i]
+                choice = answers[i] if i < len(answers) else -1
+                value = choices[choice][1] if 0 <= choice < len(choices) else None
+                if known and i < len(current_slots) and current_slots[i] == target_slots[i]:
+                    updates.append(gr.update(value=value))
+                else:
+                    updates.append(gr.update(visible=True, label=label, choices=list(choices), value=value))
+            elif not known or i < len(current_slots):
+                updates.append(gr.update(visible=False, value=None))
+            else:
+                updates.append(gr.update())
+        return updates, target
@@ -0,0 +1,277 @@
+# Fragmen HTML hasil
+# Jumlah output berbeda kecil (satu per instrumen, skor, bahasa), jadi fragmen
+# dirender sekali lalu disimpan di cache LRU terbatas; panel statis (latihan
+# pernapasan/grounding, pesan validasi) dibangun sekali sebagai konstanta.
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Callable, Hashable, Mapping, Optional, Tuple
+
+from scoring import ScorePlan
+
+DEFAULT_MAXSIZE = 4096
+
+MSG_ANSWER_ALL = "<p style='color: #e74c3c;'>⚠️ Jawab semua pertanyaan terlebih dahulu!</p>"
+MSG_FORM_EMPTY = "<p style='color: #e74c3c;'>⚠️ Form belum diisi lengkap!</p>"
+MSG_COMPLETE_ALL = "<p style='color: #e74c3c;'>⚠️ Lengkapi semua pertanyaan terlebih dahulu!</p>"
+MSG_SESSION_EXPIRED = "<p style='color: #e74c3c;'>⚠️ Sesi form sudah berakhir. Klik \"Mulai Evaluasi\" dan isi kembali form.</p>"
+MSG_SELECT_INSTRUMENTS = "<p style='color: #e74c3c;'>⚠️ Pilih minimal satu instrumen!</p>"
+MSG_INTERPRETATION_ERROR = "<p style='color: #e74c3c;'>⚠️ Error dalam interpretasi hasil!</p>"
+MSG_PDF_BUSY = "<p style='color: #7f8c8d; font-style: italic;'>⏳ Server laporan sedang sibuk, PDF tidak dapat dibuat saat ini. Silakan kirim ulang beberapa saat lagi.</p>"
+MSG_PDF_PENDING = "<p style='color: #7f8c8d; font-style: italic;'>⏳ Menyiapkan laporan PDF...</p>"
+MSG_PDF_FAILED = "<p style='color: #e74c3c;'>⚠️ Laporan PDF gagal dibuat.</p>"
+MSG_ENTER_SCORES = "<p style='color: #7f8c8d; font-style: italic;'>Masukkan skor untuk melihat interpretasi.</p>"
+MSG_NO_ANALYTICS = "<p style='color: #7f8c8d; font-style: italic;'>Belum ada data untuk instrumen dan rentang ini.</p>"
+MSG_NO_HISTORY = "<p style='color: #7f8c8d; font-style: italic;'>Belum ada riwayat untuk subjek dan instrumen ini.</p>"
+
+BREATHING_PANELS: Dict[str, str] = {
+    "box": """
+                            <div style='text-align: center; padding: 30px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); border-radius: 12px; color: white;'>
+                                <h2 style='color: white; margin-bottom: 20px;'>🫁 Pernapasan Kotak</h2>
+                                <div style='width: 200px; height: 200px; border: 4px solid white; margin: 20px auto; border-radius: 15px; display: flex; align-items: center; justify-content: center; font-size: 18px; font-weight: bold;'>
+                                    Tarik Napas<br>4 detik
+                                </div>
+                                <div style='text-align: left; max-width: 300px; margin: 20px auto;'>
+                                    <p>1. Tarik napas selama 4 detik</p><p>2. Tahan napas selama 4 detik</p>
+                                    <p>3. Keluarkan napas selama 4 detik</p><p>4. Tahan kosong selama 4 detik</p>
+                                </div>
+                            </div>
+                        """,
+    "478": """
+                            <div style='text-align: center; padding: 30px; background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); border-radius: 12px; color: white;'>
+                                <h2 style='color: white; margin-bottom: 20px;'>🫁 4-7-8 Breathing</h2>
+                                <div style='width: 200px; height: 200px; border: 4px solid white; margin: 20px auto; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-size: 16px; font-weight: bold; text-align: center;'>
+                                    Tarik Napas<br>4 detik
+                                </div>
+                                <div style='text-align: left; max-width: 300px; margin: 20px auto;'>
+                                    <p>1. Tarik napas selama 4 detik</p><p>2. Tahan napas selama 7 detik</p>
+                                    <p>3. Keluarkan napas selama 8 detik</p>
+                                </div>
+                            </div>
+                        """,
+    "deep": """
+                            <div style='text-align: center; padding: 30px; background: linear-gradient(135deg, #fa709a 0%, #fee140 100%); border-radius: 12px; color: white;'>
+                                <h2 style='color: white; margin-bottom: 20px;'>🫁 Pernapasan Dalam</h2>
+                                <div style='width: 200px; height: 200px; border: 4px solid white; margin: 20px auto; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-size: 16px; font-weight: bold; text-align: center;'>
+                                    Tarik Napas<br>Perlahan
+                                </div>
+                                <div style='text-align: left; max-width: 300px; margin: 20px auto;'>
+                                    <p>1. Tarik napas perlahan melalui hidung</p><p>2. Biarkan perut mengembang</p>
+                                    <p>3. Keluarkan napas perlahan melalui mulut</p>
+                                </div>
+                            </div>
+                        """
+}
+
+GROUNDING_PANEL = """
+                        <div style='padding: 20px; background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%); border-radius: 12px;'>
+                            <h2 style='color: #2c3e50; text-align: center; margin-bottom: 20px;'>🌟 Grounding 5-4-3-2-1</h2>
+                            <p style='text-align: center; color: #34495e; font-size: 18px; margin-bottom: 20px;'><strong>Gunakan indera Anda untuk kembali ke saat ini:</strong></p>
+                            <div style='display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px;'>
+                                <div style='background: rgba(52, 152, 219, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #3498db;'>
+                                    <h3 style='color: #2980b9; margin-top: 0;'>👁️ 5 HAL YANG ANDA LIHAT</h3>
+                                    <p style='color: #2c3e50;'>Lihat sekeliling dan identifikasi 5 benda</p>
+                                </div>
+                                <div style='background: rgba(46, 204, 113, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #2ecc71;'>
+                                    <h3 style='color: #27ae60; margin-top: 0;'>👂 4 HAL YANG ANDA DENGAR</h3>
+                                    <p style='color: #2c3e50;'>Dengarkan dan identifikasi 4 suara</p>
+                                </div>
+                                <div style='background: rgba(155, 89, 182, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #9b59b6;'>
+                                    <h3 style='color: #8e44ad; margin-top: 0;'>✋ 3 HAL YANG ANDA SENTUH</h3>
+                                    <p style='color: #2c3e50;'>Sentuh dan identifikasi 3 tekstur</p>
+                                </div>
+                                <div style='background: rgba(241, 196, 15, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #f1c40f;'>
+                                    <h3 style='color: #f39c12; margin-top: 0;'>👃 2 HAL YANG ANDA CIUM</h3>
+                                    <p style='color: #2c3e50;'>Cium dan identifikasi 2 bau</p>
+                                </div>
+                                <div style='background: rgba(230, 126, 34, 0.1); padding: 20px; border-radius: 8px; border-left: 4px solid #e67e22;'>
+                                    <h3 style='color: #d35400; margin-top: 0;'>👅 1 HAL YANG ANDA RASA</h3>
+                                    <p style='color: #2c3e50;'>Rasakan dan identifikasi 1 rasa</p>
+                                </div>
+                            </div>
+                            <p style='text-align: center; color: #7f8c8d; font-style: italic; margin-top: 20px;'>Lakukan latihan ini perlahan dan fokus pada setiap indera</p>
+                        </div>
+                    """
+
+# Kartu ringkasan di tab Hasil: (judul, warna latar, warna aksen, warna judul, skor maksimum)
+ANALYSIS_CARDS: Dict[str, Tuple[str, str, str, str, int]] = {
+    'phq9': ("PHQ-9 (Depresi)", "#e3f2fd", "#2196f3", "#1976d2", 27),
+    'gad7': ("GAD-7 (Kecemasan)", "#fff3e0", "#ff9800", "#f57c00", 21),
+}
+
+
+def _text(value: Any, lang: str) -> str:
+    if isinstance(value, dict):
+        return value.get(lang) or value.get('id') or ""
+    return str(value)
+
+
+def score_key(score: Dict[str, Any]) -> Tuple:
+    """Kunci cache yang hashable untuk hasil `calculate_score`"""
+    if 'total' in score:
+        return (score['total'],)
+    return tuple((category, cat_score['score']) for category, cat_score in score.items())
+
+
+def quick_screening_html(title: str, score: Dict, interpretation: Dict, lang: str = "id") -> str:
+    # Tanpa penutup </div>: peringatan keselamatan disisipkan sebelum ditutup
+    html = f"""
+                <div style='padding: 20px; background-color: #f8f9fa; border-radius: 8px; border-left: 4px solid #4CAF50;'>
+                    <h3 style='color: #2c3e50; margin-top: 0;'>Hasil {title}</h3>
+                    <p style='font-size: 18px;'><strong>Skor Total:</strong> <span style='color: #e74c3c;'>{score['total']}/{score['max_score']}</span></p>
+                    <p style='font-size: 16px;'><strong>Interpretasi:</strong> <span style='color: #3498db;'>{_text(interpretation['label'], lang)}</span></p>
+                    <p style='font-size: 14px; color: #34495e;'>{_text(interpretation['description'], lang)}</p>
+            """
+    # Band dengan 'action' (PHQ-2 >= 3) berarti skrining positif
+    if 'action' in interpretation:
+        html += f"""
+                    <div style='background-color: #ffebee; border: 1px solid #ef5350; border-radius: 8px; padding: 15px; margin-top: 15px;'>
+                        <h4 style='color: #c62828; margin-top: 0;'>⚠️ Screening Positif</h4>
+                        <p style='color: #2c3e50;'>Hasil menunjukkan adanya gejala depresi yang memerlukan evaluasi lebih lanjut.</p>
+                        <p style='color: #2c3e50;'><strong>Rekomendasi:</strong> {_text(interpretation['action'], lang)}.</p>
+                    </div>
+                """
+    return html
+
+
+def full_assessment_html(title: str, score: Dict, interpretation: Dict, lang: str = "id") -> str:
+    if 'total' in score:
+        score_html = f"""
+                    <p style='font-size: 20px;'><strong>Skor Total:</strong> <span style='color: #d32f2f;'>{score['total']}/{score['max_score']}</span></p>
+                    <p style='font-size: 16px;'><strong>Interpretasi:</strong> <span style='color: #388e3c;'>{_text(interpretation['label'], lang)}</span></p>
+                    <p style='color: #155724;'>{_text(interpretation['description'], lang)}</p>
+                """
+    else:
+        # Instrumen per kategori (DASS-21, CBI): satu baris per subskala
+        score_html = ""
+        for category, cat_score in score.items():
+            band = interpretation.get(category, {})
+            score_html += f"""
+                    <p style='font-size: 18px;'><strong>{category.capitalize()}:</strong> <span style='color: #d32f2f;'>{cat_score['score']}/{cat_score['max_score']}</span>
+                        - <span style='color: #388e3c;'>{_text(band.get('label', 'N/A'), lang)}</span></p>
+                    <p style='color: #155724;'>{_text(band.get('description', ''), lang)}</p>
+                    """
+
+    return f"""
+                <div style='background-color: #d4edda; border: 1px solid #c3e6cb; border-radius: 8px; padding: 20px; margin-top: 20px;'>
+                    <h3 style='color: #155724;'>✅ Evaluasi Berhasil</h3>
+                    <h4>{title}</h4>
+                    {score_html}
+                </div>
+            """
+
+
+def analysis_card_html(instrument_id: str, value: Any, interpretation: Dict, lang: str = "id") -> str:
+    title, background, accent, heading, max_score = ANALYSIS_CARDS[instrument_id]
+    return f"""
+                        <div style='background-color: {background}; border-left: 4px solid {accent}; padding: 15px; margin: 10px 0; border-radius: 8px;'>
+                            <h3 style='color: {heading}; margin-top: 0;'>{title}</h3>
+                            <p style='font-size: 20px;'><strong>Skor:</strong> <span style='color: #d32f2f;'>{value}/{max_score}</span></p>
+                            <p style='font-size: 16px;'><strong>Kategori:</strong> <span style='color: #388e3c;'>{_text(interpretation['label'], lang)}</span></p>
+                            <p style='color: #455a64;'>{_text(interpretation['description'], lang)}</p>
+                        </div>
+                    """
+
+
+def safety_alert_html(alerts: List[Dict[str, Any]], actions: List[Dict[str, Any]], lang: str = "id") -> str:
+    messages = "".join(
+        f"<p style='color: #2c3e50;'><strong>{_text(rule['message'], lang)}</strong></p>" for rule in alerts
+    )
+    steps = ""
+    for action in actions:
+        resources = ", ".join(
+            f"{res['name']}: {res['number']}" for res in action.get('resources', []) if 'number' in res
+        )
+        steps += f"<li>{_text(action['description'], lang)}{f' ({resources})' if resources else ''}</li>"
+
+    return f"""
+            <div style='background-color: #ffebee; border: 1px solid #ef5350; border-radius: 8px; padding: 15px; margin-top: 15px;'>
+                <h4 style='color: #c62828; margin-top: 0;'>🚨 Perhatian Keselamatan</h4>
+                {messages}
+                {f"<ul style='color: #2c3e50;'>{steps}</ul>" if steps else ""}
+            </div>
+        """
+
+
+def _duration(seconds: float) -> str:
+    days = seconds / 86400
+    if days >= 1:
+        return f"{days:.0f} hari"
+    return f"{seconds / 3600:.1f} jam"
+
+
+def trend_summary_html(title: str, aggregate, band_labels: Dict[int, str], reliable_change: Optional[str],
+                       threshold: Optional[float], now: float) -> str:
+    """Ringkasan tren satu subjek (tidak di-cache: berubah setiap submission)"""
+    change = aggregate.change
+    change_color = '#388e3c' if change < 0 else '#d32f2f' if change > 0 else '#455a64'
+    if reliable_change == 'improved':
+        rci = f"<span style='color: #388e3c;'>✅ Perbaikan reliabel (≥ {threshold:g} poin)</span>"
+    elif reliable_change == 'deteriorated':
+        rci = f"<span style='color: #d32f2f;'>⚠️ Perburukan reliabel (≥ {threshold:g} poin)</span>"
+    elif threshold:
+        rci = f"<span style='color: #7f8c8d;'>Belum ada perubahan reliabel (ambang {threshold:g} poin)</span>"
+    else:
+        rci = "<span style='color: #7f8c8d;'>Ambang perubahan reliabel tidak tersedia</span>"
+
+    bands = "".join(
+        f"<li>{band_labels.get(band, '-')}: {_duration(seconds)}</li>"
+        for band, seconds in sorted(aggregate.time_in_bands(now).items())
+    )
+    return f"""
+                <div style='background-color: #f8f9fa; border-left: 4px solid #3498db; padding: 15px; margin: 10px 0; border-radius: 8px;'>
+                    <h3 style='color: #2c3e50; margin-top: 0;'>{title} - {aggregate.count} administrasi</h3>
+                    <p style='font-size: 16px;'><strong>Baseline:</strong> {aggregate.baseline_score} &nbsp; <strong>Terakhir:</strong> {aggregate.last_score} ({band_labels.get(aggregate.last_band, '-')})</p>
+                    <p style='font-size: 16px;'><strong>Perubahan sejak baseline:</strong> <span style='color: {change_color};'>{change:+d}</span></p>
+                    <p style='font-size: 15px;'>{rci}</p>
+                    <p style='font-size: 15px; margin-bottom: 5px;'><strong>Waktu di tiap kategori:</strong></p>
+                    <ul style='color: #34495e;'>{bands}</ul>
+                </div>
+            """
+
+
+class FragmentCache:
+    """Cache LRU terbatas untuk fragmen HTML hasil render."""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, render: Callable[[], str]) -> str:
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+        html = render()
+        with self._lock:
+            self._entries[key] = html
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return html
+
+    def invalidate(self, instrument_id: Optional[str] = None):
+        # Kunci fragmen selalu diawali (jenis, instrumen, ...)
+        with self._lock:
+            if instrument_id is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[1] == instrument_id]:
+                    del self._entries[key]
+
+    def warm(self, plans: Mapping[str, ScorePlan], render: Callable[[str, Dict], Any]):
+        """Render semua skor yang mungkin untuk instrumen bertipe 'sum' saat startup"""
+        for instrument_id, plan in plans.items():
+            if plan.scoring_type != 'sum':
+                continue
+            for total in range(len(plan.band_lookup[0])):
+                if plan.band_index(0, total) >= 0:
+                    render(instrument_id, plan.result([total]))
+
+    def stats(self) -> Dict[str, int]:
+        return {'entries': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
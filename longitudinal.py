@@ -0,0 +1,140 @@
+# Pemantauan longitudinal per subjek
+# Agregat per (subjek, instrumen) diperbarui secara inkremental (O(1)) setiap
+# kali ada submission baru: skor baseline & terakhir, perubahan sejak baseline,
+# flag perubahan reliabel (RCI), waktu di tiap band, dan riwayat skor terbaru
+# untuk grafik. Tampilan tren dirender langsung dari agregat ini.
+
+import os
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, Mapping, Optional, Tuple
+
+from scoring import ScorePlan
+
+DEFAULT_HISTORY = 52
+DEFAULT_MAX_SUBJECTS = 100_000
+
+
+@dataclass
+class TrendAggregate:
+    """Agregat berjalan untuk satu (subjek, instrumen)."""
+    subject: str
+    instrument_id: str
+    count: int = 0
+    baseline_score: int = 0
+    baseline_ts: float = 0.0
+    last_score: int = 0
+    last_ts: float = 0.0
+    last_band: int = -1
+    best_score: int = 0
+    worst_score: int = 0
+    time_in_band: Dict[int, float] = field(default_factory=dict)   # indeks band -> detik
+    history: deque = field(default_factory=lambda: deque(maxlen=DEFAULT_HISTORY))  # (ts, skor, band)
+
+    def update(self, ts: float, score: int, band: int):
+        if self.count == 0:
+            self.baseline_score = self.best_score = self.worst_score = score
+            self.baseline_ts = ts
+        else:
+            # Interval sejak administrasi sebelumnya dihitung ke band sebelumnya
+            elapsed = max(ts - self.last_ts, 0.0)
+            self.time_in_band[self.last_band] = self.time_in_band.get(self.last_band, 0.0) + elapsed
+            self.best_score = min(self.best_score, score)
+            self.worst_score = max(self.worst_score, score)
+        self.count += 1
+        self.last_score = score
+        self.last_ts = ts
+        self.last_band = band
+        self.history.append((ts, score, band))
+
+    @property
+    def change(self) -> int:
+        """Perubahan sejak baseline (negatif = membaik)"""
+        return self.last_score - self.baseline_score
+
+    def reliable_change(self, threshold: Optional[float]) -> Optional[str]:
+        """'improved' / 'deteriorated' jika |perubahan| >= ambang RCI, None jika tidak"""
+        if not threshold or self.count < 2 or abs(self.change) < threshold:
+            return None
+        return 'improved' if self.change < 0 else 'deteriorated'
+
+    def time_in_bands(self, now: Optional[float] = None) -> Dict[int, float]:
+        """Waktu per band, termasuk interval terbuka sejak administrasi terakhir"""
+        totals = dict(self.time_in_band)
+        if now is not None and self.count:
+            totals[self.last_band] = totals.get(self.last_band, 0.0) + max(now - self.last_ts, 0.0)
+        return totals
+
+
+class LongitudinalTracker:
+    """Cache agregat tren per (subjek, instrumen) dengan batas jumlah entri."""
+
+    def __init__(self, plans: Mapping[str, ScorePlan], result_store=None,
+                 max_subjects: int = DEFAULT_MAX_SUBJECTS):
+        self.plans = plans
+        self.result_store = result_store
+        self.max_subjects = max_subjects
+        self._aggregates: "OrderedDict[Tuple[str, str], TrendAggregate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, plans: Mapping[str, ScorePlan], result_store=None) -> "LongitudinalTracker":
+        return cls(plans, result_store,
+                   max_subjects=int(os.environ.get("TEMAN_TRACKER_MAX_SUBJECTS", DEFAULT_MAX_SUBJECTS)))
+
+    def tracks(self, instrument_id: str) -> bool:
+        # Tren memakai skor total, jadi hanya instrumen bertipe 'sum'
+        plan = self.plans.get(instrument_id)
+        return plan is not None and plan.scoring_type == 'sum'
+
+    def update(self, subject: str, instrument_id: str, ts: float, score: int, band: int):
+        """Perbarui agregat dengan satu submission baru (O(1))"""
+        # max_subjects=0: tanpa cache, get() selalu membaca result store
+        if not subject or not self.max_subjects or not self.tracks(instrument_id):
+            return
+        key = (subject, instrument_id)
+        with self._lock:
+            aggregate = self._aggregates.get(key)
+            if aggregate is None:
+                aggregate = self._load_locked(key)
+            aggregate.update(ts, score, band)
+            self._aggregates.move_to_end(key)
+
+    def _load_locked(self, key: Tuple[str, str]) -> TrendAggregate:
+        # Subjek yang belum ada di cache (mis. setelah restart atau eviksi) dibangun
+        # ulang sekali dari result store, setelah itu hanya diperbarui inkremental
+        subject, instrument_id = key
+        aggregate = TrendAggregate(subject, instrument_id)
+        if self.result_store is not None:
+            for row in self.result_store.iter_rows(instrument_id, subject=subject):
+                aggregate.update(row.timestamp, int(row.scores[0]), int(row.bands[0]))
+        self._aggregates[key] = aggregate
+        while len(self._aggregates) > self.max_subjects:
+            self._aggregates.popitem(last=False)
+        return aggregate
+
+    def get(self, subject: str, instrument_id: str) -> Optional[TrendAggregate]:
+        if not subject or not self.tracks(instrument_id):
+            return None
+        key = (subject, instrument_id)
+        with self._lock:
+            aggregate = self._aggregates.get(key)
+            if aggregate is None:
+                aggregate = self._load_locked(key)
+            elif self.max_subjects:
+                self._aggregates.move_to_end(key)
+        return aggregate if aggregate.count else None
+
+    def invalidate(self, instrument_id: Optional[str] = None):
+        with self._lock:
+            for key in [key for key in self._aggregates if instrument_id is None or key[1] == instrument_id]:
+                del self._aggregates[key]
+
+    def band_label(self, instrument_id: str, band: int, lang: str = "id") -> str:
+        if band < 0:
+            return "-"
+        label = self.plans[instrument_id].bands[0][band].get('label', {})
+        if isinstance(label, dict):
+            return label.get(lang) or label.get('id', "-")
+        return str(label)
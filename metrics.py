@@ -0,0 +1,287 @@
+# Metrik & profiling jalur panas
+# Histogram latensi, jumlah panggilan, jumlah error dan gauge in-flight per
+# handler (callback Gradio maupun fungsi internal) dalam format teks Prometheus.
+# Profiler sampling opsional (TEMAN_PROFILE=<direktori>) mengambil stack thread
+# yang sedang menjalankan handler dan menulis data flame graph (format "folded")
+# per handler. Tanpa profiler, wrapper hanya menambah dua perf_counter() per panggilan.
+
+import os
+import sys
+import time
+import atexit
+import bisect
+import inspect
+import logging
+import threading
+import functools
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_PROFILE_INTERVAL = 0.005
+DEFAULT_PROFILE_DUMP = 30.0
+PREFIX = "teman"
+
+
+class HandlerStats:
+    """Histogram latensi + counter untuk satu handler."""
+
+    __slots__ = ('buckets', 'bucket_counts', 'total', 'count', 'errors', 'in_flight', '_lock')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)   # slot terakhir = +Inf
+        self.total = 0.0
+        self.count = 0
+        self.errors = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def end(self, elapsed: float, error: bool):
+        index = bisect.bisect_left(self.buckets, elapsed)
+        with self._lock:
+            self.in_flight -= 1
+            self.count += 1
+            self.total += elapsed
+            self.bucket_counts[index] += 1
+            if error:
+                self.errors += 1
+
+
+class SamplingProfiler:
+    """Sampler stack berbasis sys._current_frames() untuk thread yang sedang di dalam handler."""
+
+    def __init__(self, out_dir: str, interval: float = DEFAULT_PROFILE_INTERVAL,
+                 dump_interval: float = DEFAULT_PROFILE_DUMP):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.samples: Dict[str, Counter] = {}
+        self._active: Dict[int, str] = {}      # thread id -> handler terluar
+        self._stop_codes = set()               # code object wrapper: batas atas stack yang diambil
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enter(self, name: str) -> bool:
+        ident = threading.get_ident()
+        if ident in self._active:
+            return False
+        self._active[ident] = name
+        return True
+
+    def leave(self):
+        self._active.pop(threading.get_ident(), None)
+
+    def _folded(self, frame) -> str:
+        # Stack dipotong di wrapper handler terluar; frame wrapper sendiri tidak ditampilkan
+        names = []
+        cut = None
+        while frame is not None:
+            code = frame.f_code
+            if code in self._stop_codes:
+                cut = len(names)
+            else:
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names[:cut]))
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, name in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    stack = self._folded(frame)
+                    self.samples.setdefault(name, Counter())[f"{name};{stack}" if stack else name] += 1
+
+    def dump(self):
+        with self._lock:
+            snapshot = {name: dict(counts) for name, counts in self.samples.items()}
+        os.makedirs(self.out_dir, exist_ok=True)
+        for name, counts in snapshot.items():
+            path = os.path.join(self.out_dir, f"{name}.folded")
+            with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                for stack, count in sorted(counts.items()):
+                    f.write(f"{stack} {count}\n")
+            os.replace(path + ".tmp", path)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        def run():
+            next_dump = time.monotonic() + self.dump_interval
+            while not self._stop.wait(self.interval):
+                self.sample()
+                if time.monotonic() >= next_dump:
+                    next_dump = time.monotonic() + self.dump_interval
+                    try:
+                        self.dump()
+                    except OSError as e:
+                        logger.warning("Writing profile samples failed: %s", e)
+        self._thread = threading.Thread(target=run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info("Sampling profiler writing flame graph data to %s", self.out_dir)
+
+    def stop(self):
+        self._stop.set()
+        if self.samples:
+            self.dump()
+
+
+class MetricsRegistry:
+    """Registry handler + collector stats() komponen; dirender ke format Prometheus."""
+
+    def __init__(self, enabled: bool = True, profiler: Optional[SamplingProfiler] = None):
+        self.enabled = enabled
+        self.profiler = profiler
+        self.handlers: Dict[str, HandlerStats] = {}
+        self.collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "MetricsRegistry":
+        # TEMAN_METRICS=0 mematikan instrumentasi; TEMAN_PROFILE=<dir> menyalakan profiler sampling
+        profile_dir = os.environ.get("TEMAN_PROFILE")
+        profiler = None
+        if profile_dir:
+            profiler = SamplingProfiler(
+                profile_dir, interval=float(os.environ.get("TEMAN_PROFILE_INTERVAL", DEFAULT_PROFILE_INTERVAL))
+            )
+        return cls(enabled=os.environ.get("TEMAN_METRICS", "1") != "0", profiler=profiler)
+
+    def handler(self, name: str) -> HandlerStats:
+        with self._lock:
+            stats = self.handlers.get(name)
+            if stats is None:
+                stats = self.handlers[name] = HandlerStats()
+            return stats
+
+    def in_flight(self) -> int:
+        """Jumlah panggilan handler yang sedang berjalan (dipakai saat drain)."""
+        with self._lock:
+            return sum(stats.in_flight for stats in self.handlers.values())
+
+    def add_collector(self, name: str, collect: Callable[[], Dict[str, float]]):
+        self.collectors[name] = collect
+
+    def timed(self, name: str) -> Callable:
+        """Decorator pengukur latensi; mempertahankan jenis fungsi (biasa/generator/async) untuk Gradio."""
+        def decorate(fn):
+            if not self.enabled:
+                return fn
+            stats = self.handler(name)
+            profiler = self.profiler
+
+            if inspect.isgeneratorfunction(fn):
+                @functools.wraps(fn)
+                def wrapper(*args, **kwargs):
+                    profiling = profiler is not None and profiler.enter(name)
+                    stats.begin()
+                    start = time.perf_counter()
+                    error = False
+                    try:
+                        yield from fn(*args, **kwargs)
+                    except GeneratorExit:
+                        raise
+                    except BaseException:
+                        error = True
+                        raise
+                    finally:
+                        stats.end(time.perf_counter() - start, error)
+                        if profiling:
+                            profiler.leave()
+            elif inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def wrapper(*args, **kwargs):
+                    stats.begin()
+                    start = time.perf_counter()
+                    error = False
+                    try:
+                        return await fn(*args, **kwargs)
+                    except BaseException:
+                        error = True
+                        raise
+                    finally:
+                        stats.end(time.perf_counter() - start, error)
+            else:
+                @functools.wraps(fn)
+                def wrapper(*args, **kwargs):
+                    profiling = profiler is not None and profiler.enter(name)
+                    stats.begin()
+                    start = time.perf_counter()
+                    error = False
+                    try:
+                        return fn(*args, **kwargs)
+                    except BaseException:
+                        error = True
+                        raise
+                    finally:
+                        stats.end(time.perf_counter() - start, error)
+                        if profiling:
+                            profiler.leave()
+            if profiler is not None:
+                profiler._stop_codes.add(wrapper.__code__)
+            return wrapper
+        return decorate
+
+    def render(self) -> str:
+        """Eksposisi teks Prometheus (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            handlers = sorted(self.handlers.items())
+        lines.append(f"# HELP {PREFIX}_handler_duration_seconds Handler latency in seconds")
+        lines.append(f"# TYPE {PREFIX}_handler_duration_seconds histogram")
+        snapshots = []
+        for name, stats in handlers:
+            with stats._lock:
+                snapshot = (list(stats.bucket_counts), stats.total, stats.count, stats.errors, stats.in_flight)
+            snapshots.append((name, snapshot))
+            cumulative = 0
+            for bound, bucket_count in zip(stats.buckets + (float('inf'),), snapshot[0]):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'{PREFIX}_handler_duration_seconds_bucket{{handler="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{PREFIX}_handler_duration_seconds_sum{{handler="{name}"}} {snapshot[1]!r}')
+            lines.append(f'{PREFIX}_handler_duration_seconds_count{{handler="{name}"}} {snapshot[2]}')
+        for metric, kind, help_text, index in (
+            ("handler_calls_total", "counter", "Completed handler calls", 2),
+            ("handler_errors_total", "counter", "Handler calls that raised", 3),
+            ("handler_in_flight", "gauge", "Handler calls currently running", 4),
+        ):
+            lines.append(f"# HELP {PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{metric} {kind}")
+            for name, snapshot in snapshots:
+                lines.append(f'{PREFIX}_{metric}{{handler="{name}"}} {snapshot[index]}')
+
+        for component, collect in sorted(self.collectors.items()):
+            try:
+                values = collect()
+            except Exception as e:
+                logger.warning("Metrics collector %s failed: %s", component, e)
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                lines.append(f"# TYPE {PREFIX}_{component}_{key} gauge")
+                lines.append(f"{PREFIX}_{component}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def mount(self, fastapi_app, path: str = "/metrics"):
+        """Tambahkan route /metrics ke aplikasi FastAPI milik Gradio."""
+        from fastapi.responses import PlainTextResponse
+
+        def metrics_endpoint():
+            return PlainTextResponse(self.render(), media_type="text/plain; version=0.0.4")
+        fastapi_app.add_api_route(path, metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+
+REGISTRY = MetricsRegistry.from_env()
+timed = REGISTRY.timed
@@ -0,0 +1,453 @@
+# Renderer PDF berbasis template
+# Lapisan statis (judul, kotak ringkasan, footer, teks item) dirender sekali per
+# (instrumen, bahasa) menjadi objek PDF siap pakai. Per request hanya content
+# stream kecil berisi field dinamis (tanggal, skor, band, jawaban) yang ditambahkan.
+# Laporan gabungan (battery) menyusun ulang halaman beberapa template ke dalam satu
+# dokumen, didahului halaman ringkasan lintas instrumen.
+
+import zlib
+import hashlib
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from scoring import ScorePlan
+
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+
+# Lebar glyph font standar PDF (1/1000 em) untuk karakter ASCII 32..126
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 222, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    222, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 278, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    278, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+
+# nama resource -> (BaseFont, tabel lebar)
+FONTS = {
+    'regular': (b'F1', b'Helvetica', _HELVETICA_WIDTHS),
+    'bold': (b'F2', b'Helvetica-Bold', _HELVETICA_BOLD_WIDTHS),
+    'italic': (b'F3', b'Helvetica-Oblique', _HELVETICA_WIDTHS),
+}
+
+# Teks statis laporan; bisa ditimpa lewat bagian "report" di config/i18n/<lang>.json
+DEFAULT_STRINGS = {
+    'id': {
+        'title': "Laporan Hasil {title}",
+        'date': "Tanggal",
+        'summary': "Ringkasan Hasil",
+        'total_score': "Skor Total",
+        'interpretation': "Interpretasi",
+        'description': "Deskripsi",
+        'answer_details': "Detail Jawaban",
+        'answer': "Jawaban",
+        'disclaimer': "Platform ini untuk tujuan edukatif dan skrining awal saja",
+        'battery_title': "Laporan Evaluasi Gabungan",
+        'battery_summary': "Ringkasan Lintas Instrumen",
+        'instrument': "Instrumen",
+        'scale': "Skala",
+        'score': "Skor",
+    },
+    'en': {
+        'title': "{title} Result Report",
+        'date': "Date",
+        'summary': "Result Summary",
+        'total_score': "Total Score",
+        'interpretation': "Interpretation",
+        'description': "Description",
+        'answer_details': "Answer Details",
+        'answer': "Answer",
+        'disclaimer': "This platform is for educational and initial screening purposes only",
+        'battery_title': "Combined Assessment Report",
+        'battery_summary': "Cross-Instrument Summary",
+        'instrument': "Instrument",
+        'scale': "Scale",
+        'score': "Score",
+    },
+}
+
+
+def _clean(text: Any) -> str:
+    # Font standar hanya mendukung WinAnsi; karakter lain (emoji dsb.) dibuang
+    return str(text).encode('cp1252', errors='ignore').decode('cp1252').strip()
+
+
+def text_width(text: str, font: str = 'regular', size: float = 12) -> float:
+    widths = FONTS[font][2]
+    total = 0
+    for char in text:
+        code = ord(char)
+        total += widths[code - 32] if 32 <= code <= 126 else 556
+    return total * size / 1000.0
+
+
+def wrap_text(text: str, font: str, size: float, max_width: float) -> List[str]:
+    lines: List[str] = []
+    current = ""
+    for word in _clean(text).split():
+        candidate = f"{current} {word}" if current else word
+        if current and text_width(candidate, font, size) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines or [""]
+
+
+def _pdf_string(text: str) -> bytes:
+    raw = _clean(text).encode('cp1252')
+    return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _rgb(color: str) -> bytes:
+    color = color.lstrip('#')
+    r, g, b = (int(color[i:i + 2], 16) / 255.0 for i in (0, 2, 4))
+    return b'%.3f %.3f %.3f' % (r, g, b)
+
+
+class ContentStream:
+    """Builder content stream PDF; koordinat dalam fraksi halaman (0..1) seperti transAxes"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def text(self, x: float, y: float, text: str, font: str = 'regular', size: float = 12,
+             color: str = '#000000', align: str = 'left', va: str = 'baseline'):
+        text = _clean(text)
+        if not text:
+            return
+        px = x * PAGE_WIDTH
+        if align == 'center':
+            px -= text_width(text, font, size) / 2
+        elif align == 'right':
+            px -= text_width(text, font, size)
+        py = y * PAGE_HEIGHT
+        if va == 'top':
+            py -= size * 0.75
+        self.parts.append(b'BT /%s %.1f Tf %s rg %.2f %.2f Td %s Tj ET\n' % (
+            FONTS[font][0], size, _rgb(color), px, py, _pdf_string(text)))
+
+    def rect(self, x: float, y: float, width: float, height: float, color: str, line_width: float = 1):
+        self.parts.append(b'%s RG %.1f w %.2f %.2f %.2f %.2f re S\n' % (
+            _rgb(color), line_width, x * PAGE_WIDTH, y * PAGE_HEIGHT, width * PAGE_WIDTH, height * PAGE_HEIGHT))
+
+    def getvalue(self) -> bytes:
+        return b''.join(self.parts)
+
+
+def _stream_object(data: bytes, compress: bool) -> bytes:
+    if compress:
+        data = zlib.compress(data)
+        return b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(data), data)
+    return b'<< /Length %d >>\nstream\n%s\nendstream' % (len(data), data)
+
+
+_PDF_HEADER = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+_FONT_ORDER = ('regular', 'bold', 'italic')
+
+
+def _font_resources() -> bytes:
+    # Objek font selalu bernomor 3-5
+    return b' '.join(b'/%s %d 0 R' % (FONTS[name][0], 3 + i) for i, name in enumerate(_FONT_ORDER))
+
+
+def _document_head(kids: bytes, n_pages: int) -> List[bytes]:
+    """Objek 1-5: katalog, pohon halaman, tiga font"""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, n_pages),
+    ]
+    for name in _FONT_ORDER:
+        objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % FONTS[name][1])
+    return objects
+
+
+def _page_object(fonts: bytes, *contents: int) -> bytes:
+    return (b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /Font << %s >> >> '
+            b'/Contents [%s] >>' % (PAGE_WIDTH, PAGE_HEIGHT, fonts, b' '.join(b'%d 0 R' % n for n in contents)))
+
+
+def _write_document(objects: List[bytes]) -> bytes:
+    """Serialisasi objek bernomor 1..N lengkap dengan xref dan trailer"""
+    out = [_PDF_HEADER]
+    offsets = []
+    position = len(out[0])
+    for number, body in enumerate(objects, start=1):
+        chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        offsets.append(position)
+        out.append(chunk)
+        position += len(chunk)
+    out.append(_xref_trailer(offsets, position))
+    return b''.join(out)
+
+
+def _xref_trailer(offsets: List[int], position: int) -> bytes:
+    xref = [b'xref\n0 %d\n0000000000 65535 f \n' % (len(offsets) + 1)]
+    xref.extend(b'%010d 00000 n \n' % offset for offset in offsets)
+    xref.append(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(offsets) + 1, position))
+    return b''.join(xref)
+
+
+class ReportTemplate:
+    """Lapisan statis laporan untuk satu (instrumen, bahasa), siap di-overlay per request.
+
+    Nomor objek PDF tetap: objek statis (katalog, halaman, font, stream statis)
+    diserialisasi sekali di sini; render() hanya menambahkan satu stream dinamis
+    per halaman, xref dan trailer.
+    """
+
+    def __init__(self, instrument: Dict[str, Any], plan: ScorePlan, lang: str = "id",
+                 strings: Optional[Dict[str, str]] = None):
+        self.instrument_id = instrument['id']
+        self.lang = lang
+        self.strings = dict(DEFAULT_STRINGS['id'])
+        self.strings.update(DEFAULT_STRINGS.get(lang, {}))
+        self.strings.update(strings or {})
+        self.scoring_type = plan.scoring_type
+        self.categories = plan.categories
+        self.slots = dict(plan.slots)
+        title = instrument.get('title', {})
+        self.title = title.get(lang) or title.get('id', '')
+
+        pages = [self._summary_page(instrument)]
+        self.answer_positions: List[Tuple[int, float, float]] = [(-1, 0.0, 0.0)] * plan.n_items
+        pages.extend(self._detail_pages(instrument))
+        self.page_count = len(pages)
+        self._prefix, self._offsets = self._serialize(pages)
+        # Berubah jika teks instrumen/terjemahan berubah; dipakai sebagai bagian kunci cache laporan
+        self.fingerprint = hashlib.sha1(self._prefix).hexdigest()[:16]
+
+    def _text(self, key: str) -> str:
+        return self.strings.get(key, DEFAULT_STRINGS['id'][key])
+
+    # -- lapisan statis -------------------------------------------------
+    def _summary_page(self, instrument: Dict[str, Any]) -> bytes:
+        page = ContentStream()
+        page.text(0.5, 0.95, self._text('title').format(title=self.title), font='bold', size=24,
+                  color='#2c3e50', align='center', va='top')
+        page.text(0.1, 0.80, self._text('summary'), font='bold', size=18, color='#2c3e50')
+
+        # Posisi nilai dinamis dihitung dari lebar label statis
+        self.value_x: List[float] = []
+        if self.scoring_type == 'sum':
+            labels = [f"{self._text('total_score')}: "]
+        else:
+            labels = [f"{category.replace('_', ' ').title()}: " for category in self.categories]
+        for row, label in enumerate(labels):
+            page.text(0.1, 0.75 - 0.05 * row, label, font='bold', size=16, color='#e74c3c')
+            self.value_x.append(0.1 + text_width(label, 'bold', 16) / PAGE_WIDTH)
+
+        self.interp_row = len(labels)
+        if self.scoring_type == 'sum':
+            interp_label = f"{self._text('interpretation')}: "
+            desc_label = f"{self._text('description')}: "
+            page.text(0.1, 0.70, interp_label, size=16, color='#3498db')
+            page.text(0.1, 0.65, desc_label, size=14, color='#34495e')
+            self.interp_x = 0.1 + text_width(interp_label, 'regular', 16) / PAGE_WIDTH
+            self.desc_x = 0.1 + text_width(desc_label, 'regular', 14) / PAGE_WIDTH
+
+        page.rect(0.05, 0.55, 0.9, 0.25, color='#3498db', line_width=2)
+        page.text(0.5, 0.05, self._text('disclaimer'), font='italic', size=10, color='#7f8c8d', align='center')
+        return page.getvalue()
+
+    def _detail_pages(self, instrument: Dict[str, Any]) -> List[bytes]:
+        pages: List[bytes] = []
+        page = ContentStream()
+        page.text(0.5, 0.95, self._text('answer_details'), font='bold', size=20,
+                  color='#2c3e50', align='center', va='top')
+        answer_label = f"{self._text('answer')}: "
+        self.answer_value_dx = text_width(answer_label, 'bold', 12) / PAGE_WIDTH
+
+        y_pos = 0.90
+        for item in instrument.get('items', []):
+            slot = self.slots.get(item['id'])
+            if slot is None:
+                continue
+            text = item.get('text', {})
+            lines = wrap_text(f"• {text.get(self.lang) or text.get('id', '')}", 'regular', 12, 0.58 * PAGE_WIDTH)
+            if y_pos - 0.02 * (len(lines) - 1) < 0.1:
+                pages.append(page.getvalue())
+                page = ContentStream()
+                y_pos = 0.95
+
+            for line_no, line in enumerate(lines):
+                page.text(0.1, y_pos - 0.02 * line_no, line, size=12, color='#34495e')
+            page.text(0.7, y_pos, answer_label, font='bold', size=12, color='#e74c3c')
+            self.answer_positions[slot] = (len(pages), 0.7 + self.answer_value_dx, y_pos)
+            y_pos -= 0.02 * (len(lines) - 1) + 0.03
+
+        pages.append(page.getvalue())
+        return pages
+
+    def _serialize(self, pages: List[bytes]) -> Tuple[bytes, List[int]]:
+        # 1 katalog, 2 pages, 3-5 font, lalu per halaman: page + stream statis.
+        # Stream dinamis memakai nomor setelahnya (dynamic_base + indeks halaman).
+        n_pages = len(pages)
+        first_page = 6
+        self._dynamic_base = first_page + 2 * n_pages
+        kids = b' '.join(b'%d 0 R' % (first_page + 2 * i) for i in range(n_pages))
+        fonts = _font_resources()
+
+        objects = _document_head(kids, n_pages)
+        # Stream statis terkompresi disimpan juga untuk disusun ulang di laporan gabungan
+        self._static_streams = [_stream_object(content, compress=True) for content in pages]
+        for i, stream in enumerate(self._static_streams):
+            objects.append(_page_object(fonts, first_page + 2 * i + 1, self._dynamic_base + i))
+            objects.append(stream)
+
+        out = [_PDF_HEADER]
+        offsets = []
+        position = len(out[0])
+        for number, body in enumerate(objects, start=1):
+            chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+            offsets.append(position)
+            out.append(chunk)
+            position += len(chunk)
+        return b''.join(out), offsets
+
+    # -- lapisan dinamis ------------------------------------------------
+    def _overlay(self, score: Dict, interpretation: Dict, responses: Dict, date: str) -> List[bytes]:
+        pages = [ContentStream() for _ in range(self.page_count)]
+        summary = pages[0]
+        summary.text(0.5, 0.90, f"{self._text('date')}: {date}", size=12, color='#7f8c8d', align='center', va='top')
+
+        if self.scoring_type == 'sum':
+            summary.text(self.value_x[0], 0.75, f"{score.get('total', 0)}/{score.get('max_score', 0)}",
+                         font='bold', size=16, color='#e74c3c')
+            band = interpretation if isinstance(interpretation, dict) else {}
+            summary.text(self.interp_x, 0.70, band.get('label', {}).get(self.lang, 'N/A'), size=16, color='#3498db')
+            description = band.get('description', {}).get(self.lang, 'N/A')
+            for line_no, line in enumerate(wrap_text(description, 'regular', 14, (0.92 - self.desc_x) * PAGE_WIDTH)[:3]):
+                summary.text(self.desc_x, 0.65 - 0.02 * line_no, line, size=14, color='#34495e')
+        else:
+            for row, category in enumerate(self.categories):
+                cat_score = score.get(category, {})
+                band = (interpretation or {}).get(category, {})
+                label = band.get('label', {}).get(self.lang, 'N/A')
+                summary.text(self.value_x[row], 0.75 - 0.05 * row,
+                             f"{cat_score.get('score', 0)}/{cat_score.get('max_score', 0)} - {label}",
+                             font='bold', size=16, color='#e74c3c')
+
+        for item_id, response in responses.items():
+            slot = self.slots.get(item_id)
+            if slot is None:
+                continue
+            page, x, y = self.answer_positions[slot]
+            if page >= 0:
+                pages[page + 1].text(x, y, str(response), font='bold', size=12, color='#e74c3c')
+        return [page.getvalue() for page in pages]
+
+    def summary_rows(self, score: Dict, interpretation: Dict) -> List[Tuple[str, str, str]]:
+        """Baris (skala, skor, interpretasi) untuk halaman ringkasan laporan gabungan"""
+        if self.scoring_type == 'sum':
+            band = interpretation if isinstance(interpretation, dict) else {}
+            return [(self._text('total_score'), f"{score.get('total', 0)}/{score.get('max_score', 0)}",
+                     band.get('label', {}).get(self.lang, 'N/A'))]
+        rows = []
+        for category in self.categories:
+            cat_score = score.get(category, {})
+            band = (interpretation or {}).get(category, {})
+            rows.append((category.replace('_', ' ').title(),
+                         f"{cat_score.get('score', 0)}/{cat_score.get('max_score', 0)}",
+                         band.get('label', {}).get(self.lang, 'N/A')))
+        return rows
+
+    def render(self, score: Dict, interpretation: Dict, responses: Dict, date: Optional[str] = None) -> bytes:
+        """Render PDF lengkap (bytes) dengan field dinamis di atas lapisan statis"""
+        if date is None:
+            date = datetime.now().strftime('%d %B %Y')
+        out = [self._prefix]
+        offsets = list(self._offsets)
+        position = len(self._prefix)
+        for i, content in enumerate(self._overlay(score, interpretation, responses, date)):
+            chunk = b'%d 0 obj\n%s\nendobj\n' % (self._dynamic_base + i, _stream_object(content, compress=False))
+            offsets.append(position)
+            out.append(chunk)
+            position += len(chunk)
+        out.append(_xref_trailer(offsets, position))
+        return b''.join(out)
+
+
+# Kolom tabel ringkasan gabungan: (x kiri, lebar) dalam fraksi halaman
+_BATTERY_COLUMNS = ((0.08, 0.28), (0.38, 0.20), (0.60, 0.12), (0.74, 0.20))
+
+
+def _battery_summary(templates: List[ReportTemplate], results: List[Tuple[Dict, Dict, Dict]], date: str) -> List[bytes]:
+    """Halaman ringkasan lintas instrumen; berpindah halaman jika tabel tidak muat"""
+    head = templates[0]
+    header = (head._text('instrument'), head._text('scale'), head._text('score'), head._text('interpretation'))
+    pages: List[bytes] = []
+
+    def new_page() -> Tuple[ContentStream, float]:
+        page = ContentStream()
+        page.text(0.5, 0.95, head._text('battery_title'), font='bold', size=24, color='#2c3e50', align='center', va='top')
+        page.text(0.5, 0.90, f"{head._text('date')}: {date}", size=12, color='#7f8c8d', align='center', va='top')
+        page.text(0.08, 0.82, head._text('battery_summary'), font='bold', size=18, color='#2c3e50')
+        for (x, _), label in zip(_BATTERY_COLUMNS, header):
+            page.text(x, 0.77, label, font='bold', size=12, color='#2c3e50')
+        page.rect(0.08, 0.765, 0.86, 0.0, color='#3498db', line_width=1)
+        page.text(0.5, 0.05, head._text('disclaimer'), font='italic', size=10, color='#7f8c8d', align='center')
+        return page, 0.74
+
+    page, y_pos = new_page()
+    for template, (score, interpretation, _) in zip(templates, results):
+        for row, cells in enumerate(template.summary_rows(score, interpretation)):
+            cells = (template.title if row == 0 else "",) + cells
+            wrapped = [wrap_text(cell, 'bold' if column == 2 else 'regular', 12, width * PAGE_WIDTH)
+                       for column, ((_, width), cell) in enumerate(zip(_BATTERY_COLUMNS, cells))]
+            height = 0.02 * max(len(lines) for lines in wrapped)
+            if y_pos - height < 0.1:
+                pages.append(page.getvalue())
+                page, y_pos = new_page()
+            for column, ((x, _), lines) in enumerate(zip(_BATTERY_COLUMNS, wrapped)):
+                for line_no, line in enumerate(lines):
+                    page.text(x, y_pos - 0.02 * line_no, line, font='bold' if column == 2 else 'regular', size=12,
+                              color='#e74c3c' if column == 2 else '#34495e')
+            y_pos -= height + 0.01
+        page.rect(0.08, y_pos + 0.015, 0.86, 0.0, color='#bdc3c7', line_width=0.5)
+        y_pos -= 0.01
+    pages.append(page.getvalue())
+    return pages
+
+
+def render_battery(templates: List[ReportTemplate], results: List[Tuple[Dict, Dict, Dict]],
+                   date: Optional[str] = None) -> bytes:
+    """Satu PDF untuk beberapa instrumen: ringkasan lintas instrumen lalu halaman tiap template.
+
+    `results` sejajar dengan `templates`, berisi (skor, interpretasi, jawaban).
+    Stream statis tiap template dipakai ulang apa adanya (sudah terkompresi),
+    hanya nomor objeknya yang disusun ulang.
+    """
+    if date is None:
+        date = datetime.now().strftime('%d %B %Y')
+    pages: List[List[bytes]] = [[_stream_object(content, compress=False)]
+                                for content in _battery_summary(templates, results, date)]
+    for template, (score, interpretation, responses) in zip(templates, results):
+        overlay = template._overlay(score, interpretation, responses, date)
+        for static, content in zip(template._static_streams, overlay):
+            pages.append([static, _stream_object(content, compress=False)])
+
+    # Nomor objek: 1-5 kepala dokumen, lalu per halaman objek page diikuti stream-nya
+    fonts = _font_resources()
+    numbers = []
+    number = 6
+    for streams in pages:
+        numbers.append(number)
+        number += 1 + len(streams)
+    objects = _document_head(b' '.join(b'%d 0 R' % n for n in numbers), len(pages))
+    for page_number, streams in zip(numbers, pages):
+        objects.append(_page_object(fonts, *range(page_number + 1, page_number + 1 + len(streams))))
+        objects.extend(streams)
+    return _write_document(objects)
@@ -0,0 +1,227 @@
+# Psikometri instrumen
+# Reliabilitas (Cronbach's alpha) per skala/kategori, korelasi item-total
+# terkoreksi, alpha-if-deleted, rerata/varians item dan tingkat floor/ceiling.
+# Semua statistik diturunkan dari satu akumulator kovarians single-pass
+# (Welford/Chan) yang bisa digabung, sehingga file atau chunk dapat diproses
+# paralel lalu hasilnya di-merge tanpa membaca ulang data.
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterable, Optional
+
+import numpy as np
+
+import batch_scoring
+from scoring import ScorePlan, compile_instrument
+
+
+class CovarianceAccumulator:
+    """Rerata dan co-moment (n_item x n_item) berjalan yang bisa di-merge."""
+
+    def __init__(self, n_items: int):
+        self.n = 0
+        self.mean = np.zeros(n_items, dtype=np.float64)
+        self.M2 = np.zeros((n_items, n_items), dtype=np.float64)
+
+    def update(self, X: np.ndarray):
+        """Tambahkan satu batch baris (n, n_item) sekaligus."""
+        n = len(X)
+        if not n:
+            return
+        X = X.astype(np.float64, copy=False)
+        batch_mean = X.mean(axis=0)
+        centered = X - batch_mean
+        batch = CovarianceAccumulator(X.shape[1])
+        batch.n, batch.mean, batch.M2 = n, batch_mean, centered.T @ centered
+        self.merge(batch)
+
+    def merge(self, other: "CovarianceAccumulator") -> "CovarianceAccumulator":
+        # Rumus gabungan Chan et al.: stabil secara numerik untuk n besar
+        if not other.n:
+            return self
+        if not self.n:
+            self.n, self.mean, self.M2 = other.n, other.mean.copy(), other.M2.copy()
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.M2 = self.M2 + other.M2 + np.outer(delta, delta) * (self.n * other.n / n)
+        self.mean = self.mean + delta * (other.n / n)
+        self.n = n
+        return self
+
+    def covariance(self, ddof: int = 1) -> np.ndarray:
+        if self.n <= ddof:
+            return np.full_like(self.M2, np.nan)
+        return self.M2 / (self.n - ddof)
+
+
+class ItemAccumulator:
+    """Akumulator kovarians plus hitungan floor/ceiling dan baris yang dikeluarkan."""
+
+    def __init__(self, plan: ScorePlan, allowed: np.ndarray):
+        self.plan = plan
+        self.allowed = allowed
+        # Nilai opsi minimum/maksimum per slot, dan skor total minimum/maksimum per kategori
+        self.item_min = allowed.argmax(axis=1)
+        self.item_max = allowed.shape[1] - 1 - allowed[:, ::-1].argmax(axis=1)
+        self.total_min = plan.weights @ self.item_min
+        self.total_max = plan.weights @ self.item_max
+        self.cov = CovarianceAccumulator(plan.n_items)
+        self.item_floor = np.zeros(plan.n_items, dtype=np.int64)
+        self.item_ceiling = np.zeros(plan.n_items, dtype=np.int64)
+        self.total_floor = np.zeros(len(plan.categories), dtype=np.int64)
+        self.total_ceiling = np.zeros(len(plan.categories), dtype=np.int64)
+        self.excluded = 0
+
+    def update(self, responses: np.ndarray):
+        """Tambahkan matriks jawaban; baris dengan jawaban tidak sah dikeluarkan (listwise)."""
+        valid = batch_scoring.valid_rows(self.plan, responses, self.allowed)
+        excluded = int(len(responses) - valid.sum())
+        if excluded:
+            self.excluded += excluded
+            responses = responses[valid]
+        if not len(responses):
+            return
+        totals = batch_scoring.score_matrix(self.plan, responses)
+        self.cov.update(responses)
+        self.item_floor += (responses == self.item_min).sum(axis=0)
+        self.item_ceiling += (responses == self.item_max).sum(axis=0)
+        self.total_floor += (totals == self.total_min).sum(axis=0)
+        self.total_ceiling += (totals == self.total_max).sum(axis=0)
+
+    def update_frame(self, frame: "pd.DataFrame"):
+        import pandas as pd
+
+        plan = self.plan
+        scored_items = {plan.item_ids[slot] for slots in plan.category_slots for slot in slots}
+        missing = sorted(scored_items - set(frame.columns))
+        if missing:
+            raise ValueError(f"Missing response columns for {plan.instrument_id}: {', '.join(missing)}")
+        # Urutan kolom (Fortran) agar pengisian dan reduksi per item berjalan di memori yang berurutan
+        responses = np.zeros((len(frame), plan.n_items), dtype=np.int64, order='F')
+        for slot, item_id in enumerate(plan.item_ids):
+            if item_id not in frame.columns:
+                continue
+            column = frame[item_id]
+            if not pd.api.types.is_integer_dtype(column.dtype):
+                # Jawaban kosong/non-numerik -> -1 agar baris dikeluarkan oleh valid_rows
+                column = pd.to_numeric(column, errors='coerce').fillna(-1)
+            responses[:, slot] = column.to_numpy(dtype=np.int64)
+        self.update(responses)
+
+    def merge(self, other: "ItemAccumulator") -> "ItemAccumulator":
+        self.cov.merge(other.cov)
+        self.item_floor += other.item_floor
+        self.item_ceiling += other.item_ceiling
+        self.total_floor += other.total_floor
+        self.total_ceiling += other.total_ceiling
+        self.excluded += other.excluded
+        return self
+
+    def statistics(self) -> Dict[str, Any]:
+        """Statistik per kategori dari akumulator (O(n_item^2), tanpa membaca data lagi)."""
+        plan = self.plan
+        n = self.cov.n
+        C = self.cov.covariance()
+        item_var = np.diag(C)
+        categories = {}
+        for index, category in enumerate(plan.categories):
+            slots = plan.category_slots[index]
+            w = plan.weights[index, slots]
+            sub = C[np.ix_(slots, slots)]
+            k = len(slots)
+            weighted_item_var = w ** 2 * np.diag(sub)
+            total_var = float(w @ sub @ w)
+            cov_with_total = sub @ w
+            # Item-total terkoreksi: korelasi item dengan total tanpa item itu sendiri
+            rest_cov = cov_with_total - w * np.diag(sub)
+            rest_var = total_var - 2 * w * cov_with_total + weighted_item_var
+            with np.errstate(divide='ignore', invalid='ignore'):
+                alpha = _alpha(k, weighted_item_var.sum(), total_var)
+                item_total = rest_cov / np.sqrt(np.diag(sub) * rest_var)
+                alpha_deleted = _alpha(k - 1, weighted_item_var.sum() - weighted_item_var, rest_var)
+            items = []
+            for position, slot in enumerate(slots.tolist()):
+                items.append({
+                    'item': plan.item_ids[slot],
+                    'mean': _number(self.cov.mean[slot]),
+                    'variance': _number(item_var[slot]),
+                    'corrected_item_total': _number(item_total[position]),
+                    'alpha_if_deleted': _number(alpha_deleted[position]) if k > 2 else None,
+                    'floor': _rate(self.item_floor[slot], n),
+                    'ceiling': _rate(self.item_ceiling[slot], n),
+                })
+            categories[category] = {
+                'n_items': k,
+                'alpha': _number(alpha) if k > 1 else None,
+                'total_mean': _number(w @ self.cov.mean[slots]),
+                'total_variance': _number(total_var),
+                'floor': _rate(self.total_floor[index], n),
+                'ceiling': _rate(self.total_ceiling[index], n),
+                'items': items,
+            }
+        return {'instrument': plan.instrument_id, 'n': n, 'excluded': self.excluded, 'categories': categories}
+
+
+def _alpha(k, sum_item_var, total_var):
+    return (k / (k - 1)) * (1 - sum_item_var / total_var) if k > 1 else np.nan
+
+
+def _number(value) -> Optional[float]:
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def _rate(count, n: int) -> Optional[float]:
+    return float(count) / n if n else None
+
+
+def analyze_file(plan: ScorePlan, instrument: Dict, path: str,
+                 chunk_size: int = batch_scoring.DEFAULT_CHUNK_SIZE) -> ItemAccumulator:
+    """Satu pass streaming atas file respons; hanya kolom item yang dibaca."""
+    accumulator = ItemAccumulator(plan, batch_scoring.allowed_values(plan, instrument))
+    for chunk in batch_scoring.iter_response_chunks(path, chunk_size, columns=list(plan.item_ids)):
+        accumulator.update_frame(chunk)
+    return accumulator
+
+
+def _analyze_worker(instrument: Dict, path: str, chunk_size: int) -> ItemAccumulator:
+    # ScorePlan memakai MappingProxyType (tidak bisa di-pickle), jadi dikompilasi ulang di worker
+    accumulator = analyze_file(compile_instrument(instrument), instrument, path, chunk_size)
+    accumulator.plan = None
+    return accumulator
+
+
+def analyze_files(plan: ScorePlan, instrument: Dict, paths: Iterable[str],
+                  chunk_size: int = batch_scoring.DEFAULT_CHUNK_SIZE, workers: int = 1) -> ItemAccumulator:
+    """Analisis beberapa file (paralel jika workers > 1) lalu gabungkan akumulatornya."""
+    paths = list(paths)
+    total = ItemAccumulator(plan, batch_scoring.allowed_values(plan, instrument))
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            total.merge(analyze_file(plan, instrument, path, chunk_size))
+        return total
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(_analyze_worker, instrument, path, chunk_size) for path in paths]
+        for future in futures:
+            total.merge(future.result())
+    return total
+
+
+def format_table(stats: Dict[str, Any]) -> str:
+    """Ringkasan teks untuk CLI."""
+    def fmt(value, spec='.3f'):
+        return '-' if value is None else format(value, spec)
+
+    lines = [f"{stats['instrument']}: n={stats['n']} (excluded {stats['excluded']})"]
+    for category, data in stats['categories'].items():
+        lines.append("")
+        lines.append(f"[{category}] alpha={fmt(data['alpha'])}  mean={fmt(data['total_mean'], '.2f')}  "
+                     f"floor={fmt(data['floor'], '.1%')}  ceiling={fmt(data['ceiling'], '.1%')}")
+        lines.append(f"  {'item':<14}{'mean':>8}{'var':>8}{'r_it':>8}{'a_del':>8}{'floor':>8}{'ceil':>8}")
+        for item in data['items']:
+            lines.append(f"  {item['item']:<14}{fmt(item['mean'], '.2f'):>8}{fmt(item['variance'], '.2f'):>8}"
+                         f"{fmt(item['corrected_item_total']):>8}{fmt(item['alpha_if_deleted']):>8}"
+                         f"{fmt(item['floor'], '.1%'):>8}{fmt(item['ceiling'], '.1%'):>8}")
+    return "\n".join(lines)
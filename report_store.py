@@ -0,0 +1,161 @@
+# Penyimpanan file laporan PDF dengan batas disk
+# File diberi nama berdasarkan hash konten request (content-addressed), sehingga
+# submission identik memakai ulang PDF yang sama. Ukuran total dan umur file
+# dibatasi dengan eviksi LRU dan sweeper di background.
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "teman-mentalmu-reports")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 60 * 60
+DEFAULT_SWEEP_INTERVAL = 60
+
+
+def report_key(instrument_id: str, responses: Dict[str, Any], lang: str, date: str, version: str = "") -> str:
+    """Hash stabil untuk (instrumen, jawaban, bahasa, tanggal, versi template)"""
+    payload = json.dumps([instrument_id, sorted(responses.items()), lang, date, version],
+                         separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ReportStore:
+    """Direktori laporan PDF dengan batas ukuran/umur dan eviksi LRU."""
+
+    def __init__(self, directory: str = DEFAULT_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE, sweep_interval: float = DEFAULT_SWEEP_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # nama file -> (ukuran, waktu dibuat)
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.bytes_on_disk = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan()
+
+    @classmethod
+    def from_env(cls) -> "ReportStore":
+        return cls(
+            directory=os.environ.get("TEMAN_REPORT_DIR", DEFAULT_DIR),
+            max_bytes=int(float(os.environ.get("TEMAN_REPORT_MAX_MB", DEFAULT_MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+            max_age=float(os.environ.get("TEMAN_REPORT_MAX_AGE", DEFAULT_MAX_AGE))
+        )
+
+    def _scan(self):
+        # Indeks ulang file yang tersisa dari proses sebelumnya, terlama dulu
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.tmp'):
+                # Sisa penulisan yang terputus (bukan yang sedang ditulis proses lain)
+                if time.time() - entry.stat().st_mtime > 60:
+                    os.remove(entry.path)
+            elif entry.is_file() and entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for mtime, name, size in sorted(found):
+            self._entries[name] = (size, mtime)
+            self.bytes_on_disk += size
+        self.sweep()
+
+    def filename(self, instrument_id: str, key: str) -> str:
+        return f"{instrument_id}-{key[:32]}.pdf"
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, instrument_id: str, key: str) -> Optional[str]:
+        name = self.filename(instrument_id, key)
+        with self._lock:
+            if name in self._entries and os.path.exists(self.path(name)):
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return self.path(name)
+            if name in self._entries:
+                size, _ = self._entries.pop(name)
+                self.bytes_on_disk -= size
+            self.misses += 1
+        return None
+
+    def put(self, instrument_id: str, key: str, data: bytes) -> str:
+        name = self.filename(instrument_id, key)
+        path = self.path(name)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if name in self._entries:
+                self.bytes_on_disk -= self._entries.pop(name)[0]
+            self._entries[name] = (len(data), time.time())
+            self.bytes_on_disk += len(data)
+            self._evict_locked(keep=name)
+        return path
+
+    def get_or_create(self, instrument_id: str, key: str, render: Callable[[], bytes]) -> str:
+        return self.get(instrument_id, key) or self.put(instrument_id, key, render())
+
+    def _remove_locked(self, name: str):
+        size, _ = self._entries.pop(name)
+        self.bytes_on_disk -= size
+        self.evictions += 1
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def _evict_locked(self, keep: Optional[str] = None):
+        while self.bytes_on_disk > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self._remove_locked(oldest)
+
+    def sweep(self):
+        """Hapus file kedaluwarsa dan jaga total ukuran di bawah batas"""
+        with self._lock:
+            now = time.time()
+            for name, (_, created) in list(self._entries.items()):
+                if now - created > self.max_age:
+                    self._remove_locked(name)
+            self._evict_locked()
+
+    def start_sweeper(self):
+        if self._sweeper is not None:
+            return
+        def run():
+            while not self._stop.wait(self.sweep_interval):
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("Report sweep failed")
+        self._sweeper = threading.Thread(target=run, name="report-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'files': len(self._entries),
+            'bytes_on_disk': self.bytes_on_disk,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,147 @@
+# Pembuatan laporan PDF
+# Lapisan statis setiap laporan di-cache per (instrumen, bahasa) sebagai
+# ReportTemplate; rendering per request hanya menambah field dinamis dan
+# dijalankan di process pool terbatas agar tidak memblokir thread request.
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from pdf_template import ReportTemplate, render_battery
+from scoring import ScorePlan
+
+DEFAULT_WORKERS = max(1, min(2, os.cpu_count() or 1))
+
+
+class ReportEngine:
+    """Cache template laporan per (instrumen, bahasa)."""
+
+    def __init__(self, i18n: Optional[Dict[str, Dict]] = None):
+        self.i18n = i18n or {}
+        self._templates: Dict[Tuple[str, str], ReportTemplate] = {}
+        self._lock = threading.Lock()
+
+    def template(self, instrument: Dict[str, Any], plan: ScorePlan, lang: str = "id") -> ReportTemplate:
+        key = (instrument['id'], lang)
+        template = self._templates.get(key)
+        if template is None:
+            template = ReportTemplate(instrument, plan, lang, self.i18n.get(lang, {}).get('report'))
+            with self._lock:
+                self._templates[key] = template
+        return template
+
+    def warm(self, instruments: Dict[str, Dict], plans: Dict[str, ScorePlan], langs=("id", "en")):
+        """Pre-render lapisan statis semua instrumen saat startup"""
+        for instrument_id, plan in plans.items():
+            for lang in langs:
+                self.template(instruments[instrument_id], plan, lang)
+
+    def invalidate(self, instrument_id: Optional[str] = None):
+        with self._lock:
+            if instrument_id is None:
+                self._templates.clear()
+            else:
+                for key in [key for key in self._templates if key[0] == instrument_id]:
+                    del self._templates[key]
+
+
+def render_report_bytes(template: ReportTemplate, score: Dict, interpretation: Dict, responses: Dict,
+                        date: Optional[str] = None) -> bytes:
+    return template.render(score, interpretation, responses, date)
+
+
+class ReportPoolSaturated(RuntimeError):
+    """Pool PDF penuh; request baru ditolak (backpressure)"""
+
+
+class ReportPool:
+    """Process pool terbatas untuk rendering PDF dengan batas antrean."""
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS, max_pending: Optional[int] = None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending if max_pending is not None else max_workers * 4
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "ReportPool":
+        workers = int(os.environ.get("TEMAN_PDF_WORKERS", DEFAULT_WORKERS))
+        pending = os.environ.get("TEMAN_PDF_MAX_PENDING")
+        return cls(max_workers=workers, max_pending=int(pending) if pending else None)
+
+    @property
+    def queue_depth(self) -> int:
+        """Jumlah job yang sedang dirender atau menunggu di antrean"""
+        return self._pending
+
+    @property
+    def saturated(self) -> bool:
+        return self._pending >= self.max_pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def submit(self, template: ReportTemplate, score: Dict, interpretation: Dict, responses: Dict,
+               date: Optional[str] = None) -> Future:
+        return self._submit(render_report_bytes, template, score, interpretation, responses, date)
+
+    def submit_battery(self, templates: List[ReportTemplate], results: List[Tuple[Dict, Dict, Dict]],
+                       date: Optional[str] = None) -> Future:
+        """Satu job untuk laporan gabungan beberapa instrumen (satu dokumen, satu slot antrean)"""
+        return self._submit(render_battery, templates, results, date)
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise ReportPoolSaturated(f"PDF queue full ({self._pending}/{self.max_pending})")
+            self._pending += 1
+            self.submitted += 1
+            executor = self._get_executor()
+
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self.failed += 1
+            raise
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'queue_depth': self._pending,
+            'max_pending': self.max_pending,
+            'workers': self.max_workers,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected
+        }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
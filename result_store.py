@@ -0,0 +1,441 @@
+# Penyimpanan hasil skrining
+# Setiap hasil disimpan sebagai baris ringkas: waktu, id instrumen, vektor
+# jawaban (int16), skor per kategori (int32), indeks band (int16) dan indeks
+# prioritas keselamatan. Event handler hanya memasukkan baris ke antrean; writer
+# di background menulis per batch ke backend (SQLite WAL atau segmen kolom
+# append-only) sehingga request tidak pernah menunggu fsync.
+
+import os
+import glob
+import atexit
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Any, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_BATCH_SIZE = 512
+DEFAULT_FLUSH_INTERVAL = 0.5
+DEFAULT_MAX_PENDING = 100_000
+
+RESPONSE_DTYPE = np.int16
+SCORE_DTYPE = np.int32
+BAND_DTYPE = np.int16
+
+
+class ResultRow(NamedTuple):
+    """Satu hasil dalam encoding ringkas."""
+    timestamp: float
+    instrument_id: str
+    responses: np.ndarray   # slot jawaban sesuai ScorePlan.item_ids
+    scores: np.ndarray      # skor per kategori sesuai ScorePlan.categories
+    bands: np.ndarray       # indeks band per kategori (-1 = tidak ada)
+    priority: int = -1      # indeks ke SafetyEngine.priorities (-1 = tidak ada)
+    subject: Optional[str] = None  # ID subjek opsional untuk pemantauan longitudinal
+
+
+class ResultChunk(NamedTuple):
+    """Potongan hasil satu instrumen dalam bentuk kolom NumPy."""
+    instrument_id: str
+    timestamps: np.ndarray  # (n,) float64
+    responses: np.ndarray   # (n, n_item)
+    scores: np.ndarray      # (n, n_kategori)
+    bands: np.ndarray       # (n, n_kategori)
+    priority: np.ndarray    # (n,)
+
+
+def _stack_blobs(blobs: List[bytes], dtype) -> np.ndarray:
+    return np.frombuffer(b''.join(blobs), dtype=dtype).reshape(len(blobs), -1)
+
+
+class SQLiteBackend:
+    """Backend default: satu tabel SQLite dalam mode WAL."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._initialized = False
+        # Koneksi SQLite tidak boleh dipakai lintas fork (mode serve --workers):
+        # proses anak membuka koneksinya sendiri
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Satu koneksi per thread (writer di background, pembaca di thread request);
+        # file & skema baru dibuat saat pertama dipakai
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                if not self._initialized:
+                    self._create_schema(connection)
+                    self._initialized = True
+                self._connections.append(connection)
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _create_schema(connection: sqlite3.Connection):
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY,
+                ts REAL NOT NULL,
+                instrument TEXT NOT NULL,
+                responses BLOB NOT NULL,
+                scores BLOB NOT NULL,
+                bands BLOB NOT NULL,
+                priority INTEGER NOT NULL DEFAULT -1
+            )
+        """)
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(results)")}
+        if 'subject' not in columns:
+            connection.execute("ALTER TABLE results ADD COLUMN subject TEXT")
+        connection.execute("CREATE INDEX IF NOT EXISTS results_instrument_ts ON results (instrument, ts)")
+        connection.execute("CREATE INDEX IF NOT EXISTS results_subject ON results (subject, instrument) WHERE subject IS NOT NULL")
+        connection.commit()
+
+    def write_batch(self, rows: List[ResultRow]):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT INTO results (ts, instrument, responses, scores, bands, priority, subject) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(row.timestamp, row.instrument_id,
+                  row.responses.astype(RESPONSE_DTYPE).tobytes(),
+                  row.scores.astype(SCORE_DTYPE).tobytes(),
+                  row.bands.astype(BAND_DTYPE).tobytes(),
+                  row.priority, row.subject) for row in rows]
+            )
+
+    def iter_rows(self, instrument_id: Optional[str] = None, since: Optional[float] = None,
+                  until: Optional[float] = None, subject: Optional[str] = None) -> Iterator[ResultRow]:
+        query = "SELECT ts, instrument, responses, scores, bands, priority, subject FROM results"
+        clauses, params = [], []
+        if subject is not None:
+            clauses.append("subject = ?")
+            params.append(subject)
+        if instrument_id is not None:
+            clauses.append("instrument = ?")
+            params.append(instrument_id)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        for ts, instrument, responses, scores, bands, priority, row_subject in self._connect().execute(
+                query + " ORDER BY id", params):
+            yield ResultRow(ts, instrument,
+                            np.frombuffer(responses, dtype=RESPONSE_DTYPE),
+                            np.frombuffer(scores, dtype=SCORE_DTYPE),
+                            np.frombuffer(bands, dtype=BAND_DTYPE),
+                            priority, row_subject)
+
+    def iter_chunks(self, instrument_id: str, since: Optional[float] = None, until: Optional[float] = None,
+                    chunk_size: int = 100_000, since_seq: Optional[int] = None,
+                    until_seq: Optional[int] = None) -> Iterator[ResultChunk]:
+        query = "SELECT ts, responses, scores, bands, priority FROM results WHERE instrument = ?"
+        params: List[Any] = [instrument_id]
+        if since is not None:
+            query += " AND ts >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND ts < ?"
+            params.append(until)
+        if since_seq is not None:
+            query += " AND id >= ?"
+            params.append(since_seq)
+        if until_seq is not None:
+            query += " AND id < ?"
+            params.append(until_seq)
+        cursor = self._connect().execute(query + " ORDER BY id", params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            # Baris dari versi instrumen lama bisa punya panjang vektor berbeda
+            groups: Dict[Tuple[int, int], List[tuple]] = {}
+            for row in rows:
+                groups.setdefault((len(row[1]), len(row[2])), []).append(row)
+            for group in groups.values():
+                ts, responses, scores, bands, priority = zip(*group)
+                yield ResultChunk(instrument_id, np.array(ts, dtype=np.float64),
+                                  _stack_blobs(responses, RESPONSE_DTYPE), _stack_blobs(scores, SCORE_DTYPE),
+                                  _stack_blobs(bands, BAND_DTYPE), np.array(priority, dtype=np.int8))
+
+    def sequence(self) -> int:
+        # Writer SQLite berjalan serial, jadi semua id di bawah id terbesar sudah ter-commit
+        return self._connect().execute("SELECT COALESCE(MAX(id), 0) + 1 FROM results").fetchone()[0]
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+
+class SegmentBackend:
+    """Segmen kolom append-only: satu file .npz per (batch, instrumen)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        existing = [self._sequence(path) for path in glob.glob(os.path.join(directory, "*.npz"))]
+        self._next = max(existing, default=0) + 1
+
+    @staticmethod
+    def _sequence(path: str) -> int:
+        try:
+            return int(os.path.basename(path).split('-')[0])
+        except ValueError:
+            return 0
+
+    def write_batch(self, rows: List[ResultRow]):
+        by_instrument: Dict[str, List[ResultRow]] = {}
+        for row in rows:
+            by_instrument.setdefault(row.instrument_id, []).append(row)
+        os.makedirs(self.directory, exist_ok=True)
+        for instrument_id, group in by_instrument.items():
+            tmp_path = os.path.join(self.directory, f"{os.getpid()}-{instrument_id}.npz.tmp")
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    ts=np.array([row.timestamp for row in group], dtype=np.float64),
+                    responses=np.stack([row.responses for row in group]).astype(RESPONSE_DTYPE),
+                    scores=np.stack([row.scores for row in group]).astype(SCORE_DTYPE),
+                    bands=np.stack([row.bands for row in group]).astype(BAND_DTYPE),
+                    priority=np.array([row.priority for row in group], dtype=np.int8),
+                    subject=np.array([row.subject or "" for row in group], dtype=str)
+                )
+            self._publish(tmp_path, instrument_id)
+
+    def _publish(self, tmp_path: str, instrument_id: str):
+        # os.link gagal jika nama sudah ada, jadi beberapa proses writer tidak
+        # saling menimpa nomor urut segmen
+        while True:
+            path = os.path.join(self.directory, f"{self._next:010d}-{instrument_id}.npz")
+            self._next += 1
+            try:
+                os.link(tmp_path, path)
+            except FileExistsError:
+                continue
+            os.remove(tmp_path)
+            return
+
+    def segments(self, instrument_id: Optional[str] = None) -> List[str]:
+        pattern = f"*-{instrument_id}.npz" if instrument_id else "*.npz"
+        return sorted(glob.glob(os.path.join(self.directory, pattern)))
+
+    def iter_rows(self, instrument_id: Optional[str] = None, since: Optional[float] = None,
+                  until: Optional[float] = None, subject: Optional[str] = None) -> Iterator[ResultRow]:
+        for path in self.segments(instrument_id):
+            segment_instrument = os.path.basename(path)[:-len(".npz")].split('-', 1)[1]
+            with np.load(path) as data:
+                ts, responses, scores, bands, priority = (
+                    data['ts'], data['responses'], data['scores'], data['bands'], data['priority']
+                )
+                subjects = data['subject'] if 'subject' in data.files else np.full(len(ts), "")
+            for i in range(len(ts)):
+                if since is not None and ts[i] < since:
+                    continue
+                if until is not None and ts[i] >= until:
+                    continue
+                if subject is not None and subjects[i] != subject:
+                    continue
+                yield ResultRow(float(ts[i]), segment_instrument, responses[i], scores[i], bands[i],
+                                int(priority[i]), str(subjects[i]) or None)
+
+    def iter_chunks(self, instrument_id: str, since: Optional[float] = None, until: Optional[float] = None,
+                    chunk_size: int = 100_000, since_seq: Optional[int] = None,
+                    until_seq: Optional[int] = None) -> Iterator[ResultChunk]:
+        # Satu segmen sudah berupa kolom; chunk_size diabaikan
+        for path in self.segments(instrument_id):
+            sequence = self._sequence(path)
+            if (since_seq is not None and sequence < since_seq) or (until_seq is not None and sequence >= until_seq):
+                continue
+            with np.load(path) as data:
+                ts = data['ts']
+                mask = np.ones(len(ts), dtype=bool)
+                if since is not None:
+                    mask &= ts >= since
+                if until is not None:
+                    mask &= ts < until
+                if mask.any():
+                    yield ResultChunk(instrument_id, ts[mask], data['responses'][mask], data['scores'][mask],
+                                      data['bands'][mask], data['priority'][mask])
+
+    def sequence(self) -> int:
+        # Nomor segmen diambil naik lewat os.link, jadi segmen baru selalu di atas yang sudah ada
+        return max((self._sequence(path) for path in self.segments()), default=0) + 1
+
+    def count(self) -> int:
+        total = 0
+        for path in self.segments():
+            with np.load(path) as data:
+                total += len(data['ts'])
+        return total
+
+    def close(self):
+        pass
+
+
+class ResultStore:
+    """Antrean hasil + writer batch di background di atas sebuah backend."""
+
+    def __init__(self, backend, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_pending: int = DEFAULT_MAX_PENDING):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[ResultRow]]" = queue.Queue(maxsize=max_pending)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ResultStore"]:
+        """TEMAN_RESULT_STORE = sqlite:<path> | segments:<dir> | none"""
+        spec = os.environ.get("TEMAN_RESULT_STORE", f"sqlite:{os.path.join(DEFAULT_DATA_DIR, 'results.sqlite3')}")
+        kind, _, location = spec.partition(":")
+        if kind == "none":
+            return None
+        if kind == "sqlite":
+            backend = SQLiteBackend(location or os.path.join(DEFAULT_DATA_DIR, "results.sqlite3"))
+        elif kind == "segments":
+            backend = SegmentBackend(location or os.path.join(DEFAULT_DATA_DIR, "segments"))
+        else:
+            raise ValueError(f"Unknown TEMAN_RESULT_STORE backend: {kind!r}")
+        return cls(
+            backend,
+            batch_size=int(os.environ.get("TEMAN_RESULT_BATCH", DEFAULT_BATCH_SIZE)),
+            flush_interval=float(os.environ.get("TEMAN_RESULT_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+        )
+
+    def record(self, row: ResultRow) -> bool:
+        """Masukkan hasil ke antrean tanpa menunggu I/O; False jika antrean penuh"""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="result-writer", daemon=True)
+                    self._writer.start()
+                    # Hasil yang masih di antrean tetap ditulis saat proses keluar
+                    atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            row = self._queue.get()
+            stop = row is None
+            batch = [] if stop else [row]
+            deadline = time.monotonic() + self.flush_interval
+            # Kumpulkan sampai batch penuh atau flush_interval habis
+            while not stop and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                else:
+                    batch.append(row)
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: List[ResultRow]):
+        try:
+            self.backend.write_batch(batch)
+        except Exception as e:
+            logger.warning("Writing %d results failed: %s", len(batch), e)
+            with self._lock:
+                self.failed += len(batch)
+        else:
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+        with self._lock:
+            self._flushed.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Tunggu sampai semua hasil di antrean ditulis (untuk shutdown dan tes)"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self.written + self.failed < self.enqueued:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        atexit.unregister(self.close)
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join(timeout)
+            self._writer = None
+        self.backend.close()
+
+    def iter_rows(self, instrument_id: Optional[str] = None, since: Optional[float] = None,
+                  until: Optional[float] = None, subject: Optional[str] = None) -> Iterator[ResultRow]:
+        """Hasil tersimpan per baris (since <= ts < until), urut seperti ditulis"""
+        return self.backend.iter_rows(instrument_id, since, until, subject)
+
+    def iter_chunks(self, instrument_id: str, since: Optional[float] = None, until: Optional[float] = None,
+                    chunk_size: int = 100_000, since_seq: Optional[int] = None,
+                    until_seq: Optional[int] = None) -> Iterator[ResultChunk]:
+        """Hasil satu instrumen per potongan kolom (since <= ts < until, since_seq <= urutan < until_seq)"""
+        return self.backend.iter_chunks(instrument_id, since, until, chunk_size, since_seq, until_seq)
+
+    def sequence(self) -> int:
+        """Nomor urut tulis berikutnya; semua hasil yang sudah tertulis punya urutan di bawahnya"""
+        return self.backend.sequence()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batches': self.batches
+        }
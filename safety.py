@@ -0,0 +1,223 @@
+# Mesin aturan keselamatan (config/scoring/safety_rules.yaml)
+# String kondisi seperti "phq9_9 > 0" atau "phq9_total >= 20" di-parse sekali
+# menjadi predikat terkompilasi yang menunjuk langsung ke slot item atau indeks
+# kategori di ScorePlan, sehingga bisa dievaluasi per submission maupun per batch.
+
+import re
+import operator
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Mapping, Optional, Tuple, NamedTuple
+
+import numpy as np
+
+from scoring import ScorePlan
+
+_OPERATORS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+}
+_CONDITION_RE = re.compile(r'^\s*([A-Za-z_]\w*)\s*(>=|<=|==|!=|>|<)\s*(-?\d+(?:\.\d+)?)\s*$')
+
+# Sumber nilai untuk variabel kondisi
+ITEM = 0
+SCORE = 1
+
+# Prioritas eskalasi yang dianggap kasus "flagged"
+URGENT_PRIORITIES = ('immediate', 'urgent')
+
+
+class Condition(NamedTuple):
+    variable: str
+    symbol: str
+    threshold: float
+
+    @property
+    def op(self):
+        return _OPERATORS[self.symbol]
+
+
+def parse_condition(text: str) -> Optional[Condition]:
+    """Parse "variabel op angka"; mengembalikan None untuk kondisi "default"."""
+    if text.strip() == 'default':
+        return None
+    match = _CONDITION_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid safety condition: {text!r}")
+    variable, symbol, threshold = match.groups()
+    return Condition(variable, symbol, float(threshold))
+
+
+def _resolve(variable: str, plan: ScorePlan) -> Optional[Tuple[int, int]]:
+    # "<item_id>" -> slot jawaban; "<instrumen>_total" / "<instrumen>_<kategori>" -> skor
+    if variable in plan.slots:
+        return ITEM, plan.slots[variable]
+    prefix = f"{plan.instrument_id}_"
+    if variable.startswith(prefix):
+        name = variable[len(prefix):]
+        if name == 'total' and plan.scoring_type == 'sum':
+            return SCORE, 0
+        if name in plan.category_index:
+            return SCORE, plan.category_index[name]
+    return None
+
+
+@dataclass
+class SafetyResult:
+    priority: Optional[str] = None
+    actions: List[str] = field(default_factory=list)
+    risk_score: float = 0.0
+    risk_factors: List[Dict[str, Any]] = field(default_factory=list)
+    alerts: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.alerts) or self.priority in URGENT_PRIORITIES
+
+
+class _InstrumentRules:
+    """Aturan yang sudah di-resolve ke indeks untuk satu instrumen."""
+
+    def __init__(self, engine: "SafetyEngine", plan: ScorePlan):
+        self.plan = plan
+        self.escalation = []
+        self.covered = False
+        for condition, priority, actions in engine.escalation:
+            if condition is None:
+                self.escalation.append((None, None, priority, actions))
+                continue
+            target = _resolve(condition.variable, plan)
+            if target is not None:
+                self.covered = True
+                self.escalation.append((target, condition, priority, actions))
+
+        self.risk_factors = []
+        for condition, factor in engine.risk_factors:
+            target = _resolve(condition.variable, plan)
+            if target is not None:
+                self.risk_factors.append((target, condition, factor))
+
+        self.screening = []
+        for condition, rule in engine.screening.get(plan.instrument_id, []):
+            target = _resolve(condition.variable, plan)
+            if target is not None:
+                self.screening.append((target, condition, rule))
+
+
+class SafetyEngine:
+    """Evaluasi suicide_screening, risk_factors dan escalation_protocol."""
+
+    def __init__(self, config: Dict[str, Any], plans: Mapping[str, ScorePlan]):
+        config = config or {}
+        self.interventions: Dict[str, Dict[str, Any]] = {}
+        for level, entries in (config.get('interventions', {}) or {}).items():
+            for entry in entries or []:
+                self.interventions[entry['action']] = dict(entry, level=level)
+
+        self.escalation: List[Tuple[Optional[Condition], str, List[str]]] = [
+            (parse_condition(rule['condition']), rule['priority'], list(rule.get('actions', [])))
+            for rule in config.get('escalation_protocol', []) or []
+        ]
+        self.priorities = [priority for _, priority, _ in self.escalation]
+
+        self.risk_factors: List[Tuple[Condition, Dict[str, Any]]] = []
+        for group, factors in (config.get('risk_factors', {}) or {}).items():
+            for factor in factors or []:
+                self.risk_factors.append((parse_condition(factor['item']), dict(factor, group=group)))
+
+        self.screening: Dict[str, List[Tuple[Condition, Dict[str, Any]]]] = {}
+        for rule in (config.get('suicide_screening', {}) or {}).get('instruments', []) or []:
+            condition = Condition(rule['item'], '>=', float(rule['threshold']))
+            self.screening.setdefault(rule['id'], []).append((condition, rule))
+
+        # Aturan di-resolve per instrumen saat pertama dibutuhkan
+        self._plans = plans
+        self._rules: Dict[str, _InstrumentRules] = {}
+
+    def _rules_for(self, instrument_id: str) -> Optional[_InstrumentRules]:
+        rules = self._rules.get(instrument_id)
+        if rules is None:
+            plan = self._plans.get(instrument_id)
+            if plan is None:
+                return None
+            rules = self._rules[instrument_id] = _InstrumentRules(self, plan)
+        return rules
+
+    def invalidate(self, instrument_id: Optional[str] = None):
+        if instrument_id is None:
+            self._rules.clear()
+        else:
+            self._rules.pop(instrument_id, None)
+
+    @staticmethod
+    def _value(target: Tuple[int, int], vector, scores):
+        source, index = target
+        return vector[index] if source == ITEM else scores[index]
+
+    def evaluate(self, instrument_id: str, vector: np.ndarray, scores: np.ndarray) -> SafetyResult:
+        """Evaluasi satu submission (vektor slot jawaban + vektor skor kategori)"""
+        rules = self._rules_for(instrument_id)
+        result = SafetyResult()
+        if rules is None:
+            return result
+        vector = vector.tolist()
+        scores = scores.tolist()
+
+        for target, condition, rule in rules.screening:
+            if condition.op(self._value(target, vector, scores), condition.threshold):
+                result.alerts.append(rule)
+
+        for target, condition, factor in rules.risk_factors:
+            if condition.op(self._value(target, vector, scores), condition.threshold):
+                result.risk_score += factor.get('weight', 0)
+                result.risk_factors.append(factor)
+
+        if rules.covered:
+            for target, condition, priority, actions in rules.escalation:
+                if condition is None or condition.op(self._value(target, vector, scores), condition.threshold):
+                    result.priority = priority
+                    result.actions = actions
+                    break
+        return result
+
+    def evaluate_batch(self, instrument_id: str, responses: np.ndarray, scores: np.ndarray) -> Dict[str, np.ndarray]:
+        """Evaluasi seluruh batch sebagai mask NumPy.
+
+        Mengembalikan `priority` (indeks ke self.priorities, -1 = tidak ada),
+        `risk_score`, `alert` (ada peringatan suicide_screening) dan `flagged`.
+        """
+        n = len(responses)
+        rules = self._rules_for(instrument_id)
+        priority = np.full(n, -1, dtype=np.int8)
+        risk_score = np.zeros(n, dtype=np.float64)
+        alert = np.zeros(n, dtype=bool)
+        if rules is None:
+            return {'priority': priority, 'risk_score': risk_score, 'alert': alert, 'flagged': alert.copy()}
+
+        def column(target):
+            source, index = target
+            return responses[:, index] if source == ITEM else scores[:, index]
+
+        for target, condition, _ in rules.screening:
+            alert |= condition.op(column(target), condition.threshold)
+
+        for target, condition, factor in rules.risk_factors:
+            risk_score += condition.op(column(target), condition.threshold) * factor.get('weight', 0)
+
+        if rules.covered:
+            # Aturan pertama yang cocok menang: isi dari belakang ke depan
+            for target, condition, rule_priority, _ in reversed(rules.escalation):
+                index = self.priorities.index(rule_priority)
+                if condition is None:
+                    priority[:] = index
+                else:
+                    priority[condition.op(column(target), condition.threshold)] = index
+
+        urgent = np.isin(priority, [i for i, p in enumerate(self.priorities) if p in URGENT_PRIORITIES])
+        return {'priority': priority, 'risk_score': risk_score, 'alert': alert, 'flagged': alert | urgent}
+
+    def action_details(self, actions: List[str]) -> List[Dict[str, Any]]:
+        return [self.interventions[action] for action in actions if action in self.interventions]
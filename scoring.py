@@ -0,0 +1,158 @@
+# Mesin skoring terkompilasi
+# Setiap instrumen YAML dikompilasi sekali menjadi ScorePlan yang immutable,
+# sehingga skoring per-request hanya berupa operasi vektor integer + lookup O(1).
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Optional, Tuple
+
+import numpy as np
+
+
+def _frozen(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+@dataclass(frozen=True)
+class ScorePlan:
+    """Rencana skoring hasil kompilasi satu instrumen."""
+    instrument_id: str
+    scoring_type: str                       # 'sum' | 'sum_by_category'
+    item_ids: Tuple[str, ...]               # urutan slot == urutan `items` di YAML
+    slots: Mapping[str, int]                # item id -> slot
+    categories: Tuple[str, ...]             # ('total',) untuk tipe 'sum'
+    category_index: Mapping[str, int]       # nama kategori -> baris di `weights`
+    category_slots: Tuple[np.ndarray, ...]  # slot item per kategori
+    weights: np.ndarray                     # (n_kategori, n_item), sudah termasuk multiplier
+    max_scores: Tuple[int, ...]             # max_score dari YAML per kategori
+    bands: Tuple[Tuple[Dict[str, Any], ...], ...]  # band interpretasi per kategori
+    band_lookup: Tuple[np.ndarray, ...]     # skor -> indeks band (-1 = tidak ada)
+
+    @property
+    def n_items(self) -> int:
+        return len(self.item_ids)
+
+    def vectorize(self, responses: Dict[str, int], missing: int = 0) -> np.ndarray:
+        """Ubah dict jawaban menjadi vektor slot (item yang kosong = `missing`).
+
+        Untuk skoring item kosong bernilai 0; vektor yang disimpan memakai -1 agar
+        "tidak dijawab" tidak tercampur dengan jawaban bernilai 0.
+        """
+        vector = np.full(self.n_items, missing, dtype=np.int64)
+        for item_id, value in responses.items():
+            slot = self.slots.get(item_id)
+            if slot is not None and value is not None:
+                vector[slot] = value
+        return vector
+
+    def score_vector(self, vector: np.ndarray) -> np.ndarray:
+        """Skor per kategori untuk satu vektor jawaban."""
+        return self.weights @ vector
+
+    def band_index(self, category: int, score: Any) -> int:
+        lookup = self.band_lookup[category]
+        try:
+            value = int(score)
+        except (TypeError, ValueError, OverflowError):
+            return -1
+        if value != score or value < 0 or value >= len(lookup):
+            return -1
+        return int(lookup[value])
+
+    def band(self, category: int, score: Any) -> Optional[Dict[str, Any]]:
+        index = self.band_index(category, score)
+        return self.bands[category][index] if index >= 0 else None
+
+    def result(self, scores: np.ndarray) -> Dict[str, Any]:
+        """Format hasil yang sama dengan `calculate_score` lama."""
+        if self.scoring_type == 'sum':
+            return {'total': int(scores[0]), 'max_score': self.max_scores[0]}
+        return {
+            category: {'score': int(scores[i]), 'max_score': self.max_scores[i]}
+            for i, category in enumerate(self.categories)
+        }
+
+
+def _valid_bands(bands: Any) -> List[Dict[str, Any]]:
+    if not isinstance(bands, list):
+        return []
+    return [band for band in bands if isinstance(band, dict) and 'range' in band]
+
+
+def _build_lookup(bands: List[Dict[str, Any]], max_possible: int) -> np.ndarray:
+    upper = max([max_possible] + [int(band['range'][1]) for band in bands])
+    lookup = np.full(upper + 1, -1, dtype=np.int16)
+    # Band pertama yang cocok menang, sama seperti pemindaian linear lama
+    for index in range(len(bands) - 1, -1, -1):
+        low, high = bands[index]['range'][0], bands[index]['range'][1]
+        low = max(int(np.ceil(low)), 0)
+        high = int(np.floor(high))
+        if low <= high:
+            lookup[low:high + 1] = index
+    return _frozen(lookup)
+
+
+def compile_instrument(config: Dict[str, Any]) -> ScorePlan:
+    """Kompilasi konfigurasi instrumen YAML menjadi ScorePlan."""
+    instrument_id = config['id']
+    scoring = config.get('scoring', {}) or {}
+    scoring_type = scoring.get('type')
+
+    item_ids = [item['id'] for item in config.get('items', [])]
+    max_option = {
+        item['id']: max([opt['value'] for opt in item.get('options', [])] or [0])
+        for item in config.get('items', [])
+    }
+
+    if scoring_type == 'sum':
+        category_defs = {'total': {'items': scoring.get('items', []),
+                                   'max_score': scoring.get('max_score', 0)}}
+        interpretation = {'total': config.get('interpretation', [])}
+    elif scoring_type == 'sum_by_category':
+        category_defs = scoring.get('categories', {}) or {}
+        interpretation = config.get('interpretation', {}) or {}
+        if not isinstance(interpretation, dict):
+            interpretation = {}
+    else:
+        raise ValueError(f"Unsupported scoring type for {instrument_id}: {scoring_type!r}")
+
+    # Item skoring yang tidak ada di `items` tetap diberi slot
+    for category_config in category_defs.values():
+        for item_id in category_config.get('items', []):
+            if item_id not in item_ids:
+                item_ids.append(item_id)
+    slots = {item_id: slot for slot, item_id in enumerate(item_ids)}
+
+    categories = tuple(category_defs)
+    weights = np.zeros((len(categories), len(item_ids)), dtype=np.int64)
+    category_slots = []
+    max_scores = []
+    bands = []
+    band_lookup = []
+    for row, category in enumerate(categories):
+        category_config = category_defs[category]
+        multiplier = category_config.get('multiplier', 1)
+        cat_slots = np.array([slots[item_id] for item_id in category_config.get('items', [])], dtype=np.intp)
+        np.add.at(weights[row], cat_slots, multiplier)
+        category_slots.append(_frozen(cat_slots))
+        max_scores.append(category_config.get('max_score', 0))
+
+        max_possible = int(sum(max_option.get(item_ids[slot], 0) for slot in cat_slots) * multiplier)
+        category_bands = _valid_bands(interpretation.get(category))
+        bands.append(tuple(category_bands))
+        band_lookup.append(_build_lookup(category_bands, max_possible))
+
+    return ScorePlan(
+        instrument_id=instrument_id,
+        scoring_type=scoring_type,
+        item_ids=tuple(item_ids),
+        slots=MappingProxyType(slots),
+        categories=categories,
+        category_index=MappingProxyType({category: i for i, category in enumerate(categories)}),
+        category_slots=tuple(category_slots),
+        weights=_frozen(weights),
+        max_scores=tuple(max_scores),
+        bands=tuple(bands),
+        band_lookup=tuple(band_lookup),
+    )
@@ -0,0 +1,239 @@
+# Mode serve produksi
+# Proses master memuat & mengompilasi semua konfigurasi sekali, lalu fork N worker
+# yang berbagi memori tersebut secara copy-on-write. Setiap worker menjalankan
+# server Gradio sendiri di port dasar + indeks worker: antrean Gradio mengharuskan
+# request join dan stream hasil sebuah event sampai di proses yang sama, jadi
+# load balancer di depan perlu sticky session. SIGTERM membuat worker berhenti
+# menerima trafik (/healthz -> 503), menunggu handler yang sedang berjalan, lalu
+# menulis sisa antrean hasil sebelum keluar.
+
+import gc
+import os
+import time
+import inspect
+import functools
+import signal
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCORING_CONCURRENCY = 16
+DEFAULT_PDF_CONCURRENCY = 2
+DEFAULT_DRAIN_TIMEOUT = 30.0
+RESPAWN_DELAY = 1.0
+MAX_RESPAWN_DELAY = 30.0
+# Worker yang keluar sebelum waktu ini dianggap gagal start; setelah sekian kali
+# berturut-turut worker tersebut tidak di-restart lagi
+CRASH_LOOP_WINDOW = 30.0
+MAX_CRASH_RESTARTS = 5
+REAP_INTERVAL = 0.2
+
+
+class InFlight:
+    """Jumlah panggilan handler UI dan request API yang sedang berjalan, untuk drain.
+
+    Tidak bergantung pada TEMAN_METRICS: decorator metrik bisa dimatikan, penghitung ini tidak."""
+
+    def __init__(self):
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> int:
+        with self._lock:
+            return self._count
+
+    def _begin(self):
+        with self._lock:
+            self._count += 1
+
+    def _end(self):
+        with self._lock:
+            self._count -= 1
+
+    def track(self, fn: Callable) -> Callable:
+        """Bungkus fungsi dengan mempertahankan jenisnya (biasa/generator/async) untuk Gradio dan FastAPI."""
+        if getattr(fn, '_in_flight', None) is self:
+            return fn
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                self._begin()
+                try:
+                    async for value in fn(*args, **kwargs):
+                        yield value
+                finally:
+                    self._end()
+        elif inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                self._begin()
+                try:
+                    yield from fn(*args, **kwargs)
+                finally:
+                    self._end()
+        elif inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                self._begin()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self._end()
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                self._begin()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self._end()
+        wrapper._in_flight = self
+        return wrapper
+
+    def track_blocks(self, blocks: Any):
+        """Bungkus semua handler event Blocks yang punya fungsi Python (handler JS-only dilewati)."""
+        for block_fn in blocks.fns.values():
+            if block_fn.fn is not None:
+                block_fn.fn = self.track(block_fn.fn)
+
+
+IN_FLIGHT = InFlight()
+
+
+def scoring_concurrency() -> int:
+    """Batas event murah (skoring, form, tren) per worker"""
+    return int(os.environ.get("TEMAN_SCORING_CONCURRENCY", DEFAULT_SCORING_CONCURRENCY))
+
+
+def pdf_concurrency() -> int:
+    """Batas event yang menunggu render PDF per worker"""
+    return int(os.environ.get("TEMAN_PDF_CONCURRENCY", DEFAULT_PDF_CONCURRENCY))
+
+
+def mount_health(fastapi_app, draining: threading.Event, path: str = "/healthz"):
+    """Health check untuk load balancer; 503 selama drain."""
+    from fastapi.responses import JSONResponse
+
+    def healthz():
+        if draining.is_set():
+            return JSONResponse({'status': 'draining'}, status_code=503)
+        return {'status': 'ok', 'pid': os.getpid()}
+    fastapi_app.add_api_route(path, healthz, methods=["GET"], include_in_schema=False)
+
+
+def wait_for_shutdown(stop: threading.Event):
+    """Blok sampai SIGTERM/SIGINT (atau `stop` di-set dari tempat lain)."""
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+    try:
+        while not stop.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        stop.set()
+
+
+def drain(in_flight: Callable[[], int] = IN_FLIGHT, timeout: float = DEFAULT_DRAIN_TIMEOUT, grace: float = 1.0) -> bool:
+    """Tunggu handler yang sedang berjalan selesai; False jika timeout."""
+    # Jeda singkat agar load balancer sempat melihat /healthz 503 dan event yang
+    # sudah di antrean mulai berjalan
+    time.sleep(grace)
+    deadline = time.monotonic() + timeout
+    while in_flight() > 0:
+        if time.monotonic() >= deadline:
+            logger.warning("Drain timed out with %d handler call(s) still running", in_flight())
+            return False
+        time.sleep(0.1)
+    return True
+
+
+def prefork(workers: int, run_worker: Callable[[int], None], respawn: bool = True) -> int:
+    """Fork `workers` proses anak yang menjalankan `run_worker(indeks)`; master mengawasi & meneruskan sinyal."""
+    if not hasattr(os, 'fork'):
+        logger.warning("Prefork is not supported on this platform; serving in a single process")
+        run_worker(0)
+        return 0
+
+    # Objek hasil warm-up dibekukan agar GC tidak menyentuh (dan menyalin) halaman bersama
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+    children: Dict[int, int] = {}   # pid -> indeks worker
+    started: Dict[int, float] = {}  # indeks -> waktu start terakhir
+    failures: Dict[int, int] = {}   # indeks -> jumlah gagal start berturut-turut
+    respawns: Dict[int, float] = {}  # indeks -> waktu restart terjadwal
+    stopping = threading.Event()
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            code = 0
+            try:
+                run_worker(index)
+            except BaseException:
+                logger.exception("Worker %d crashed", index)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+        started[index] = time.monotonic()
+        logger.info("Started worker %d (pid %d)", index, pid)
+
+    def shutdown(signum, _frame):
+        stopping.set()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for index in range(workers):
+        spawn(index)
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    exit_code = 0
+    while children or respawns:
+        if stopping.is_set():
+            respawns.clear()
+        now = time.monotonic()
+        for index in [index for index, due in respawns.items() if due <= now]:
+            del respawns[index]
+            spawn(index)
+        # Selama ada restart terjadwal, reap tanpa blok agar jadwalnya tetap jalan
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG) if respawns else os.wait()
+        except ChildProcessError:
+            if not respawns:
+                break
+            pid = 0
+        if pid == 0:
+            time.sleep(REAP_INTERVAL)
+            continue
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        if stopping.is_set() or not respawn:
+            logger.info("Worker %d (pid %d) exited with %d", index, pid, code)
+            exit_code = exit_code or (code if code > 0 else 0)
+            continue
+        # Backoff eksponensial untuk worker yang gagal start; reset setelah berjalan cukup lama
+        uptime = time.monotonic() - started[index]
+        failures[index] = failures.get(index, 0) + 1 if uptime < CRASH_LOOP_WINDOW else 0
+        if failures[index] > MAX_CRASH_RESTARTS:
+            logger.error("Worker %d (pid %d) exited with %d; failed to start %d times in a row, not restarting",
+                         index, pid, code, failures[index])
+            exit_code = 1
+            continue
+        delay = min(RESPAWN_DELAY * 2 ** max(failures[index] - 1, 0), MAX_RESPAWN_DELAY)
+        logger.warning("Worker %d (pid %d) exited with %d; restarting in %.0fs", index, pid, code, delay)
+        respawns[index] = time.monotonic() + delay
+    if exit_code and not stopping.is_set():
+        logger.error("All workers stopped; master exiting")
+    return exit_code
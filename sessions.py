@@ -0,0 +1,156 @@
+# Penyimpanan sesi form di server
+# State Evaluasi Lengkap (instrumen aktif + jawaban yang sudah dipilih) disimpan di
+# proses server dan dikunci dengan token acak yang dipegang browser, sehingga event
+# hanya mengirim token dan form yang belum selesai bisa dipulihkan setelah reload.
+# Setiap sesi hanya berisi indeks instrumen dan array int8 indeks pilihan per slot;
+# sesi kedaluwarsa setelah TTL tanpa aktivitas, dan yang paling lama tidak dipakai
+# dibuang saat batas jumlah sesi atau memori tercapai.
+
+import os
+import time
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+DEFAULT_TTL = 2 * 60 * 60
+DEFAULT_MAX_SESSIONS = 100_000
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Perkiraan biaya tetap per sesi: entri OrderedDict, token, objek sesi, header array NumPy
+SESSION_OVERHEAD = 400
+UNANSWERED = -1
+
+
+class FormSession:
+    """Instrumen aktif (indeks) dan indeks pilihan per slot; -1 = belum dijawab."""
+    __slots__ = ('instrument', 'answers', 'touched')
+
+    def __init__(self, instrument: int, n_items: int):
+        self.instrument = instrument
+        self.answers = np.full(n_items, UNANSWERED, dtype=np.int8)
+        self.touched = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return SESSION_OVERHEAD + self.answers.nbytes
+
+    def complete(self) -> bool:
+        return bool(len(self.answers)) and bool((self.answers != UNANSWERED).all())
+
+
+class SessionStore:
+    """Sesi form per token dengan TTL dan eviksi LRU berdasarkan jumlah dan ukuran."""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_sessions: int = DEFAULT_MAX_SESSIONS,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, FormSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.created = 0
+        self.restored = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        return cls(
+            ttl=float(os.environ.get("TEMAN_SESSION_TTL", DEFAULT_TTL)),
+            max_sessions=int(os.environ.get("TEMAN_SESSION_MAX", DEFAULT_MAX_SESSIONS)),
+            max_bytes=int(float(os.environ.get("TEMAN_SESSION_MAX_MB", DEFAULT_MAX_BYTES / 1024 / 1024)) * 1024 * 1024)
+        )
+
+    def start(self, instrument: int, n_items: int) -> str:
+        """Mulai form baru dengan token baru; sesi lain (mis. tab lain) tidak tersentuh"""
+        session = FormSession(instrument, n_items)
+        session_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._sessions[session_id] = session
+            self.bytes += session.nbytes
+            self.created += 1
+            self._evict_locked(session.touched)
+        return session_id
+
+    def get(self, session_id: Optional[str]) -> Optional[FormSession]:
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._evict_locked(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                self.misses += 1
+                return None
+            session.touched = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def restore(self, session_id: Optional[str]) -> Optional[FormSession]:
+        """Seperti get(), untuk memulihkan form saat halaman dimuat ulang"""
+        session = self.get(session_id)
+        if session is not None:
+            with self._lock:
+                self.restored += 1
+        return session
+
+    def answer(self, session_id: Optional[str], slot: int, choice: int) -> bool:
+        """Catat pilihan satu slot; False jika sesi sudah tidak ada"""
+        session = self.get(session_id)
+        if session is None or not 0 <= slot < len(session.answers):
+            return False
+        session.answers[slot] = choice
+        return True
+
+    def finish(self, session_id: Optional[str]) -> Optional[FormSession]:
+        """Ambil dan hapus sesi secara atomik; None jika sudah diambil submit lain atau kedaluwarsa"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._drop_locked(session_id)
+            return session
+
+    def discard(self, session_id: Optional[str]):
+        with self._lock:
+            self._drop_locked(session_id)
+
+    def _drop_locked(self, session_id: Optional[str]):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.bytes -= session.nbytes
+
+    def _evict_locked(self, now: float):
+        # Urutan LRU sama dengan urutan aktivitas terakhir, jadi sesi kedaluwarsa selalu di depan
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.touched > self.ttl:
+                self.expired += 1
+            elif len(self._sessions) > self.max_sessions or self.bytes > self.max_bytes:
+                self.evictions += 1
+            else:
+                break
+            self._drop_locked(session_id)
+
+    def sweep(self):
+        """Buang sesi kedaluwarsa (juga dilakukan otomatis setiap akses)"""
+        with self._lock:
+            self._evict_locked(time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'bytes': self.bytes,
+                'created': self.created,
+                'restored': self.restored,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,53 @@
+# Profil waktu startup
+# Mencatat durasi tiap fase cold start (import, muat konfigurasi, warm-up cache,
+# bangun UI, sampai server listening) agar regresi bisa dipantau lewat
+# `python app.py --profile-startup`.
+
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+class StartupProfile:
+    """Daftar (fase, detik) sesuai urutan selesai."""
+
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def to_json(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: round(seconds, 6) for name, seconds in self.phases}
+
+    def report(self) -> str:
+        with self._lock:
+            phases = list(self.phases)
+        width = max([len(name) for name, _ in phases] + [5])
+        lines = [f"{name:<{width}}  {seconds * 1000:9.1f} ms" for name, seconds in phases]
+        lines.append(f"{'total':<{width}}  {sum(seconds for _, seconds in phases) * 1000:9.1f} ms")
+        return "\n".join(lines)
+
+    def write(self, path: Optional[str] = None):
+        """Tabel ke stderr; jika `path` diberikan juga JSON ke file tersebut."""
+        print(self.report(), file=sys.stderr)
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_json(), f, indent=2)
+
+
+STARTUP = StartupProfile()
@@ -0,0 +1,7 @@
+# Modul aplikasi berada di root repo (tanpa paket), jadi root ditambahkan ke sys.path
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,212 @@
+# Perilaku SafetyEngine dibandingkan dengan semantik safety_rules.yaml apa adanya:
+# kondisi "variabel op angka" dievaluasi pada jawaban item dan skor, aturan eskalasi
+# pertama yang cocok menang (lalu "default"), bobot faktor risiko dijumlahkan, dan
+# suicide_screening memberi peringatan jika jawaban item >= threshold.
+
+import os
+import itertools
+import operator
+
+import numpy as np
+import pytest
+import yaml
+
+from config_registry import ConfigRegistry
+from safety import SafetyEngine, parse_condition, Condition
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RULES_PATH = os.path.join(ROOT, "config", "scoring", "safety_rules.yaml")
+OPS = {'>=': operator.ge, '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+       '>': operator.gt, '<': operator.lt}
+
+
+@pytest.fixture(scope="module")
+def rules():
+    with open(RULES_PATH, encoding='utf-8') as f:
+        return yaml.safe_load(f)['safety']
+
+
+@pytest.fixture(scope="module")
+def plans():
+    registry = ConfigRegistry(use_snapshot=False)
+    return {instrument_id: registry.plans[instrument_id] for instrument_id in ('phq9', 'gad7', 'dass21')}
+
+
+@pytest.fixture(scope="module")
+def engine(rules, plans):
+    return SafetyEngine(rules, plans)
+
+
+def reference(rules, instrument_id, variables):
+    """Interpretasi langsung safety_rules.yaml untuk satu submission (dict variabel -> nilai)."""
+    def holds(text):
+        variable, symbol, threshold = text.split()
+        return variable in variables and OPS[symbol](variables[variable], float(threshold))
+
+    alerts = [rule['item'] for rule in rules['suicide_screening']['instruments']
+              if rule['id'] == instrument_id and variables.get(rule['item'], 0) >= rule['threshold']]
+    factors = [factor for group in rules['risk_factors'].values() for factor in group if holds(factor['item'])]
+    priority = None
+    conditions = [rule['condition'] for rule in rules['escalation_protocol'] if rule['condition'] != 'default']
+    # Protokol eskalasi hanya berlaku untuk instrumen yang disebut kondisinya
+    if any(condition.split()[0] in variables for condition in conditions):
+        for rule in rules['escalation_protocol']:
+            if rule['condition'] == 'default' or holds(rule['condition']):
+                priority = rule['priority']
+                break
+    return alerts, round(sum(factor['weight'] for factor in factors), 6), priority
+
+
+def phq9_vector(plan, item9=0, impairment=0, total=0):
+    """Vektor PHQ-9 dengan skor total `total` (termasuk item 9) dan jawaban item 9/impairment tertentu."""
+    vector = np.zeros(plan.n_items, dtype=np.int64)
+    vector[plan.slots['phq9_9']] = item9
+    vector[plan.slots['phq9_impairment']] = impairment
+    remaining = total - item9
+    for item_id in plan.item_ids:
+        if item_id in ('phq9_9', 'phq9_impairment') or remaining <= 0:
+            continue
+        vector[plan.slots[item_id]] = min(3, remaining)
+        remaining -= vector[plan.slots[item_id]]
+    assert remaining <= 0
+    return vector
+
+
+def phq9_cases(plan):
+    # Batas setiap kondisi: total 9/10, 14/15, 19/20; item 9 0/1; impairment 0..3
+    for item9, impairment, total in itertools.product((0, 1, 3), (0, 1, 2, 3), (0, 9, 10, 14, 15, 19, 20, 27)):
+        if item9 <= total <= item9 + 24:
+            yield phq9_vector(plan, item9, impairment, total)
+
+
+def variables_for(plan, vector, scores):
+    variables = {item_id: int(vector[slot]) for item_id, slot in plan.slots.items()}
+    variables.update({f"{plan.instrument_id}_{category}": int(scores[i]) for i, category in enumerate(plan.categories)})
+    return variables
+
+
+def test_parse_condition():
+    assert parse_condition("phq9_9 > 0") == Condition("phq9_9", ">", 0.0)
+    assert parse_condition(" phq9_total >= 20 ") == Condition("phq9_total", ">=", 20.0)
+    assert parse_condition("default") is None
+    with pytest.raises(ValueError):
+        parse_condition("phq9_total >= twenty")
+
+
+def test_phq9_matches_rules(rules, plans, engine):
+    plan = plans['phq9']
+    for vector in phq9_cases(plan):
+        scores = plan.score_vector(vector)
+        alerts, risk_score, priority = reference(rules, 'phq9', variables_for(plan, vector, scores))
+        result = engine.evaluate('phq9', vector, scores)
+        assert [alert['item'] for alert in result.alerts] == alerts, vector
+        assert result.risk_score == pytest.approx(risk_score), vector
+        assert result.priority == priority, vector
+        assert result.flagged == (bool(alerts) or priority in ('immediate', 'urgent'))
+
+
+def test_phq9_batch_matches_single(plans, engine):
+    plan = plans['phq9']
+    responses = np.stack(list(phq9_cases(plan)))
+    scores = responses @ plan.weights.T
+    batch = engine.evaluate_batch('phq9', responses, scores)
+    for i in range(len(responses)):
+        single = engine.evaluate('phq9', responses[i], scores[i])
+        expected = engine.priorities.index(single.priority) if single.priority is not None else -1
+        assert batch['priority'][i] == expected
+        assert batch['risk_score'][i] == pytest.approx(single.risk_score)
+        assert batch['alert'][i] == bool(single.alerts)
+        assert batch['flagged'][i] == single.flagged
+
+
+@pytest.mark.parametrize("item9, total, priority", [
+    (1, 1, 'immediate'),    # phq9_9 > 0 menang atas skor total berapa pun
+    (3, 27, 'immediate'),
+    (0, 20, 'urgent'),
+    (0, 19, 'high'),
+    (0, 15, 'high'),
+    (0, 14, 'moderate'),
+    (0, 10, 'moderate'),
+    (0, 9, 'low'),
+    (0, 0, 'low'),
+])
+def test_phq9_escalation_boundaries(plans, engine, item9, total, priority):
+    plan = plans['phq9']
+    vector = phq9_vector(plan, item9=item9, total=total)
+    result = engine.evaluate('phq9', vector, plan.score_vector(vector))
+    assert result.priority == priority
+    assert bool(result.alerts) == (item9 >= 1)
+
+
+def test_phq9_item9_alert_drives_immediate_banner(plans, engine):
+    plan = plans['phq9']
+    vector = phq9_vector(plan, item9=1, total=1)
+    result = engine.evaluate('phq9', vector, plan.score_vector(vector))
+    assert [alert['action'] for alert in result.alerts] == ['immediate_intervention']
+    assert result.actions == ['crisis_hotline', 'professional_referral']
+    assert result.risk_score == pytest.approx(0.8)
+    assert result.flagged
+
+
+@pytest.mark.parametrize("impairment, alert, risk_score", [(0, False, 0.0), (1, False, 0.3), (2, True, 0.7), (3, True, 0.7)])
+def test_phq9_impairment_boundaries(plans, engine, impairment, alert, risk_score):
+    plan = plans['phq9']
+    vector = phq9_vector(plan, impairment=impairment)
+    result = engine.evaluate('phq9', vector, plan.score_vector(vector))
+    assert any(rule['item'] == 'phq9_impairment' for rule in result.alerts) == alert
+    assert result.risk_score == pytest.approx(risk_score)
+
+
+def test_missing_unscored_item(plans, engine):
+    # phq9_impairment boleh kosong; untuk evaluasi nilainya 0 (vektor tersimpan -1 di-clip)
+    plan = plans['phq9']
+    stored = plan.vectorize({item_id: 1 for item_id in plan.item_ids if item_id != 'phq9_impairment'}, missing=-1)
+    assert stored[plan.slots['phq9_impairment']] == -1
+    vector = np.maximum(stored, 0)
+    scores = plan.score_vector(vector)
+    result = engine.evaluate('phq9', vector, scores)
+    assert not any(rule['item'] == 'phq9_impairment' for rule in result.alerts)
+    assert result.priority == 'immediate'
+    batch = engine.evaluate_batch('phq9', vector[None, :], scores[None, :])
+    assert batch['priority'][0] == engine.priorities.index('immediate')
+    assert batch['risk_score'][0] == pytest.approx(result.risk_score)
+
+
+def test_instrument_without_rules(plans, engine):
+    plan = plans['gad7']
+    vector = np.full(plan.n_items, 3, dtype=np.int64)
+    result = engine.evaluate('gad7', vector, plan.score_vector(vector))
+    assert result.priority is None and not result.alerts and result.risk_score == 0
+    batch = engine.evaluate_batch('gad7', vector[None, :], plan.score_vector(vector)[None, :])
+    assert batch['priority'][0] == -1 and not batch['flagged'][0]
+    assert engine.evaluate('unknown', vector, plan.score_vector(vector)).priority is None
+
+
+def test_category_conditions(plans):
+    # Kondisi "<instrumen>_<kategori>" menunjuk ke skor kategori (dass21 per kategori)
+    config = {
+        'risk_factors': {'high': [{'item': 'dass21_depression >= 28', 'weight': 0.5},
+                                  {'item': 'dass21_stress > 33', 'weight': 0.25}]},
+        'escalation_protocol': [
+            {'condition': 'dass21_depression >= 28', 'priority': 'urgent', 'actions': []},
+            {'condition': 'dass21_anxiety >= 15', 'priority': 'high', 'actions': []},
+            {'condition': 'default', 'priority': 'low', 'actions': []},
+        ],
+    }
+    engine = SafetyEngine(config, plans)
+    plan = plans['dass21']
+    depression, anxiety, stress = (plan.category_index[name] for name in ('depression', 'anxiety', 'stress'))
+    cases = []
+    for dep, anx, st in itertools.product((27, 28), (14, 15), (33, 34)):
+        scores = np.zeros(len(plan.categories), dtype=np.int64)
+        scores[[depression, anxiety, stress]] = dep, anx, st
+        cases.append(scores)
+        expected = 'urgent' if dep >= 28 else 'high' if anx >= 15 else 'low'
+        result = engine.evaluate('dass21', np.zeros(plan.n_items, dtype=np.int64), scores)
+        assert result.priority == expected
+        assert result.risk_score == pytest.approx(0.5 * (dep >= 28) + 0.25 * (st > 33))
+    batch = engine.evaluate_batch('dass21', np.zeros((len(cases), plan.n_items), dtype=np.int64), np.stack(cases))
+    for i, scores in enumerate(cases):
+        single = engine.evaluate('dass21', np.zeros(plan.n_items, dtype=np.int64), scores)
+        assert batch['priority'][i] == engine.priorities.index(single.priority)
+        assert batch['risk_score'][i] == pytest.approx(single.risk_score)
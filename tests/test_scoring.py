@@ -0,0 +1,94 @@
+# ScorePlan dibandingkan dengan pencarian band lama (get_interpretation): band pertama
+# dengan range[0] <= skor <= range[1] menang, skor di luar semua band tidak punya band.
+
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+from config_registry import ConfigRegistry
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INSTRUMENTS = ('phq9', 'gad7', 'phq2', 'dass21', 'cbi')
+
+
+@pytest.fixture(scope="module")
+def registry():
+    return ConfigRegistry(use_snapshot=False)
+
+
+def yaml_bands(instrument_id):
+    with open(os.path.join(ROOT, "config", "instruments", f"{instrument_id}.yaml"), encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    interpretation = config['interpretation']
+    if config['scoring']['type'] == 'sum':
+        return {'total': interpretation}
+    return interpretation
+
+
+def reference_band(bands, score):
+    for index, band in enumerate(bands):
+        if band['range'][0] <= score <= band['range'][1]:
+            return index
+    return -1
+
+
+def max_answers(plan, instrument):
+    options = {item['id']: max(option['value'] for option in item['options']) for item in instrument['items']}
+    return np.array([options.get(item_id, 0) for item_id in plan.item_ids], dtype=np.int64)
+
+
+@pytest.mark.parametrize("instrument_id", INSTRUMENTS)
+def test_band_index_matches_linear_scan(registry, instrument_id):
+    plan = registry.plans[instrument_id]
+    bands = yaml_bands(instrument_id)
+    for category_index, category in enumerate(plan.categories):
+        category_bands = bands[category]
+        top = max(plan.max_scores[category_index], max(band['range'][1] for band in category_bands))
+        # Setiap skor di dan sekitar semua batas band
+        scores = {-1, 0, top, top + 1}
+        for band in category_bands:
+            low, high = band['range']
+            scores |= {low - 1, low, high, high + 1}
+        for score in sorted(scores):
+            expected = reference_band(category_bands, score)
+            assert plan.band_index(category_index, score) == expected, (category, score)
+            band = plan.band(category_index, score)
+            assert band == (category_bands[expected] if expected >= 0 else None)
+        for score in range(top + 1):
+            assert plan.band_index(category_index, score) == reference_band(category_bands, score)
+
+
+def test_band_index_rejects_non_integer_scores(registry):
+    plan = registry.plans['phq9']
+    assert plan.band_index(0, np.int64(10)) == 2
+    assert plan.band_index(0, 10.0) == 2
+    assert plan.band_index(0, 9.5) == -1
+    assert plan.band_index(0, None) == -1
+    assert plan.band_index(0, "10") == -1
+
+
+@pytest.mark.parametrize("instrument_id", INSTRUMENTS)
+def test_max_score_is_reachable(registry, instrument_id):
+    # max_score di YAML harus sama dengan skor maksimum yang bisa dicapai (dass21: 7 item x 3 x multiplier 2)
+    plan = registry.plans[instrument_id]
+    scores = plan.score_vector(max_answers(plan, registry.instruments[instrument_id]))
+    assert tuple(scores.tolist()) == tuple(plan.max_scores)
+
+
+def test_dass21_scores_use_multiplier(registry):
+    plan = registry.plans['dass21']
+    assert plan.max_scores == (42, 42, 42)
+    vector = max_answers(plan, registry.instruments['dass21'])
+    scores = plan.score_vector(vector)
+    # Skor maksimum masuk band tertinggi setiap kategori
+    for category_index in range(len(plan.categories)):
+        assert plan.band_index(category_index, scores[category_index]) == len(plan.bands[category_index]) - 1
+    # Satu jawaban bernilai 1 di setiap item depresi -> 7 x 1 x 2 = 14 ("Sedang", [14, 20])
+    vector = np.zeros(plan.n_items, dtype=np.int64)
+    depression = plan.category_index['depression']
+    vector[plan.category_slots[depression]] = 1
+    scores = plan.score_vector(vector)
+    assert scores[depression] == 14
+    assert plan.bands[depression][plan.band_index(depression, 14)]['range'] == [14, 20]